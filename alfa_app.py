@@ -21,17 +21,19 @@ Licencja: Apache 2.0
 import os
 import sys
 import json
+import time
 import asyncio
+from contextlib import asynccontextmanager
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable
+
+import httpx
 
 # FastAPI
-from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
@@ -39,6 +41,15 @@ from pydantic import BaseModel
 sys.path.insert(0, str(Path(__file__).parent / "ollama-plugins"))
 from google_auth import get_auth_manager, GoogleAuthManager
 from ai_models import get_model_manager, AIModelManager
+from alfa_cache import ResponseCache, SingleFlight, credential_id, is_deterministic, make_key
+from alfa_sessions import SessionRegistry, VerifiedSessionCache
+from alfa_conversations import ConversationManager, ConversationNotFound
+from alfa_web import PageRenderer, StaticAssets
+from alfa_resilience import AdaptiveTokenBucket, CircuitBreaker, ProviderGuard, ProviderUnavailable, classify_error
+from alfa_routing import LatencyRouter
+from alfa_metrics import AlfaMetrics, MetricsMiddleware
+from alfa_state import StateBackend, sqlite_state, memory_state
+from alfa_ollama import OllamaWarmPool, OllamaContextCache, transcript_prompt
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -57,43 +68,226 @@ AI_PROVIDERS = {
         "description": "Google's multimodal AI",
         "models": ["gemini-pro", "gemini-pro-vision", "gemini-1.5-pro"],
         "auth_type": "google_oauth",  # Uses Google login!
-        "official_url": "https://ai.google.dev/"
+        "official_url": "https://ai.google.dev/",
+        "base_url": os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+        "timeout": 120.0
     },
     "openai": {
         "name": "OpenAI GPT",
         "description": "ChatGPT / GPT-4",
         "models": ["gpt-4", "gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"],
         "auth_type": "api_key",
-        "official_url": "https://platform.openai.com/"
+        "official_url": "https://platform.openai.com/",
+        "base_url": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        "timeout": 120.0
     },
     "anthropic": {
         "name": "Anthropic Claude",
         "description": "Claude AI",
         "models": ["claude-3-opus", "claude-3-sonnet", "claude-3-haiku"],
         "auth_type": "api_key",
-        "official_url": "https://console.anthropic.com/"
+        "official_url": "https://console.anthropic.com/",
+        "base_url": os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com"),
+        "timeout": 120.0
     },
     "deepseek": {
         "name": "DeepSeek",
         "description": "DeepSeek Coder & Chat",
         "models": ["deepseek-chat", "deepseek-coder"],
         "auth_type": "api_key",
-        "official_url": "https://platform.deepseek.com/"
+        "official_url": "https://platform.deepseek.com/",
+        "base_url": os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+        "timeout": 60.0
     },
     "ollama": {
         "name": "Ollama (Local)",
         "description": "Local AI models - 100% private",
         "models": ["llama3", "mistral", "codellama", "deepseek-r1"],
         "auth_type": "none",
-        "official_url": "https://ollama.ai/"
+        "official_url": "https://ollama.ai/",
+        "base_url": os.getenv("OLLAMA_HOST", "http://localhost:11434"),
+        "timeout": 120.0
     }
 }
 
+# Offline runs: ALFA_STANDIN_URL points every provider at the local stand-in
+# server (alfa_standin.py), so benchmarks and load tests need no keys / network.
+STANDIN_URL = os.getenv("ALFA_STANDIN_URL")
+if STANDIN_URL:
+    from alfa_standin import standin_base_urls
+    for _provider, _base_url in standin_base_urls(STANDIN_URL).items():
+        AI_PROVIDERS[_provider]["base_url"] = _base_url
+
+# Ollama warm pool (see alfa_ollama.py): models preloaded at startup and kept
+# resident; keep_alive per request grows with recent use of the model, from
+# ALFA_OLLAMA_KEEP_ALIVE_MIN (used once) to ALFA_OLLAMA_KEEP_ALIVE_MAX (hot / preloaded).
+OLLAMA_PRELOAD = [m.strip() for m in os.getenv("ALFA_OLLAMA_PRELOAD", "llama3").split(",") if m.strip()]
+OLLAMA_KEEP_ALIVE_MIN = float(os.getenv("ALFA_OLLAMA_KEEP_ALIVE_MIN", "60"))
+OLLAMA_KEEP_ALIVE_MAX = float(os.getenv("ALFA_OLLAMA_KEEP_ALIVE_MAX", "1800"))
+OLLAMA_USAGE_WINDOW = float(os.getenv("ALFA_OLLAMA_USAGE_WINDOW", "900"))
+OLLAMA_PS_INTERVAL = float(os.getenv("ALFA_OLLAMA_PS_INTERVAL", "30"))
+# Multi-turn Ollama chats continue from the `context` of the previous turn
+# (/api/generate), so only the new message is evaluated. Contexts are kept in
+# memory up to ALFA_OLLAMA_CONTEXT_TOKENS token ids in total (LRU) and TTL.
+OLLAMA_CONTEXT_REUSE = os.getenv("ALFA_OLLAMA_CONTEXT_REUSE", "true").lower() == "true"
+OLLAMA_CONTEXT_TOKENS = int(os.getenv("ALFA_OLLAMA_CONTEXT_TOKENS", "2000000"))
+OLLAMA_CONTEXT_TTL = float(os.getenv("ALFA_OLLAMA_CONTEXT_TTL", "3600"))
+
+# Connection pool for provider HTTP clients (one long-lived client per provider,
+# opened at startup and closed at shutdown, see AIFederation.startup)
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("ALFA_HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("ALFA_HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("ALFA_HTTP_KEEPALIVE_EXPIRY", "30"))
+)
+
+# Max concurrent upstream calls per provider, so one slow provider
+# cannot starve the others (ALFA_<PROVIDER>_CONCURRENCY)
+PROVIDER_CONCURRENCY = {
+    provider: int(os.getenv(f"ALFA_{provider.upper()}_CONCURRENCY", "16"))
+    for provider in AI_PROVIDERS
+}
+
+# Per-provider rate limit (token bucket, halved on 429 / paused for Retry-After,
+# then slowly raised back) and circuit breaker (open after N consecutive 5xx /
+# timeouts, one probe call after the reset timeout). Calls rejected locally
+# fail fast with retry_after instead of waiting for a dead provider.
+# Rates are per deployment: with ALFA_WORKERS > 1 every worker gets its share.
+WORKERS = max(1, int(os.getenv("ALFA_WORKERS", "1")))
+PROVIDER_RATE = {
+    provider: float(os.getenv(f"ALFA_{provider.upper()}_RATE", "50" if provider == "ollama" else "10")) / WORKERS
+    for provider in AI_PROVIDERS
+}
+PROVIDER_BURST = float(os.getenv("ALFA_RATE_BURST", "20"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("ALFA_RATE_MAX_WAIT", "2.0"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("ALFA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("ALFA_BREAKER_RESET", "30"))
+
+# Providers called through their async SDKs; each SDK client keeps its own
+# connection pool and is cached per (provider, api_key)
+SDK_PROVIDERS = ("openai", "anthropic")
+SDK_CLIENT_CACHE_SIZE = 256
+
+# Response cache (optional): in-memory LRU + SQLite, see alfa_cache.py
+RESPONSE_CACHE_ENABLED = os.getenv("ALFA_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("ALFA_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("ALFA_CACHE_TTL", "3600"))
+# User session registry: LRU-bounded, idle eviction, write-behind to one SQLite store
+SESSION_MAX = int(os.getenv("ALFA_SESSION_MAX", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("ALFA_SESSION_IDLE_TTL", "1800"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("ALFA_SESSION_FLUSH_INTERVAL", "2.0"))
+SESSION_STORE_PATH = Path(os.getenv("ALFA_SESSION_STORE", str(Path.home() / ".alfa" / "users.db")))
+SESSION_LEGACY_DIR = Path.home() / ".alfa" / "users"
+AUTH_SESSION_STORE_PATH = Path(
+    os.getenv("ALFA_AUTH_SESSION_STORE", str(Path.home() / ".alfa" / "auth_sessions.db"))
+)
+
+# Verified login sessions cached per session_id (dropped on /auth/logout)
+AUTH_CACHE_TTL = float(os.getenv("ALFA_AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("ALFA_AUTH_CACHE_SIZE", "10000"))
+
+# Server-side conversation history (append-only log + token-budgeted windows)
+CONVERSATION_STORE_PATH = Path(
+    os.getenv("ALFA_CONVERSATION_STORE", str(Path.home() / ".alfa" / "conversations.db"))
+)
+CONVERSATION_WINDOWS = int(os.getenv("ALFA_CONVERSATION_WINDOWS", "1000"))
+
+# Context window per model (tokens). History sent with each turn is capped at
+# min(context - reply reserve, HISTORY_MAX_TOKENS) to keep prompts cheap.
+MODEL_CONTEXT_TOKENS = {
+    "gemini-pro": 30720,
+    "gemini-pro-vision": 12288,
+    "gemini-1.5-pro": 1048576,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+    "claude-3-opus": 200000,
+    "claude-3-sonnet": 200000,
+    "claude-3-haiku": 200000,
+    "deepseek-chat": 64000,
+    "deepseek-coder": 16000,
+    "llama3": 8192,
+    "mistral": 8192,
+    "codellama": 16384,
+    "deepseek-r1": 8192
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+REPLY_RESERVE_TOKENS = 1024
+HISTORY_MAX_TOKENS = int(os.getenv("ALFA_HISTORY_MAX_TOKENS", "8000"))
+
+# Multi-provider modes: model="race:<a>,<b>,..." starts all candidates at once,
+# model="hedge:<a>,<b>,..." starts the next one only if the previous has not
+# answered within HEDGE_DELAY seconds. First successful answer wins.
+# model="auto" picks the fastest healthy model the user has a key for, from a
+# rolling per-model latency / error table (see alfa_routing.py).
+# ALFA_AUTO_MODELS limits the candidates (comma separated model names).
+AUTO_MODEL = "auto"
+AUTO_MODELS = [m.strip() for m in os.getenv("ALFA_AUTO_MODELS", "").split(",") if m.strip()]
+AUTO_PRIOR_MS = float(os.getenv("ALFA_AUTO_PRIOR_MS", "2000"))
+AUTO_EXPLORE = float(os.getenv("ALFA_AUTO_EXPLORE", "0.05"))
+
+# /api/chat/batch: prompts answered in parallel, results streamed as NDJSON
+BATCH_CONCURRENCY = int(os.getenv("ALFA_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("ALFA_BATCH_MAX_CONCURRENCY", "64"))
+BATCH_MAX_ITEMS = int(os.getenv("ALFA_BATCH_MAX_ITEMS", "10000"))
+
+RACE_PREFIX = "race:"
+HEDGE_PREFIX = "hedge:"
+HEDGE_DELAY = float(os.getenv("ALFA_HEDGE_DELAY", "2.0"))
+
+# Web UI templates and static assets (see alfa_web.py)
+WEB_TEMPLATES_DIR = Path(__file__).parent / "alfa_templates"
+WEB_STATIC_DIR = Path(__file__).parent / "alfa_static"
+
+HOME_FEATURES = [
+    ("🌐", "Gemini"),
+    ("🤖", "GPT-4"),
+    ("🧠", "Claude"),
+    ("🚀", "DeepSeek"),
+    ("🏠", "Ollama")
+]
+
+# Model picker of the chat page: (group, [(model, label), ...])
+CHAT_MODEL_GROUPS = [
+    ("Auto", [("auto", "Auto (najszybszy)")]),
+    ("Google", [("gemini-pro", "Gemini Pro"), ("gemini-1.5-pro", "Gemini 1.5 Pro")]),
+    ("OpenAI", [("gpt-4", "GPT-4"), ("gpt-4o", "GPT-4o")]),
+    ("Anthropic", [("claude-3-sonnet", "Claude 3 Sonnet"), ("claude-3-opus", "Claude 3 Opus")]),
+    ("DeepSeek", [("deepseek-chat", "DeepSeek Chat")]),
+    ("Local (Ollama)", [("ollama-llama3", "LLaMA 3"), ("ollama-mistral", "Mistral")])
+]
+
+RESPONSE_CACHE_PATH = Path(os.getenv("ALFA_CACHE_PATH", str(Path.home() / ".alfa" / "cache.db")))
+
+# Where user settings, login sessions, conversations and cached responses live
+# (see alfa_state.py): "sqlite" is shared by all `uvicorn --workers N` processes,
+# "memory" keeps everything in the process (tests, single worker only).
+STATE_BACKEND = os.getenv("ALFA_STATE_BACKEND", "sqlite").lower()
+
+
+def create_state(backend: str = STATE_BACKEND) -> StateBackend:
+    if backend == "memory":
+        return memory_state()
+    if backend == "sqlite":
+        return sqlite_state(
+            SESSION_STORE_PATH,
+            AUTH_SESSION_STORE_PATH,
+            CONVERSATION_STORE_PATH,
+            RESPONSE_CACHE_PATH,
+            legacy_sessions_dir=SESSION_LEGACY_DIR
+        )
+    raise ValueError(f"Unknown ALFA_STATE_BACKEND: {backend}")
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # DATA MODELS
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Provider-neutral chat history: [{"role": "user" | "assistant", "content": ...}]
+Messages = List[Dict[str, str]]
+
+
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
     content: str
@@ -105,6 +299,33 @@ class ChatRequest(BaseModel):
     message: str
     model: str = "gemini-pro"
     conversation_id: Optional[str] = None
+    # Optional generation params (None = provider default)
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    max_tokens: Optional[int] = None
+    
+    def generation_params(self) -> Dict[str, Any]:
+        """Generation params that were explicitly set"""
+        params = {"temperature": self.temperature, "top_p": self.top_p, "max_tokens": self.max_tokens}
+        return {k: v for k, v in params.items() if v is not None}
+
+
+class BatchChatItem(BaseModel):
+    message: str
+    model: Optional[str] = None  # None = BatchChatRequest.model
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    max_tokens: Optional[int] = None
+    
+    def generation_params(self) -> Dict[str, Any]:
+        params = {"temperature": self.temperature, "top_p": self.top_p, "max_tokens": self.max_tokens}
+        return {k: v for k, v in params.items() if v is not None}
+
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    model: str = "gemini-pro"
+    concurrency: Optional[int] = None  # None = BATCH_CONCURRENCY
 
 
 class APIKeyConfig(BaseModel):
@@ -113,39 +334,34 @@ class APIKeyConfig(BaseModel):
 
 
 class UserSession:
-    """User session with API keys and conversation history"""
+    """
+    User session with API keys.
+    Persistence is handled by SessionRegistry (write-behind), see alfa_sessions.py.
+    """
     
-    def __init__(self, user_email: str):
+    def __init__(
+        self,
+        user_email: str,
+        record: Optional[Dict[str, Any]] = None,
+        on_change: Optional[Callable[["UserSession"], None]] = None
+    ):
         self.user_email = user_email
-        self.api_keys: Dict[str, str] = {}
-        self.conversations: Dict[str, List[ChatMessage]] = {}
+        self.api_keys: Dict[str, str] = dict((record or {}).get("api_keys", {}))
         self.created_at = datetime.now()
-        self.config_path = Path.home() / ".alfa" / "users" / f"{user_email}.json"
-        self._load()
-    
-    def _load(self):
-        """Load user config from disk"""
-        if self.config_path.exists():
-            try:
-                data = json.loads(self.config_path.read_text())
-                self.api_keys = data.get("api_keys", {})
-            except Exception:
-                pass
-    
-    def _save(self):
-        """Save user config to disk (encrypted in production)"""
-        self.config_path.parent.mkdir(parents=True, exist_ok=True)
-        data = {
-            "user_email": self.user_email,
-            "api_keys": self.api_keys,  # TODO: Encrypt with CERBER
-            "updated_at": datetime.now().isoformat()
+        self.last_seen = time.monotonic()
+        self._on_change = on_change
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Persistent part of the session"""
+        return {
+            "api_keys": dict(self.api_keys)  # TODO: Encrypt with CERBER
         }
-        self.config_path.write_text(json.dumps(data, indent=2))
     
     def set_api_key(self, provider: str, key: str):
-        """Set API key for provider"""
+        """Set API key for provider (saved in the background)"""
         self.api_keys[provider] = key
-        self._save()
+        if self._on_change:
+            self._on_change(self)
     
     def get_api_key(self, provider: str) -> Optional[str]:
         """Get API key for provider"""
@@ -162,45 +378,325 @@ class AIFederation:
     Każdy model używa LEGALNYCH, OFICJALNYCH API.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        pool_limits: httpx.Limits = HTTP_POOL_LIMITS,
+        concurrency: Optional[Dict[str, int]] = None,
+        cache: Optional[ResponseCache] = None,
+        sessions: Optional[SessionRegistry] = None,
+        conversations: Optional[ConversationManager] = None,
+        metrics: Optional[AlfaMetrics] = None,
+        state: Optional[StateBackend] = None
+    ):
         self.model_manager = get_model_manager()
-        self.sessions: Dict[str, UserSession] = {}
+        self.state = state or create_state()
+        # Stores shared with other workers (ALFA_WORKERS or uvicorn --workers):
+        # cached copies are revalidated, at most once a second per key
+        shared = self.state.shared
+        self.sessions = sessions or SessionRegistry(
+            self.state.sessions,
+            factory=self._new_session,
+            max_sessions=SESSION_MAX,
+            idle_ttl=SESSION_IDLE_TTL,
+            flush_interval=SESSION_FLUSH_INTERVAL,
+            revalidate=shared
+        )
+        self.conversations = conversations or ConversationManager(
+            self.state.conversations,
+            max_windows=CONVERSATION_WINDOWS,
+            revalidate=shared
+        )
+        self.pool_limits = pool_limits
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._sdk_clients: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._limits = {
+            provider: asyncio.Semaphore(limit)
+            for provider, limit in {**PROVIDER_CONCURRENCY, **(concurrency or {})}.items()
+        }
+        self.guards = {
+            provider: ProviderGuard(
+                provider,
+                lambda provider=provider: AdaptiveTokenBucket(rate=PROVIDER_RATE[provider], burst=PROVIDER_BURST),
+                CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT),
+                max_wait=RATE_LIMIT_MAX_WAIT
+            )
+            for provider in AI_PROVIDERS
+        }
+        self.router = LatencyRouter(
+            self._routable_models(),
+            prior_ms=AUTO_PRIOR_MS,
+            explore=AUTO_EXPLORE
+        )
+        self.ollama = OllamaWarmPool(
+            lambda: self._http_client("ollama"),
+            preload=OLLAMA_PRELOAD,
+            min_keep_alive=OLLAMA_KEEP_ALIVE_MIN,
+            max_keep_alive=OLLAMA_KEEP_ALIVE_MAX,
+            usage_window=OLLAMA_USAGE_WINDOW,
+            refresh_interval=OLLAMA_PS_INTERVAL
+        )
+        self.ollama_contexts = OllamaContextCache(OLLAMA_CONTEXT_TOKENS, OLLAMA_CONTEXT_TTL)
+        self.cache = cache
+        self.singleflight = SingleFlight()
+        self.metrics = metrics or AlfaMetrics(
+            models=[m for _, m in self._routable_models()] + [
+                m for provider, config in AI_PROVIDERS.items() for m in config["models"]
+            ],
+            providers=AI_PROVIDERS
+        )
+        self.metrics.add_stats_source("sessions", self.sessions.stats)
+        self.metrics.add_stats_source("singleflight", self.singleflight.stats)
+        self.metrics.add_stats_source(
+            "upstream",
+            lambda: {provider: guard.stats() for provider, guard in self.guards.items()},
+            label="provider"
+        )
+        self.metrics.add_stats_source("ollama", self.ollama.stats)
+        self.metrics.add_stats_source("ollama_contexts", self.ollama_contexts.stats)
+        if cache is not None:
+            self.metrics.add_stats_source("cache", cache.stats)
+    
+    def _routable_models(self) -> List[tuple]:
+        """(provider, model) candidates of the "auto" model"""
+        models = []
+        for provider, config in AI_PROVIDERS.items():
+            for model in config["models"]:
+                # "ollama-deepseek-r1" must not be routed to the DeepSeek API
+                name = f"ollama-{model}" if provider == "ollama" else model
+                if not AUTO_MODELS or name in AUTO_MODELS or model in AUTO_MODELS:
+                    models.append((provider, name))
+        return models
+    
+    def route_auto(self, user_email: str) -> Optional[str]:
+        """Fastest healthy model the user has an API key for"""
+        session = self.get_session(user_email)
+        return self.router.choose(
+            allowed=lambda provider: self._missing_key_error(provider, session) is None,
+            healthy=lambda provider: self.guards[provider].breaker.state != CircuitBreaker.OPEN,
+            # Local models not in memory would pay a model load first
+            extra_ms=lambda model: self.ollama.load_penalty_ms(model) if model.startswith("ollama-") else 0.0
+        )
+    
+    def routing_table(self) -> Dict[str, Any]:
+        """Routing table of the "auto" model (for /api/routing)"""
+        return {
+            "models": self.router.table(),
+            "providers": {
+                provider: guard.breaker.state for provider, guard in self.guards.items()
+            }
+        }
+    
+    async def startup(self):
+        """Start session write-behind, open pooled keep-alive HTTP clients, warm Ollama models"""
+        await self.sessions.start()
+        for provider in AI_PROVIDERS:
+            if provider not in SDK_PROVIDERS:
+                self._http_client(provider)
+        await self.ollama.start()
+    
+    async def shutdown(self):
+        """Flush sessions, close all pooled HTTP and SDK clients"""
+        await self.ollama.stop()
+        await self.sessions.stop()
+        sdk_clients, self._sdk_clients = list(self._sdk_clients.values()), OrderedDict()
+        clients, self._http_clients = self._http_clients, {}
+        await asyncio.gather(
+            *(client.aclose() for client in clients.values()),
+            *(client.close() for client in sdk_clients)
+        )
+        if self.cache is not None:
+            self.cache.close()
+        self.conversations.close()
+        self.state.close()
+    
+    def _http_client(self, provider: str) -> httpx.AsyncClient:
+        """Get the long-lived pooled client for provider (created on first use)"""
+        client = self._http_clients.get(provider)
+        if client is None or client.is_closed:
+            config = AI_PROVIDERS[provider]
+            client = httpx.AsyncClient(
+                base_url=config["base_url"],
+                timeout=config.get("timeout", 60.0),
+                limits=self.pool_limits
+            )
+            self._http_clients[provider] = client
+        return client
+    
+    def _sdk_client(self, provider: str, api_key: str, factory) -> Any:
+        """Get cached async SDK client for (provider, api_key), LRU-bounded"""
+        key = (provider, api_key)
+        client = self._sdk_clients.get(key)
+        if client is None:
+            client = factory(api_key)
+            self._sdk_clients[key] = client
+            if len(self._sdk_clients) > SDK_CLIENT_CACHE_SIZE:
+                _, evicted = self._sdk_clients.popitem(last=False)
+                asyncio.get_running_loop().create_task(evicted.close())
+        else:
+            self._sdk_clients.move_to_end(key)
+        return client
+    
+    def _openai_client(self, api_key: str) -> Any:
+        """Cached AsyncOpenAI client"""
+        from openai import AsyncOpenAI
+        
+        return self._sdk_client("openai", api_key, lambda key: AsyncOpenAI(
+            api_key=key,
+            base_url=AI_PROVIDERS["openai"]["base_url"],
+            timeout=AI_PROVIDERS["openai"]["timeout"]
+        ))
+    
+    def _claude_client(self, api_key: str) -> Any:
+        """Cached AsyncAnthropic client"""
+        import anthropic
+        
+        return self._sdk_client("anthropic", api_key, lambda key: anthropic.AsyncAnthropic(
+            api_key=key,
+            base_url=AI_PROVIDERS["anthropic"]["base_url"],
+            timeout=AI_PROVIDERS["anthropic"]["timeout"]
+        ))
     
     def get_session(self, user_email: str) -> UserSession:
         """Get or create user session"""
-        if user_email not in self.sessions:
-            self.sessions[user_email] = UserSession(user_email)
-        return self.sessions[user_email]
+        return self.sessions.get(user_email)
+    
+    def _new_session(self, user_email: str, record: Dict[str, Any]) -> UserSession:
+        """SessionRegistry factory"""
+        return UserSession(user_email, record, on_change=self.sessions.mark_dirty)
     
     async def chat(
         self, 
         user_email: str,
         message: str, 
         model: str = "gemini-pro",
-        conversation_id: Optional[str] = None
+        conversation_id: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Send message to AI model.
         Uses user's own API keys (legal!).
+        `params` are optional generation params (temperature, top_p, max_tokens).
+        `model` may also be "race:<a>,<b>,...", "hedge:<a>,<b>,..." or "auto".
+        Without `conversation_id` a new conversation is started; the id is
+        returned so the client can continue it.
         """
+        if model == AUTO_MODEL:
+            model = self.route_auto(user_email)
+            if model is None:
+                return {"error": "No healthy model available for your API keys", "model": AUTO_MODEL}
+        
+        models, mode, delay = self._plan(model)
+        if not models:
+            return {"error": "No models given after race: / hedge:", "model": model}
+        
+        try:
+            conversation_id = await self.conversations.open(conversation_id, user_email)
+        except ConversationNotFound:
+            return {"error": f"Conversation not found: {conversation_id}", "model": model}
+        history = await self.conversations.context(conversation_id, self._history_budget(models, params))
+        
+        if mode:
+            result = await self._chat_hedged(user_email, message, models, params, delay, mode, history)
+        else:
+            result = await self._chat_single(user_email, message, model, params, history)
+        
+        if result.get("success"):
+            await self.conversations.append_turn(conversation_id, result["model"], message, result["response"])
+        result["conversation_id"] = conversation_id
+        return result
+    
+    async def chat_batch(
+        self,
+        user_email: str,
+        items: List[Dict[str, Any]],
+        concurrency: int = 8
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer many one-off prompts ({"message", "model", "params"}) with at
+        most `concurrency` in flight; no conversation history is kept.
+        Results are yielded as they complete, tagged with their "index".
+        A failing item yields its error and does not stop the batch.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(items))
+        
+        async def worker():
+            for index, item in pending:
+                try:
+                    result = await self._chat_once(
+                        user_email, item["message"], item["model"], item.get("params")
+                    )
+                except Exception as e:
+                    result = {"error": str(e), "model": item.get("model")}
+                await results.put({"index": index, **result})
+        
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    async def _chat_once(
+        self,
+        user_email: str,
+        message: str,
+        model: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Single prompt without conversation (auto / race / hedge supported)"""
+        if model == AUTO_MODEL:
+            model = self.route_auto(user_email)
+            if model is None:
+                return {"error": "No healthy model available for your API keys", "model": AUTO_MODEL}
+        
+        models, mode, delay = self._plan(model)
+        if not models:
+            return {"error": "No models given after race: / hedge:", "model": model}
+        if mode:
+            return await self._chat_hedged(user_email, message, models, params, delay, mode)
+        return await self._chat_single(user_email, message, model, params)
+    
+    def _plan(self, model: str) -> tuple:
+        """(candidate models, "race" | "hedge" | None, hedge delay) for a model string"""
+        for prefix, mode, delay in ((RACE_PREFIX, "race", 0.0), (HEDGE_PREFIX, "hedge", HEDGE_DELAY)):
+            if model.startswith(prefix):
+                return self._parse_candidates(model, prefix), mode, delay
+        return [model], None, 0.0
+    
+    def _history_budget(self, models: List[str], params: Optional[Dict[str, Any]]) -> int:
+        """Token budget for conversation history (smallest among candidate models)"""
+        reserve = (params or {}).get("max_tokens", REPLY_RESERVE_TOKENS)
+        context = min(
+            MODEL_CONTEXT_TOKENS.get(m.replace("ollama-", "").split(":")[0], DEFAULT_CONTEXT_TOKENS)
+            for m in models
+        )
+        return max(0, min(context - reserve, HISTORY_MAX_TOKENS))
+    
+    async def _chat_single(
+        self,
+        user_email: str,
+        message: str,
+        model: str,
+        params: Optional[Dict[str, Any]] = None,
+        history: Optional[Messages] = None
+    ) -> Dict[str, Any]:
+        """Send message to a single AI model"""
         session = self.get_session(user_email)
         
         # Determine provider from model name
         provider = self._get_provider(model)
         
         # Check if we have API key (except Ollama which is local)
-        if provider != "ollama":
-            api_key = session.get_api_key(provider)
-            if not api_key:
-                return {
-                    "error": f"API key not configured for {provider}",
-                    "setup_url": AI_PROVIDERS[provider]["official_url"],
-                    "message": f"Please add your {AI_PROVIDERS[provider]['name']} API key in Settings"
-                }
+        missing_key = self._missing_key_error(provider, session)
+        if missing_key:
+            return missing_key
         
         try:
             # Call the appropriate AI
-            response = await self._call_ai(provider, model, message, session)
+            response = await self._call_ai(provider, model, message, session, params, history)
             
             return {
                 "success": True,
@@ -210,6 +706,14 @@ class AIFederation:
                 "timestamp": datetime.now().isoformat()
             }
             
+        except ProviderUnavailable as e:
+            self.metrics.upstream_rejected(provider, e)
+            return {
+                "error": str(e),
+                "model": model,
+                "provider": provider,
+                "retry_after": round(e.retry_after, 1)
+            }
         except Exception as e:
             return {
                 "error": str(e),
@@ -217,6 +721,173 @@ class AIFederation:
                 "provider": provider
             }
     
+    @staticmethod
+    def _parse_candidates(model: str, prefix: str) -> List[str]:
+        """"race:gpt-4o, claude-3-haiku" -> ["gpt-4o", "claude-3-haiku"]"""
+        return [m.strip() for m in model[len(prefix):].split(",") if m.strip()]
+    
+    async def _chat_hedged(
+        self,
+        user_email: str,
+        message: str,
+        models: List[str],
+        params: Optional[Dict[str, Any]],
+        delay: float,
+        mode: str,
+        history: Optional[Messages] = None
+    ) -> Dict[str, Any]:
+        """
+        Start models[0], then each next candidate after `delay` seconds without
+        an answer (or right after a failure). Return the first success and
+        cancel the rest. delay=0 sends to all candidates at once (race).
+        """
+        started = time.perf_counter()
+        queue = list(models)
+        pending: Dict[asyncio.Task, str] = {}
+        errors: Dict[str, str] = {}
+        
+        try:
+            while queue or pending:
+                if queue:
+                    candidate = queue.pop(0)
+                    task = asyncio.create_task(
+                        self._chat_single(user_email, message, candidate, params, history)
+                    )
+                    pending[task] = candidate
+                
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=delay if queue else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    candidate = pending.pop(task)
+                    result = task.result()
+                    if result.get("success"):
+                        result[mode] = {
+                            "candidates": models,
+                            "winner": candidate,
+                            "launched": len(models) - len(queue),
+                            "failed": errors,
+                            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+                        }
+                        return result
+                    errors[candidate] = result.get("error", "unknown error")
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        return {
+            "error": f"All {mode} candidates failed",
+            "model": f"{mode}:{','.join(models)}",
+            "errors": errors
+        }
+    
+    async def chat_stream(
+        self,
+        user_email: str,
+        message: str,
+        model: str = "gemini-pro",
+        conversation_id: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream response from AI model as events:
+        {"event": "delta", "text": ...}, then {"event": "done", "ttft_ms": ...}
+        or {"event": "error", ...}.
+        Race / hedge models are answered with a single delta.
+        """
+        if model == AUTO_MODEL:
+            model = self.route_auto(user_email)
+            if model is None:
+                yield {"event": "error", "error": "No healthy model available for your API keys", "model": AUTO_MODEL}
+                return
+        
+        if model.startswith((RACE_PREFIX, HEDGE_PREFIX)):
+            started = time.perf_counter()
+            result = await self.chat(user_email, message, model, conversation_id, params)
+            if not result.get("success"):
+                yield {"event": "error", **result}
+                return
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield {"event": "delta", "text": result["response"]}
+            yield {
+                "event": "done",
+                "model": result["model"],
+                "provider": result["provider"],
+                "ttft_ms": elapsed_ms,
+                "total_ms": elapsed_ms,
+                "conversation_id": result["conversation_id"],
+                "timestamp": result["timestamp"]
+            }
+            return
+        
+        session = self.get_session(user_email)
+        provider = self._get_provider(model)
+        
+        missing_key = self._missing_key_error(provider, session)
+        if missing_key:
+            yield {"event": "error", **missing_key}
+            return
+        
+        try:
+            conversation_id = await self.conversations.open(conversation_id, user_email)
+        except ConversationNotFound:
+            yield {"event": "error", "error": f"Conversation not found: {conversation_id}", "model": model}
+            return
+        history = await self.conversations.context(conversation_id, self._history_budget([model], params))
+        messages = [*history, {"role": "user", "content": message}]
+        
+        started = time.perf_counter()
+        ttft_ms = None
+        parts: List[str] = []
+        try:
+            guard = self.guards[provider].guard(self._credential(provider, session))
+            async with guard, self._limits[provider], self._track(provider, model):
+                async for text in self._stream_ai(provider, model, messages, session, params or {}):
+                    if not text:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                        self.metrics.observe_ttft(provider, model, ttft_ms / 1000)
+                    parts.append(text)
+                    yield {"event": "delta", "text": text}
+        except ProviderUnavailable as e:
+            self.metrics.upstream_rejected(provider, e)
+            yield {
+                "event": "error",
+                "error": str(e),
+                "model": model,
+                "provider": provider,
+                "retry_after": round(e.retry_after, 1)
+            }
+            return
+        except Exception as e:
+            yield {"event": "error", "error": str(e), "model": model, "provider": provider}
+            return
+        
+        await self.conversations.append_turn(conversation_id, model, message, "".join(parts))
+        
+        yield {
+            "event": "done",
+            "model": model,
+            "provider": provider,
+            "conversation_id": conversation_id,
+            "ttft_ms": ttft_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _missing_key_error(self, provider: str, session: UserSession) -> Optional[Dict[str, Any]]:
+        """Error payload if provider needs an API key the user has not set"""
+        if provider == "ollama" or session.get_api_key(provider):
+            return None
+        return {
+            "error": f"API key not configured for {provider}",
+            "setup_url": AI_PROVIDERS[provider]["official_url"],
+            "message": f"Please add your {AI_PROVIDERS[provider]['name']} API key in Settings"
+        }
+    
     def _get_provider(self, model: str) -> str:
         """Get provider name from model name"""
         model_lower = model.lower()
@@ -237,105 +908,358 @@ class AIFederation:
         provider: str, 
         model: str, 
         message: str,
-        session: UserSession
+        session: UserSession,
+        params: Optional[Dict[str, Any]] = None,
+        history: Optional[Messages] = None
     ) -> str:
-        """Call specific AI provider"""
+        """
+        Call specific AI provider (bounded by the provider's concurrency cap,
+        rate limiter and circuit breaker - raises ProviderUnavailable when the
+        call is rejected locally).
+        `history` are earlier turns of the conversation sent before `message`.
+        Identical calls in flight share one upstream call (only between
+        callers using the same API key); deterministic calls are also served
+        from / stored in the response cache.
+        """
+        params = params or {}
+        history = history or []
+        messages = [*history, {"role": "user", "content": message}]
         
+        credential = self._credential(provider, session)
+        key = make_key(provider, model, message, params, history, credential)
+        cacheable = self.cache is not None and is_deterministic(params)
+        if self.cache is not None:
+            if not cacheable:
+                self.cache.bypass()
+            else:
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    return cached
+        
+        async def upstream() -> str:
+            async with self.guards[provider].guard(credential), self._limits[provider], self._track(provider, model):
+                response = await self._dispatch(provider, model, messages, session, params)
+            if cacheable:
+                await self.cache.set(key, response)
+            return response
+        
+        return await self.singleflight.do(key, upstream)
+    
+    @staticmethod
+    def _credential(provider: str, session: UserSession) -> str:
+        """Id of the API key a call runs with (rate limits / cache keys are per key)"""
+        return credential_id(session.get_api_key(provider)) if provider != "ollama" else ""
+    
+    @asynccontextmanager
+    async def _track(self, provider: str, model: str) -> AsyncIterator[None]:
+        """Feed upstream latency / errors into the routing table and metrics"""
+        started = time.perf_counter()
+        self.metrics.upstream_started(provider)
+        try:
+            yield
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            self.metrics.upstream_finished(provider, model, elapsed, e)
+            # Client errors (bad key, bad request) say nothing about the model
+            if classify_error(e) != "client":
+                self.router.record(model, elapsed * 1000, ok=False)
+            raise
+        except BaseException:
+            # Cancelled (lost race, client gone): only close the in-flight gauge
+            self.metrics.upstream_cancelled(provider)
+            raise
+        else:
+            elapsed = time.perf_counter() - started
+            self.metrics.upstream_finished(provider, model, elapsed)
+            self.router.record(model, elapsed * 1000, ok=True)
+    
+    async def _dispatch(
+        self, 
+        provider: str, 
+        model: str, 
+        messages: Messages,
+        session: UserSession,
+        params: Dict[str, Any]
+    ) -> str:
+        """Route call to provider implementation"""
         if provider == "gemini":
-            return await self._call_gemini(model, message, session)
+            return await self._call_gemini(model, messages, session, params)
         elif provider == "openai":
-            return await self._call_openai(model, message, session)
+            return await self._call_openai(model, messages, session, params)
         elif provider == "anthropic":
-            return await self._call_claude(model, message, session)
+            return await self._call_claude(model, messages, session, params)
         elif provider == "deepseek":
-            return await self._call_deepseek(model, message, session)
+            return await self._call_deepseek(model, messages, session, params)
         else:
-            return await self._call_ollama(model, message)
+            return await self._call_ollama(model, messages, params)
     
-    async def _call_gemini(self, model: str, message: str, session: UserSession) -> str:
-        """Call Google Gemini API"""
-        import google.generativeai as genai
-        
+    # ─────────────────────────────────────────────────────────────────────────
+    # REQUEST BUILDERS (shared by blocking and streaming calls)
+    # ─────────────────────────────────────────────────────────────────────────
+    
+    @staticmethod
+    def _openai_body(model: str, messages: Messages, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat-completions body for OpenAI / DeepSeek"""
+        body = {"model": model, "messages": messages}
+        body.update({k: params[k] for k in ("temperature", "top_p", "max_tokens") if k in params})
+        return body
+    
+    @staticmethod
+    def _claude_body(model: str, messages: Messages, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Messages API body for Claude"""
+        body = {
+            "model": model,
+            "max_tokens": params.get("max_tokens", 4096),
+            "messages": messages
+        }
+        body.update({k: params[k] for k in ("temperature", "top_p") if k in params})
+        return body
+    
+    @staticmethod
+    def _gemini_body(messages: Messages, params: Dict[str, Any]) -> Dict[str, Any]:
+        """generateContent body for Gemini"""
+        body: Dict[str, Any] = {"contents": [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in messages
+        ]}
+        names = {"temperature": "temperature", "top_p": "topP", "max_tokens": "maxOutputTokens"}
+        config = {names[k]: v for k, v in params.items() if k in names}
+        if config:
+            body["generationConfig"] = config
+        return body
+    
+    def _ollama_body(self, model: str, messages: Messages, params: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        """/api/chat body for Ollama (keep_alive from the warm pool)"""
+        body: Dict[str, Any] = {
+            "model": model.replace("ollama-", ""),
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.ollama.keep_alive(model)
+        }
+        names = {"temperature": "temperature", "top_p": "top_p", "max_tokens": "num_predict"}
+        options = {names[k]: v for k, v in params.items() if k in names}
+        if options:
+            body["options"] = options
+        return body
+    
+    def _ollama_request(self, model: str, messages: Messages, params: Dict[str, Any], stream: bool) -> tuple:
+        """
+        (path, body) for Ollama: /api/generate continuing the stored context
+        of the earlier turns (only the new message is sent). When no context
+        is known for them, the full history goes to /api/generate as one
+        templated prompt, so the reply carries a context for the next turn.
+        """
+        body = self._ollama_body(model, messages, params, stream)
+        if not OLLAMA_CONTEXT_REUSE:
+            return "/api/chat", body
+        context = self.ollama_contexts.get(model, messages[:-1])
+        del body["messages"]
+        if context is None:
+            system, body["prompt"] = transcript_prompt(messages)
+            if system:
+                body["system"] = system
+            return "/api/generate", body
+        body["prompt"] = messages[-1]["content"]
+        if context:
+            body["context"] = context
+        return "/api/generate", body
+    
+    def _ollama_done(self, model: str, messages: Messages, reply: str, data: Dict[str, Any]):
+        """Final Ollama response: residency stats, context of this turn for the next one"""
+        self.ollama.observe(model, data)
+        if data.get("context"):
+            self.ollama_contexts.put(
+                model,
+                [*messages, {"role": "assistant", "content": reply}],
+                data["context"],
+                parent=messages[:-1]
+            )
+    
+    @staticmethod
+    def _ollama_text(data: Dict[str, Any]) -> str:
+        """Reply text of an /api/generate or /api/chat response (chunk)"""
+        if "response" in data:
+            return data["response"]
+        return data.get("message", {}).get("content", "")
+    
+    # ─────────────────────────────────────────────────────────────────────────
+    # PROVIDER CALLS
+    # ─────────────────────────────────────────────────────────────────────────
+    
+    async def _call_gemini(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> str:
+        """Call Google Gemini REST API (async, no global genai.configure state)"""
         api_key = session.get_api_key("gemini")
-        genai.configure(api_key=api_key)
         
-        model_instance = genai.GenerativeModel(model)
-        response = model_instance.generate_content(message)
-        
-        return response.text
+        response = await self._http_client("gemini").post(
+            f"/v1beta/models/{model}:generateContent",
+            headers={"x-goog-api-key": api_key},
+            json=self._gemini_body(messages, params)
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["candidates"][0]["content"]["parts"][0]["text"]
     
-    async def _call_openai(self, model: str, message: str, session: UserSession) -> str:
+    async def _call_openai(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> str:
         """Call OpenAI API"""
-        from openai import OpenAI
+        client = self._openai_client(session.get_api_key("openai"))
         
-        client = OpenAI(api_key=session.get_api_key("openai"))
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": message}]
-        )
+        response = await client.chat.completions.create(**self._openai_body(model, messages, params))
         
         return response.choices[0].message.content
     
-    async def _call_claude(self, model: str, message: str, session: UserSession) -> str:
+    async def _call_claude(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> str:
         """Call Anthropic Claude API"""
-        import anthropic
+        client = self._claude_client(session.get_api_key("anthropic"))
         
-        client = anthropic.Anthropic(api_key=session.get_api_key("anthropic"))
-        
-        response = client.messages.create(
-            model=model,
-            max_tokens=4096,
-            messages=[{"role": "user", "content": message}]
-        )
+        response = await client.messages.create(**self._claude_body(model, messages, params))
         
         return response.content[0].text
     
-    async def _call_deepseek(self, model: str, message: str, session: UserSession) -> str:
+    async def _call_deepseek(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> str:
         """Call DeepSeek API"""
-        import httpx
-        
         api_key = session.get_api_key("deepseek")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {api_key}"},
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": message}]
-                }
-            )
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
+        response = await self._http_client("deepseek").post(
+            "/v1/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=self._openai_body(model, messages, params)
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
     
-    async def _call_ollama(self, model: str, message: str) -> str:
+    async def _call_ollama(self, model: str, messages: Messages, params: Dict[str, Any]) -> str:
         """Call local Ollama"""
-        import httpx
-        
-        ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-        
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{ollama_host}/api/generate",
-                json={
-                    "model": model.replace("ollama-", ""),
-                    "prompt": message,
-                    "stream": False
-                }
-            )
-            data = response.json()
-            return data.get("response", "No response from Ollama")
+        self.ollama.touch(model)
+        path, body = self._ollama_request(model, messages, params, stream=False)
+        response = await self._http_client("ollama").post(path, json=body)
+        response.raise_for_status()
+        data = response.json()
+        reply = self._ollama_text(data) or "No response from Ollama"
+        self._ollama_done(model, messages, reply, data)
+        return reply
+    
+    # ─────────────────────────────────────────────────────────────────────────
+    # STREAMING
+    # ─────────────────────────────────────────────────────────────────────────
+    
+    def _stream_ai(
+        self,
+        provider: str,
+        model: str,
+        messages: Messages,
+        session: UserSession,
+        params: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Stream text deltas from specific AI provider"""
+        if provider == "gemini":
+            return self._stream_gemini(model, messages, session, params)
+        elif provider == "openai":
+            return self._stream_openai(model, messages, session, params)
+        elif provider == "anthropic":
+            return self._stream_claude(model, messages, session, params)
+        elif provider == "deepseek":
+            return self._stream_deepseek(model, messages, session, params)
+        else:
+            return self._stream_ollama(model, messages, params)
+    
+    @staticmethod
+    async def _iter_sse_json(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+        """Parse `data:` lines of an upstream SSE response as JSON"""
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if not payload or payload == "[DONE]":
+                continue
+            yield json.loads(payload)
+    
+    async def _stream_gemini(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream Google Gemini REST API (SSE)"""
+        async with self._http_client("gemini").stream(
+            "POST",
+            f"/v1beta/models/{model}:streamGenerateContent",
+            params={"alt": "sse"},
+            headers={"x-goog-api-key": session.get_api_key("gemini")},
+            json=self._gemini_body(messages, params)
+        ) as response:
+            response.raise_for_status()
+            async for data in self._iter_sse_json(response):
+                for candidate in data.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        yield part.get("text", "")
+    
+    async def _stream_openai(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream OpenAI API"""
+        client = self._openai_client(session.get_api_key("openai"))
+        
+        stream = await client.chat.completions.create(
+            **self._openai_body(model, messages, params),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    
+    async def _stream_claude(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream Anthropic Claude API"""
+        client = self._claude_client(session.get_api_key("anthropic"))
+        
+        async with client.messages.stream(**self._claude_body(model, messages, params)) as stream:
+            async for text in stream.text_stream:
+                yield text
+    
+    async def _stream_deepseek(self, model: str, messages: Messages, session: UserSession, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream DeepSeek API (OpenAI-compatible SSE)"""
+        async with self._http_client("deepseek").stream(
+            "POST",
+            "/v1/chat/completions",
+            headers={"Authorization": f"Bearer {session.get_api_key('deepseek')}"},
+            json={**self._openai_body(model, messages, params), "stream": True}
+        ) as response:
+            response.raise_for_status()
+            async for data in self._iter_sse_json(response):
+                for choice in data.get("choices", [])[:1]:
+                    yield choice.get("delta", {}).get("content") or ""
+    
+    async def _stream_ollama(self, model: str, messages: Messages, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream local Ollama (NDJSON)"""
+        self.ollama.touch(model)
+        path, body = self._ollama_request(model, messages, params, stream=True)
+        parts: List[str] = []
+        async with self._http_client("ollama").stream("POST", path, json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                text = self._ollama_text(data)
+                parts.append(text)
+                yield text
+                if data.get("done"):
+                    self._ollama_done(model, messages, "".join(parts), data)
+                    break
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FASTAPI APPLICATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open provider connection pools on startup, close them on shutdown"""
+    await ai_federation.startup()
+    yield
+    await ai_federation.shutdown()
+
+
 app = FastAPI(
     title=APP_NAME,
     version=VERSION,
-    description="Multi-AI Federation with Google OAuth"
+    description="Multi-AI Federation with Google OAuth",
+    lifespan=lifespan
 )
 
 # CORS for web interface
@@ -347,127 +1271,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Web UI: templates compiled at startup, static CSS/JS precompressed in memory
+static_assets = StaticAssets(WEB_STATIC_DIR)
+pages = PageRenderer(
+    WEB_TEMPLATES_DIR,
+    static_assets,
+    constants={"features": HOME_FEATURES, "model_groups": CHAT_MODEL_GROUPS}
+)
+
+
+@app.get("/static/{name:path}")
+async def static_file(request: Request, name: str):
+    """CSS / JS with ETag, Cache-Control and gzip / brotli"""
+    return static_assets.response(request, name)
+
+
 # Global instances
 auth_manager = get_auth_manager()
-ai_federation = AIFederation()
+app_state = create_state()
+# Login sessions are published to the shared store, so any worker accepts them
+verified_sessions = VerifiedSessionCache(
+    auth_manager,
+    ttl=AUTH_CACHE_TTL,
+    max_entries=AUTH_CACHE_SIZE,
+    shared=app_state.auth_sessions if app_state.shared else None
+)
+ai_federation = AIFederation(
+    cache=ResponseCache(app_state.responses, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    if RESPONSE_CACHE_ENABLED else None,
+    state=app_state
+)
+
+# Endpoint latency / in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware, metrics=ai_federation.metrics)
+ai_federation.metrics.add_stats_source("auth_cache", verified_sessions.stats)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # AUTH ENDPOINTS
 # ─────────────────────────────────────────────────────────────────────────────
 
+def require_user(x_session_id: Optional[str] = Header(None, alias="X-Session-ID")) -> Dict[str, Any]:
+    """Dependency: user of the X-Session-ID session (cached verification) or 401"""
+    user = verified_sessions.get(x_session_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return user
+
+
 @app.get("/")
-async def home():
+async def home(request: Request):
     """Home page"""
-    return HTMLResponse("""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>ALFA - AI Federation</title>
-        <style>
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                background: linear-gradient(135deg, #1a1a2e 0%, #16213e 100%);
-                color: white;
-                min-height: 100vh;
-                margin: 0;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            .container {
-                text-align: center;
-                padding: 40px;
-            }
-            h1 {
-                font-size: 3em;
-                margin-bottom: 10px;
-                background: linear-gradient(90deg, #ff6b6b, #feca57, #48dbfb, #ff9ff3);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-            }
-            .subtitle {
-                color: #a0a0a0;
-                margin-bottom: 40px;
-            }
-            .login-btn {
-                background: #4285f4;
-                color: white;
-                border: none;
-                padding: 15px 40px;
-                font-size: 18px;
-                border-radius: 8px;
-                cursor: pointer;
-                display: inline-flex;
-                align-items: center;
-                gap: 10px;
-                text-decoration: none;
-                transition: transform 0.2s, box-shadow 0.2s;
-            }
-            .login-btn:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 10px 30px rgba(66, 133, 244, 0.4);
-            }
-            .features {
-                display: flex;
-                gap: 30px;
-                margin-top: 60px;
-                justify-content: center;
-                flex-wrap: wrap;
-            }
-            .feature {
-                background: rgba(255,255,255,0.05);
-                padding: 20px;
-                border-radius: 12px;
-                width: 150px;
-            }
-            .feature-icon {
-                font-size: 2em;
-                margin-bottom: 10px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🤖 ALFA</h1>
-            <p class="subtitle">AI Federation - Wszystkie AI w jednym miejscu</p>
-            
-            <a href="/auth/google" class="login-btn">
-                <svg width="24" height="24" viewBox="0 0 24 24">
-                    <path fill="white" d="M22.56 12.25c0-.78-.07-1.53-.2-2.25H12v4.26h5.92c-.26 1.37-1.04 2.53-2.21 3.31v2.77h3.57c2.08-1.92 3.28-4.74 3.28-8.09z"/>
-                    <path fill="white" d="M12 23c2.97 0 5.46-.98 7.28-2.66l-3.57-2.77c-.98.66-2.23 1.06-3.71 1.06-2.86 0-5.29-1.93-6.16-4.53H2.18v2.84C3.99 20.53 7.7 23 12 23z"/>
-                    <path fill="white" d="M5.84 14.09c-.22-.66-.35-1.36-.35-2.09s.13-1.43.35-2.09V7.07H2.18C1.43 8.55 1 10.22 1 12s.43 3.45 1.18 4.93l2.85-2.22.81-.62z"/>
-                    <path fill="white" d="M12 5.38c1.62 0 3.06.56 4.21 1.64l3.15-3.15C17.45 2.09 14.97 1 12 1 7.7 1 3.99 3.47 2.18 7.07l3.66 2.84c.87-2.6 3.3-4.53 6.16-4.53z"/>
-                </svg>
-                Zaloguj przez Google
-            </a>
-            
-            <div class="features">
-                <div class="feature">
-                    <div class="feature-icon">🌐</div>
-                    <div>Gemini</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🤖</div>
-                    <div>GPT-4</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🧠</div>
-                    <div>Claude</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🚀</div>
-                    <div>DeepSeek</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🏠</div>
-                    <div>Ollama</div>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
+    return pages.static_page(request, "home.html")
 
 
 @app.get("/auth/google")
@@ -489,375 +1344,167 @@ async def google_callback(code: str, state: str):
     
     # Redirect to chat with session
     session_id = result["session_id"]
+    verified_sessions.remember(session_id)
     return RedirectResponse(f"/chat?session={session_id}")
 
 
+@app.post("/auth/logout")
+async def logout(x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    """End session (also drops it from the verified-session cache)"""
+    if x_session_id:
+        verified_sessions.invalidate(x_session_id)
+        end_session = getattr(auth_manager, "logout", None)
+        if end_session is not None:
+            end_session(x_session_id)
+    return {"success": True}
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # CHAT ENDPOINTS
 # ─────────────────────────────────────────────────────────────────────────────
 
 @app.get("/chat")
-async def chat_page(session: str):
+async def chat_page(request: Request, session: str):
     """Chat interface"""
-    if not auth_manager.verify_session(session):
+    user = verified_sessions.get(session)
+    if user is None:
         return RedirectResponse("/")
     
-    user = auth_manager.get_session(session)
-    user_email = user["user"].get("email", "Unknown")
     user_name = user["user"].get("name", "User")
     
-    return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>ALFA Chat</title>
-        <style>
-            * {{ box-sizing: border-box; }}
-            body {{ 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                background: #1a1a2e;
-                color: white;
-                margin: 0;
-                height: 100vh;
-                display: flex;
-                flex-direction: column;
-            }}
-            .header {{
-                background: #16213e;
-                padding: 15px 20px;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                border-bottom: 1px solid #2a2a4a;
-            }}
-            .logo {{ font-size: 1.5em; font-weight: bold; }}
-            .user-info {{ display: flex; align-items: center; gap: 10px; }}
-            .model-select {{
-                background: #2a2a4a;
-                color: white;
-                border: none;
-                padding: 8px 15px;
-                border-radius: 6px;
-                cursor: pointer;
-            }}
-            .chat-container {{
-                flex: 1;
-                overflow-y: auto;
-                padding: 20px;
-            }}
-            .message {{
-                max-width: 80%;
-                margin-bottom: 15px;
-                padding: 12px 16px;
-                border-radius: 12px;
-                line-height: 1.5;
-            }}
-            .user-message {{
-                background: #4285f4;
-                margin-left: auto;
-            }}
-            .ai-message {{
-                background: #2a2a4a;
-            }}
-            .input-container {{
-                padding: 20px;
-                background: #16213e;
-                display: flex;
-                gap: 10px;
-            }}
-            .input-container input {{
-                flex: 1;
-                padding: 15px;
-                border-radius: 8px;
-                border: none;
-                background: #2a2a4a;
-                color: white;
-                font-size: 16px;
-            }}
-            .input-container button {{
-                padding: 15px 30px;
-                background: #4285f4;
-                color: white;
-                border: none;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 16px;
-            }}
-            .input-container button:hover {{
-                background: #5294ff;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <div class="logo">🤖 ALFA</div>
-            <div class="user-info">
-                <select class="model-select" id="model">
-                    <optgroup label="Google">
-                        <option value="gemini-pro">Gemini Pro</option>
-                        <option value="gemini-1.5-pro">Gemini 1.5 Pro</option>
-                    </optgroup>
-                    <optgroup label="OpenAI">
-                        <option value="gpt-4">GPT-4</option>
-                        <option value="gpt-4o">GPT-4o</option>
-                    </optgroup>
-                    <optgroup label="Anthropic">
-                        <option value="claude-3-sonnet">Claude 3 Sonnet</option>
-                        <option value="claude-3-opus">Claude 3 Opus</option>
-                    </optgroup>
-                    <optgroup label="DeepSeek">
-                        <option value="deepseek-chat">DeepSeek Chat</option>
-                    </optgroup>
-                    <optgroup label="Local (Ollama)">
-                        <option value="ollama-llama3">LLaMA 3</option>
-                        <option value="ollama-mistral">Mistral</option>
-                    </optgroup>
-                </select>
-                <span>👤 {user_name}</span>
-                <a href="/settings?session={session}" style="color: #a0a0a0; text-decoration: none;">⚙️</a>
-            </div>
-        </div>
-        
-        <div class="chat-container" id="chat">
-            <div class="message ai-message">
-                Cześć {user_name}! 👋 Jestem ALFA - Twój asystent AI. 
-                Wybierz model z listy i zacznij rozmowę!
-            </div>
-        </div>
-        
-        <div class="input-container">
-            <input type="text" id="message" placeholder="Napisz wiadomość..." autofocus>
-            <button onclick="sendMessage()">Wyślij</button>
-        </div>
-        
-        <script>
-            const sessionId = "{session}";
-            const chatContainer = document.getElementById('chat');
-            const messageInput = document.getElementById('message');
-            const modelSelect = document.getElementById('model');
-            
-            messageInput.addEventListener('keypress', (e) => {{
-                if (e.key === 'Enter') sendMessage();
-            }});
-            
-            async function sendMessage() {{
-                const message = messageInput.value.trim();
-                if (!message) return;
-                
-                // Add user message
-                addMessage(message, 'user');
-                messageInput.value = '';
-                
-                // Show typing indicator
-                const typingId = 'typing-' + Date.now();
-                chatContainer.innerHTML += `<div class="message ai-message" id="${{typingId}}">⏳ Myślę...</div>`;
-                chatContainer.scrollTop = chatContainer.scrollHeight;
-                
-                try {{
-                    const response = await fetch('/api/chat', {{
-                        method: 'POST',
-                        headers: {{ 
-                            'Content-Type': 'application/json',
-                            'X-Session-ID': sessionId
-                        }},
-                        body: JSON.stringify({{
-                            message: message,
-                            model: modelSelect.value
-                        }})
-                    }});
-                    
-                    const data = await response.json();
-                    
-                    // Remove typing indicator
-                    document.getElementById(typingId)?.remove();
-                    
-                    if (data.error) {{
-                        addMessage('❌ ' + data.error + (data.setup_url ? '\\n\\n🔗 ' + data.setup_url : ''), 'ai');
-                    }} else {{
-                        addMessage(data.response, 'ai');
-                    }}
-                }} catch (e) {{
-                    document.getElementById(typingId)?.remove();
-                    addMessage('❌ Błąd połączenia: ' + e.message, 'ai');
-                }}
-            }}
-            
-            function addMessage(text, type) {{
-                const div = document.createElement('div');
-                div.className = 'message ' + (type === 'user' ? 'user-message' : 'ai-message');
-                div.textContent = text;
-                chatContainer.appendChild(div);
-                chatContainer.scrollTop = chatContainer.scrollHeight;
-            }}
-        </script>
-    </body>
-    </html>
-    """)
+    return pages.page(request, "chat.html", session=session, user_name=user_name)
 
 
 @app.post("/api/chat")
-async def api_chat(request: ChatRequest, req: Request):
+async def api_chat(request: ChatRequest, user: Dict[str, Any] = Depends(require_user)):
     """API endpoint for chat"""
-    session_id = req.headers.get("X-Session-ID")
-    
-    if not session_id or not auth_manager.verify_session(session_id):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    
-    user = auth_manager.get_session(session_id)
     user_email = user["user"].get("email")
     
     result = await ai_federation.chat(
         user_email=user_email,
         message=request.message,
-        model=request.model
+        model=request.model,
+        conversation_id=request.conversation_id,
+        params=request.generation_params()
     )
     
     return result
 
 
+@app.post("/api/chat/stream")
+async def api_chat_stream(request: ChatRequest, user: Dict[str, Any] = Depends(require_user)):
+    """Streaming chat endpoint (Server-Sent Events: delta / done / error)"""
+    user_email = user["user"].get("email")
+    
+    async def events():
+        async for event in ai_federation.chat_stream(
+            user_email=user_email,
+            message=request.message,
+            model=request.model,
+            conversation_id=request.conversation_id,
+            params=request.generation_params()
+        ):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/chat/batch")
+async def api_chat_batch(request: BatchChatRequest, user: Dict[str, Any] = Depends(require_user)):
+    """
+    Batch chat: one NDJSON line per item as soon as it completes (out of
+    order, with "index"), then a final {"summary": ...} line.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {BATCH_MAX_ITEMS} items")
+    
+    user_email = user["user"].get("email")
+    
+    items = [
+        {"message": item.message, "model": item.model or request.model, "params": item.generation_params()}
+        for item in request.items
+    ]
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    
+    async def lines():
+        started = time.perf_counter()
+        succeeded = 0
+        async for result in ai_federation.chat_batch(user_email, items, concurrency):
+            succeeded += bool(result.get("success"))
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        summary = {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "concurrency": concurrency,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        yield json.dumps({"summary": summary}) + "\n"
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/conversations/{conversation_id}")
+async def api_conversation(conversation_id: str, user: Dict[str, Any] = Depends(require_user)):
+    """Full history of user's conversation"""
+    user_email = user["user"].get("email")
+    
+    try:
+        await ai_federation.conversations.open(conversation_id, user_email)
+    except ConversationNotFound:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    messages = await asyncio.to_thread(ai_federation.conversations.store.history, conversation_id)
+    return {"conversation_id": conversation_id, "messages": messages}
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SETTINGS ENDPOINT
 # ─────────────────────────────────────────────────────────────────────────────
 
 @app.get("/settings")
-async def settings_page(session: str):
+async def settings_page(request: Request, session: str):
     """Settings page for API keys"""
-    if not auth_manager.verify_session(session):
+    user = verified_sessions.get(session)
+    if user is None:
         return RedirectResponse("/")
     
-    user = auth_manager.get_session(session)
     user_email = user["user"].get("email", "Unknown")
     
-    # Get user's current API keys (masked)
+    # Which providers already have a key (keys themselves never leave the server)
     user_session = ai_federation.get_session(user_email)
+    providers = [
+        {
+            "id": provider_id,
+            "name": provider["name"],
+            "official_url": provider["official_url"],
+            "has_key": bool(user_session.get_api_key(provider_id))
+        }
+        for provider_id, provider in AI_PROVIDERS.items()
+        if provider["auth_type"] == "api_key"
+    ]
     
-    providers_html = ""
-    for provider_id, provider in AI_PROVIDERS.items():
-        if provider["auth_type"] == "api_key":
-            has_key = "✅" if user_session.get_api_key(provider_id) else "❌"
-            providers_html += f"""
-            <div class="provider">
-                <div class="provider-header">
-                    <span>{has_key} {provider['name']}</span>
-                    <a href="{provider['official_url']}" target="_blank" style="color: #4285f4;">Pobierz klucz →</a>
-                </div>
-                <input type="password" 
-                       id="{provider_id}_key" 
-                       placeholder="Wklej swój klucz API..."
-                       class="api-input">
-                <button onclick="saveKey('{provider_id}')" class="save-btn">Zapisz</button>
-            </div>
-            """
-    
-    return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>ALFA - Ustawienia</title>
-        <style>
-            body {{ 
-                font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-                background: #1a1a2e;
-                color: white;
-                padding: 40px;
-                max-width: 600px;
-                margin: 0 auto;
-            }}
-            h1 {{ color: #4285f4; }}
-            .provider {{
-                background: #2a2a4a;
-                padding: 20px;
-                border-radius: 12px;
-                margin-bottom: 15px;
-            }}
-            .provider-header {{
-                display: flex;
-                justify-content: space-between;
-                margin-bottom: 10px;
-            }}
-            .api-input {{
-                width: 100%;
-                padding: 12px;
-                border-radius: 6px;
-                border: none;
-                background: #16213e;
-                color: white;
-                margin-bottom: 10px;
-            }}
-            .save-btn {{
-                background: #4285f4;
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                border-radius: 6px;
-                cursor: pointer;
-            }}
-            .back-link {{
-                color: #a0a0a0;
-                text-decoration: none;
-            }}
-            .info {{
-                background: #16213e;
-                padding: 15px;
-                border-radius: 8px;
-                margin-bottom: 20px;
-                border-left: 4px solid #4285f4;
-            }}
-        </style>
-    </head>
-    <body>
-        <a href="/chat?session={session}" class="back-link">← Powrót do czatu</a>
-        <h1>⚙️ Ustawienia API</h1>
-        
-        <div class="info">
-            <strong>🔐 Twoje klucze są bezpiecznie przechowywane lokalnie.</strong><br>
-            Każdy serwis AI wymaga własnego klucza API. Pobierz je z oficjalnych stron.
-        </div>
-        
-        {providers_html}
-        
-        <script>
-            const sessionId = "{session}";
-            
-            async function saveKey(provider) {{
-                const key = document.getElementById(provider + '_key').value;
-                if (!key) return alert('Wpisz klucz API');
-                
-                const response = await fetch('/api/settings/key', {{
-                    method: 'POST',
-                    headers: {{ 
-                        'Content-Type': 'application/json',
-                        'X-Session-ID': sessionId
-                    }},
-                    body: JSON.stringify({{ provider, api_key: key }})
-                }});
-                
-                if (response.ok) {{
-                    alert('✅ Klucz zapisany!');
-                    location.reload();
-                }} else {{
-                    alert('❌ Błąd zapisu');
-                }}
-            }}
-        </script>
-    </body>
-    </html>
-    """)
+    return pages.page(request, "settings.html", session=session, providers=providers)
 
 
 @app.post("/api/settings/key")
-async def save_api_key(config: APIKeyConfig, req: Request):
+async def save_api_key(config: APIKeyConfig, user: Dict[str, Any] = Depends(require_user)):
     """Save API key for provider"""
-    session_id = req.headers.get("X-Session-ID")
-    
-    if not session_id or not auth_manager.verify_session(session_id):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    
-    user = auth_manager.get_session(session_id)
     user_email = user["user"].get("email")
     
     session = ai_federation.get_session(user_email)
     session.set_api_key(config.provider, config.api_key)
+    # Write through, so requests served by other workers see the key at once
+    await ai_federation.sessions.flush()
     
     return {"success": True}
 
@@ -872,7 +1519,38 @@ async def health():
         "status": "ok",
         "app": APP_NAME,
         "version": VERSION,
-        "providers": list(AI_PROVIDERS.keys())
+        "providers": list(AI_PROVIDERS.keys()),
+        "cache": ai_federation.cache.stats() if ai_federation.cache else {"enabled": False},
+        "sessions": ai_federation.sessions.stats(),
+        "auth_cache": verified_sessions.stats(),
+        "singleflight": ai_federation.singleflight.stats(),
+        "upstream": {provider: guard.stats() for provider, guard in ai_federation.guards.items()},
+        "ollama": ai_federation.ollama.stats(),
+        "ollama_contexts": ai_federation.ollama_contexts.stats()
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    if not ai_federation.metrics.enabled:
+        return PlainTextResponse("prometheus_client not installed", status_code=503)
+    payload, content_type = ai_federation.metrics.render()
+    return Response(payload, media_type=content_type)
+
+
+@app.get("/api/routing")
+async def api_routing():
+    """Routing table of the "auto" model: per-model EWMA / p95 latency, error rate"""
+    return ai_federation.routing_table()
+
+
+@app.get("/api/ollama/models")
+async def api_ollama_models():
+    """Local models: resident in memory, keep_alive, recent use, cold-load cost"""
+    return {
+        "resident": ai_federation.ollama.resident(),
+        "models": ai_federation.ollama.models()
     }
 
 
@@ -900,4 +1578,9 @@ if __name__ == "__main__":
     ╚═══════════════════════════════════════════════════════════════╝
     """)
     
-    uvicorn.run(app, host=HOST, port=PORT)
+    if WORKERS > 1:
+        if not app_state.shared:
+            sys.exit("ALFA_WORKERS > 1 requires a shared ALFA_STATE_BACKEND (sqlite)")
+        uvicorn.run("alfa_app:app", host=HOST, port=PORT, workers=WORKERS)
+    else:
+        uvicorn.run(app, host=HOST, port=PORT)
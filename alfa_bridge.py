@@ -4,11 +4,37 @@ from typing import Optional
 import time
 
 from config import Config
-from memory import AlfaBridgeMemory
+from memory import BridgeHistoryCache, open_bridge_memory
 from deepseek_client import deepseek_client
+from summarizer import BridgeSummarizer, ProfileSummarizer
+from recall import OllamaEmbedder, SemanticRecall, recall_available
 
 app = FastAPI(title='ALFA Bridge', version='1.0.0')
-memory = AlfaBridgeMemory(Config.MEMORY_FILE)
+memory = open_bridge_memory(Config.MEMORY_FILE, Config.MEMORY_SHARDS)
+# Historia sesji w granicach budzetu promptu DeepSeek (nie stala liczba wpisow)
+history_cache = BridgeHistoryCache(
+    memory,
+    max_tokens=deepseek_client.prompt_budget,
+    max_sessions=Config.MEMORY_MAX_SESSIONS,
+    flush_interval=Config.MEMORY_FLUSH_INTERVAL,
+    flush_batch=Config.MEMORY_FLUSH_BATCH
+)
+summarizer = BridgeSummarizer(
+    memory,
+    ProfileSummarizer(Config.SUMMARY_PROFILE),
+    keep=Config.SUMMARY_KEEP,
+    min_entries=Config.SUMMARY_MIN,
+    interval=Config.SUMMARY_INTERVAL,
+    max_sessions=Config.MEMORY_MAX_SESSIONS
+) if Config.SUMMARY_PROFILE else None
+recall = SemanticRecall(
+    memory,
+    OllamaEmbedder(Config.RECALL_MODEL),
+    Config.RECALL_MODEL,
+    top_k=Config.RECALL_TOP_K,
+    budget_tokens=Config.RECALL_TOKENS,
+    projection_dim=Config.RECALL_PROJECTION_DIM
+) if Config.RECALL_MODEL and recall_available() else None
 
 class QueryRequest(BaseModel):
     user_id: str
@@ -36,19 +62,29 @@ async def bridge_query(request: QueryRequest, x_alfa_token: Optional[str] = Head
     
     try:
         # Wczytaj historie
-        history = memory.load_history(request.user_id, request.session_id)
+        history = await history_cache.load_history(request.user_id, request.session_id)
+        summary = None
+        if summarizer:
+            summary = summarizer.summary(request.user_id, request.session_id)
+            # Wiadomosci juz zawarte w streszczeniu nie ida drugi raz
+            history = summarizer.unsummarized(history, request.user_id, request.session_id)
+        recalled = await recall.recall(
+            request.user_id, request.message, exclude={m['content'] for m in history}
+        ) if recall else []
         print(f'?? User: {request.user_id}, History: {len(history)} messages')
         
         # Wywolaj DeepSeek
-        deepseek_response = await deepseek_client.call_deepseek(request.message, history)
+        deepseek_response = await deepseek_client.call_deepseek(request.message, history, summary, recalled)
         reply = deepseek_response['reply']
         
-        # Zapisz do pamieci
-        memory.append_entry(request.user_id, 'user', request.message, request.session_id)
-        memory.append_entry(request.user_id, 'assistant', reply, request.session_id)
-        
-        # Pobierz zaktualizowana historie
-        updated_history = memory.load_history(request.user_id, request.session_id)
+        # Zapisz do pamieci (para user/assistant naraz, zapis na dysk w tle)
+        updated_history = await history_cache.append_pair(
+            request.user_id, request.message, reply, request.session_id
+        )
+        if summarizer:
+            summarizer.mark(request.user_id, request.session_id)
+        if recall:
+            recall.mark(request.user_id)
         
         elapsed = time.time() - start_time
         
@@ -56,12 +92,15 @@ async def bridge_query(request: QueryRequest, x_alfa_token: Optional[str] = Head
         
         return QueryResponse(
             reply=reply,
-            memory_snapshot=updated_history[-3:],
+            # Only the public fields; cached ids / token counts stay internal
+            memory_snapshot=[{'role': m['role'], 'content': m['content']} for m in updated_history[-3:]],
             meta={
                 'engine': 'deepseek',
                 'user_id': request.user_id,
                 'response_time_ms': int(elapsed * 1000),
-                'history_length': len(updated_history)
+                'history_length': len(updated_history),
+                'recalled': len(recalled),
+                'prompt_tokens': deepseek_response.get('prompt_tokens')
             }
         )
         
@@ -73,14 +112,31 @@ async def bridge_query(request: QueryRequest, x_alfa_token: Optional[str] = Head
 async def health_check():
     return {
         'status': 'healthy',
-        'deepseek_configured': bool(Config.DEEPSEEK_API_KEY)
+        'deepseek_configured': bool(Config.DEEPSEEK_API_KEY),
+        'memory': history_cache.stats(),
+        'summaries': summarizer.stats() if summarizer else None,
+        'recall': recall.stats() if recall else None
     }
 
 @app.on_event('startup')
 async def startup_event():
+    await history_cache.start()
+    if summarizer:
+        await summarizer.start()
+    if recall:
+        await recall.start()
     print('=' * 50)
     print('?? ALFA BRIDGE v1.0 - STARTED')
     print('=' * 50)
     print(f'?? Service token: {Config.ALFA_SERVICE_TOKEN}')
     print('?? Server ready!')
     print('=' * 50)
+
+@app.on_event('shutdown')
+async def shutdown_event():
+    if recall:
+        await recall.stop()
+    if summarizer:
+        await summarizer.stop()
+    await history_cache.stop()
+    await deepseek_client.close()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - RESPONSE CACHE
+═══════════════════════════════════════════════════════════════════════════════
+
+Dwupoziomowy cache odpowiedzi AI dla AIFederation:
+- L1: LRU w pamięci z TTL (per proces)
+- L2: wspólny magazyn - SQLite (przetrwa restart, współdzielony przez procesy
+  workerów) albo MemoryResponseStore w testach
+
+Klucz = provider + model + znormalizowana wiadomość (i historia rozmowy)
++ parametry generowania + skrót klucza API - użytkownicy z różnymi kluczami
+nie dzielą wyników ani błędów (i nie płacą za cudze wywołania).
+Cache'owane są tylko zapytania z jawnym temperature=0 - domyślne ustawienia
+providerów próbkują, więc zapytania bez temperature omijają cache.
+
+SingleFlight: równoczesne identyczne zapytania (ten sam klucz) współdzielą
+jedno wywołanie providera, wynik trafia do wszystkich oczekujących - także
+przy domyślnym temperature (łączenie nie zależy od cache'owania).
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple, Callable, Awaitable
+
+
+def normalize_message(message: str) -> str:
+    """Collapse whitespace so trivially different prompts share a key"""
+    return " ".join(message.split())
+
+
+def is_deterministic(params: Dict[str, Any]) -> bool:
+    """True only when the request explicitly asks for greedy decoding (temperature=0)"""
+    temperature = params.get("temperature")
+    return temperature is not None and temperature == 0
+
+
+def credential_id(api_key: Optional[str]) -> str:
+    """Short non-reversible id of an API key ("" when there is none)"""
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(
+    provider: str,
+    model: str,
+    message: str,
+    params: Dict[str, Any],
+    history: List[Dict[str, str]] = (),
+    credential: str = ""
+) -> str:
+    """
+    Stable cache key for a provider call (history = earlier conversation
+    turns, credential = credential_id() of the API key the call runs with)
+    """
+    payload = json.dumps(
+        [
+            provider,
+            model,
+            credential,
+            normalize_message(message),
+            params,
+            [[m["role"], normalize_message(m["content"])] for m in history]
+        ],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseStore:
+    """L2 tier: responses in SQLite (WAL), shared by worker processes"""
+
+    PRUNE_EVERY = 500  # writes between removals of expired rows
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(response, expires_at) or None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def set(self, key: str, response: str, expires_at: float):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MemoryResponseStore:
+    """L2 tier kept in process memory (tests)"""
+
+    def __init__(self):
+        self._responses: Dict[str, Tuple[str, float]] = {}
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        return self._responses.get(key)
+
+    def set(self, key: str, response: str, expires_at: float):
+        self._responses[key] = (response, expires_at)
+
+    def close(self):
+        pass
+
+
+class ResponseCache:
+    """In-memory LRU (L1) in front of a response store (L2)"""
+
+    def __init__(self, store: Any, max_entries: int = 1024, ttl: float = 3600.0):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def bypass(self):
+        """Count a lookup skipped because of non-deterministic settings"""
+        self.bypassed += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up L1, then L2 (promoting L2 hits into L1)"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return response
+            del self._memory[key]
+
+        row = await asyncio.to_thread(self.store.get, key)
+        if row is not None and row[1] > now:
+            self._remember(key, row[0], row[1])
+            self.hits_disk += 1
+            return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: str):
+        """Store response in both tiers"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, response, expires_at)
+        await asyncio.to_thread(self.store.set, key, response, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for /health"""
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "enabled": True,
+            "memory_entries": len(self._memory),
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        """Close the L2 store"""
+        self.store.close()
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one upstream call"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() unless a call with `key` is already in flight, in which case
+        wait for its result. The upstream call runs in its own task, so a
+        cancelled waiter (e.g. a lost race) does not cancel the others; it is
+        cancelled only when no waiter is left.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody wants the answer any more: free the provider
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "coalescing_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0
+        }
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every waiter was cancelled
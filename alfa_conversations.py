@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - CONVERSATION HISTORY
+═══════════════════════════════════════════════════════════════════════════════
+
+Historia rozmów po stronie serwera (klucz: conversation_id):
+- append-only log wiadomości w SQLite (WAL), jeden wiersz na wiadomość
+- okno kontekstu z budżetem tokenów per model, budowane przyrostowo:
+  przy pierwszym użyciu czytany jest tylko ogon logu, kolejne tury
+  są dopisywane do okna w pamięci zamiast ponownej serializacji całości
+- wiele procesów: okno pamięta numer ostatniej wiadomości (seq) i dociąga
+  tylko wiadomości dopisane przez inne procesy (MemoryConversationStore
+  do testów / jednego procesu)
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import uuid
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token + per-message overhead)"""
+    return len(text) // 4 + 4
+
+
+class ConversationNotFound(Exception):
+    """Unknown conversation_id or owned by another user"""
+
+
+class ConversationStore:
+    """Append-only SQLite log of conversation messages"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " conversation_id TEXT PRIMARY KEY, user_email TEXT NOT NULL,"
+            " created_at TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " conversation_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL, content TEXT NOT NULL, model TEXT,"
+            " tokens INTEGER NOT NULL, created_at TEXT NOT NULL,"
+            " PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID;"
+        )
+        self._db.commit()
+
+    def owner(self, conversation_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT user_email FROM conversations WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def create(self, conversation_id: str, user_email: str):
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO conversations (conversation_id, user_email, created_at)"
+                    " VALUES (?, ?, ?)",
+                    (conversation_id, user_email, datetime.now().isoformat())
+                )
+
+    def append(self, conversation_id: str, messages: List[Tuple[str, str, Optional[str], int]]) -> int:
+        """Append (role, content, model, tokens) rows atomically, return the last seq"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            with self._db:
+                # Take the write lock before reading MAX(seq): another worker
+                # process appending to the same conversation waits instead of
+                # reusing the seq (PRIMARY KEY conflict)
+                self._db.execute("BEGIN IMMEDIATE")
+                (last_seq,) = self._db.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conversation_id = ?",
+                    (conversation_id,)
+                ).fetchone()
+                self._db.executemany(
+                    "INSERT INTO messages (conversation_id, seq, role, content, model, tokens, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (conversation_id, last_seq + i, role, content, model, tokens, now)
+                        for i, (role, content, model, tokens) in enumerate(messages, start=1)
+                    ]
+                )
+        return last_seq + len(messages)
+
+    def last_seq(self, conversation_id: str) -> int:
+        with self._lock:
+            (seq,) = self._db.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        return seq
+
+    def since(self, conversation_id: str, seq: int) -> List[Tuple[int, str, str, int]]:
+        """Messages (seq, role, content, tokens) after `seq`, oldest first"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT seq, role, content, tokens FROM messages"
+                " WHERE conversation_id = ? AND seq > ? ORDER BY seq",
+                (conversation_id, seq)
+            ).fetchall()
+
+    def tail(self, conversation_id: str, token_budget: int) -> List[Tuple[int, str, str, int]]:
+        """Newest messages (seq, role, content, tokens) fitting in token_budget, oldest first"""
+        selected: List[Tuple[int, str, str, int]] = []
+        used = 0
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT seq, role, content, tokens FROM messages"
+                " WHERE conversation_id = ? ORDER BY seq DESC",
+                (conversation_id,)
+            )
+            for seq, role, content, tokens in cursor:
+                if used + tokens > token_budget:
+                    break
+                selected.append((seq, role, content, tokens))
+                used += tokens
+        selected.reverse()
+        return selected
+
+    def history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Full log (for export / UI)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, model, created_at FROM messages"
+                " WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,)
+            ).fetchall()
+        return [
+            {"role": role, "content": content, "model": model, "timestamp": created_at}
+            for role, content, model, created_at in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MemoryConversationStore:
+    """In-process ConversationStore (tests, single worker)"""
+
+    def __init__(self):
+        self._owners: Dict[str, str] = {}
+        self._messages: Dict[str, List[Tuple[int, str, str, Optional[str], int, str]]] = {}
+
+    def owner(self, conversation_id: str) -> Optional[str]:
+        return self._owners.get(conversation_id)
+
+    def create(self, conversation_id: str, user_email: str):
+        self._owners.setdefault(conversation_id, user_email)
+        self._messages.setdefault(conversation_id, [])
+
+    def append(self, conversation_id: str, messages: List[Tuple[str, str, Optional[str], int]]) -> int:
+        log = self._messages.setdefault(conversation_id, [])
+        now = datetime.now().isoformat()
+        for role, content, model, tokens in messages:
+            log.append((len(log) + 1, role, content, model, tokens, now))
+        return len(log)
+
+    def last_seq(self, conversation_id: str) -> int:
+        return len(self._messages.get(conversation_id, ()))
+
+    def since(self, conversation_id: str, seq: int) -> List[Tuple[int, str, str, int]]:
+        log = self._messages.get(conversation_id, [])
+        return [(s, role, content, tokens) for s, role, content, _, tokens, _ in log[seq:]]
+
+    def tail(self, conversation_id: str, token_budget: int) -> List[Tuple[int, str, str, int]]:
+        selected = []
+        used = 0
+        for seq, role, content, _, tokens, _ in reversed(self._messages.get(conversation_id, [])):
+            if used + tokens > token_budget:
+                break
+            selected.append((seq, role, content, tokens))
+            used += tokens
+        selected.reverse()
+        return selected
+
+    def history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return [
+            {"role": role, "content": content, "model": model, "timestamp": created_at}
+            for _, role, content, model, _, created_at in self._messages.get(conversation_id, [])
+        ]
+
+    def close(self):
+        pass
+
+
+class ContextWindow:
+    """
+    Token-budgeted sliding window over a conversation (oldest dropped first).
+    `seq` is the log position of the newest message in the window.
+    """
+
+    def __init__(self, budget: int, messages: List[Tuple[int, str, str, int]] = ()):
+        self.budget = budget
+        self._messages: deque = deque()
+        self.tokens = 0
+        self.seq = 0
+        for seq, role, content, tokens in messages:
+            self.append(role, content, tokens)
+            self.seq = seq
+
+    def append(self, role: str, content: str, tokens: int):
+        self._messages.append((role, content, tokens))
+        self.tokens += tokens
+        while self._messages and (self.tokens > self.budget or self._messages[0][0] != "user"):
+            _, _, dropped = self._messages.popleft()
+            self.tokens -= dropped
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [{"role": role, "content": content} for role, content, _ in self._messages]
+
+
+class ConversationManager:
+    """
+    Conversation log + LRU of in-memory context windows.
+    With `revalidate=True` (log shared with other processes) a cached window
+    first pulls messages other processes appended since it was built.
+    """
+
+    def __init__(self, store: ConversationStore, max_windows: int = 1000, revalidate: bool = False):
+        self.store = store
+        self.revalidate = revalidate
+        self.max_windows = max_windows
+        self._windows: "OrderedDict[str, ContextWindow]" = OrderedDict()
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    async def open(self, conversation_id: Optional[str], user_email: str) -> str:
+        """Return existing conversation of user_email, or create a new one"""
+        if conversation_id is None:
+            conversation_id = self.new_id()
+            await asyncio.to_thread(self.store.create, conversation_id, user_email)
+            self._remember_owner(conversation_id, user_email)
+            return conversation_id
+
+        owner = self._owners.get(conversation_id)
+        if owner is None:
+            owner = await asyncio.to_thread(self.store.owner, conversation_id)
+            if owner is None:
+                raise ConversationNotFound(conversation_id)
+            self._remember_owner(conversation_id, owner)
+        if owner != user_email:
+            raise ConversationNotFound(conversation_id)
+        return conversation_id
+
+    async def context(self, conversation_id: str, budget: int) -> List[Dict[str, str]]:
+        """Messages of the conversation that fit in `budget` tokens"""
+        window = self._windows.get(conversation_id)
+        if window is not None and window.budget == budget and self.revalidate:
+            newer = await asyncio.to_thread(self.store.since, conversation_id, window.seq)
+            for seq, role, content, tokens in newer:
+                window.append(role, content, tokens)
+                window.seq = seq
+        if window is None or window.budget != budget:
+            tail = await asyncio.to_thread(self.store.tail, conversation_id, budget)
+            window = ContextWindow(budget, tail)
+            self._windows[conversation_id] = window
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(conversation_id)
+        return window.messages()
+
+    async def append_turn(self, conversation_id: str, model: str, message: str, response: str):
+        """Append user message + assistant response to log and window"""
+        turn = [
+            ("user", message, None, estimate_tokens(message)),
+            ("assistant", response, model, estimate_tokens(response))
+        ]
+        last_seq = await asyncio.to_thread(self.store.append, conversation_id, turn)
+        window = self._windows.get(conversation_id)
+        if window is None:
+            return
+        if window.seq != last_seq - len(turn):
+            # Another process appended in between: rebuild on next use
+            del self._windows[conversation_id]
+            return
+        for role, content, _, tokens in turn:
+            window.append(role, content, tokens)
+        window.seq = last_seq
+
+    def close(self):
+        self.store.close()
+
+    def _remember_owner(self, conversation_id: str, user_email: str):
+        self._owners[conversation_id] = user_email
+        while len(self._owners) > self.max_windows * 10:
+            self._owners.popitem(last=False)
@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - LOAD TEST HARNESS
+═══════════════════════════════════════════════════════════════════════════════
+
+Generator obciążenia dla alfa_app (/api/chat, /api/chat/stream) i alfa_bridge
+(/bridge/query):
+- wirtualni użytkownicy w pętli zamkniętej; ich liczba idzie za profilem
+  rampy ("0:1,30:50,90:50" = w sekundzie 30 liniowo do 50, potem stałe 50)
+- mieszanka endpointów (--mix chat=5,stream=4,bridge=1), promptów (krótkie /
+  średnie / długie albo plik) i modeli; opcjonalnie rozmowy wieloturowe
+- raport JSON: przepustowość, latencja p50/p95/p99, TTFT (stream), błędy wg
+  typu, przebieg w czasie - per endpoint i łącznie
+- wyniki zapisywane w loadtest_results/ z wersją aplikacji i commitem;
+  `compare` porównuje dwa wyniki i zwraca kod 1 przy regresji
+
+Tryb --in-process uruchamia aplikacje w tym samym procesie (uvicorn na wolnym
+porcie w osobnym wątku, z obsługą startup/shutdown i prawdziwym streamingiem,
+więc TTFT jest mierzalne; logowanie pominięte) - razem z ALFA_STANDIN_URL cały
+test działa offline.
+
+Użycie:
+    python alfa_loadtest.py run --url http://127.0.0.1:8765 --session <id> \\
+        --bridge-url http://127.0.0.1:8000 --mix chat=5,stream=4,bridge=1 \\
+        --ramp 0:1,30:50,90:50 --label v1.0
+    ALFA_STANDIN_URL=http://127.0.0.1:8799 DEEPSEEK_API_KEY=offline \\
+        python alfa_loadtest.py run --in-process --ramp 0:10,20:10
+    python alfa_loadtest.py compare loadtest_results/a.json loadtest_results/b.json
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import socket
+import argparse
+import threading
+import subprocess
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+
+import httpx
+
+RESULTS_DIR = Path(os.getenv("ALFA_LOADTEST_RESULTS", "loadtest_results"))
+TARGETS = ("chat", "stream", "bridge")
+
+PROMPT_MIX = {
+    "short": ["Cześć!", "What time zone is UTC+2?", "Podaj synonim słowa szybki."],
+    "medium": [
+        "Explain the difference between a process and a thread in a few sentences.",
+        "Napisz krótką funkcję w Pythonie, która odwraca listę bez użycia reversed().",
+        "Summarize the main causes of the first world war in one paragraph."
+    ],
+    "long": [
+        "Review the following design and list its risks: a FastAPI service keeps user "
+        "sessions in memory, writes them to JSON files on every change, calls five "
+        "different AI providers with a new HTTP client per request and stores the full "
+        "conversation history client-side, sending it with every message. " * 3
+    ]
+}
+PROMPT_WEIGHTS = {"short": 0.5, "medium": 0.35, "long": 0.15}
+
+# Metrics compared by `compare` and whether higher is better
+COMPARED = {
+    "throughput_rps": True,
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "ttft_ms.p50": False,
+    "ttft_ms.p95": False,
+    "error_rate": False
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def parse_ramp(spec: str) -> List[Tuple[float, int]]:
+    """"0:1,30:50,90:50" -> [(0, 1), (30, 50), (90, 50)] (seconds, virtual users)"""
+    stages = []
+    for part in spec.split(","):
+        at, _, users = part.strip().partition(":")
+        stages.append((float(at), int(users)))
+    stages.sort()
+    if not stages or stages[0][0] > 0:
+        stages.insert(0, (0.0, stages[0][1] if stages else 1))
+    return stages
+
+
+def users_at(ramp: List[Tuple[float, int]], elapsed: float) -> int:
+    """Target virtual users at `elapsed` seconds (linear between stages)"""
+    for (t0, u0), (t1, u1) in zip(ramp, ramp[1:]):
+        if elapsed < t1:
+            return round(u0 + (u1 - u0) * (elapsed - t0) / (t1 - t0)) if t1 > t0 else u1
+    return ramp[-1][1]
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"chat=5,stream=4,bridge=1" -> weights"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name:
+            weights[name] = float(weight or 1)
+    return weights
+
+
+def load_prompts(path: Optional[str]) -> Dict[str, List[str]]:
+    """Prompt groups: JSON {"group": [...]} / JSON list / one prompt per line"""
+    if not path:
+        return PROMPT_MIX
+    text = Path(path).read_text(encoding="utf-8")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {"file": [line for line in text.splitlines() if line.strip()]}
+    return data if isinstance(data, dict) else {"file": list(data)}
+
+
+@dataclass
+class LoadConfig:
+    url: str = "http://127.0.0.1:8765"
+    bridge_url: str = "http://127.0.0.1:8000"
+    session: Optional[str] = None
+    token: Optional[str] = None
+    mix: Dict[str, float] = field(default_factory=lambda: {"chat": 1.0})
+    models: List[str] = field(default_factory=lambda: ["gemini-pro"])
+    ramp: List[Tuple[float, int]] = field(default_factory=lambda: [(0.0, 10), (30.0, 10)])
+    duration: Optional[float] = None  # default: last ramp stage
+    max_requests: Optional[int] = None
+    turns: int = 1  # >1 = multi-turn conversations per virtual user
+    prompts: Dict[str, List[str]] = field(default_factory=lambda: dict(PROMPT_MIX))
+    prompt_weights: Dict[str, float] = field(default_factory=lambda: dict(PROMPT_WEIGHTS))
+    timeout: float = 120.0
+    seed: Optional[int] = None
+    label: str = ""
+    in_process: bool = False
+
+    def total_duration(self) -> float:
+        return self.duration if self.duration is not None else max(self.ramp[-1][0], 1.0)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RECORDING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class Sample:
+    target: str
+    started: float  # seconds since test start
+    latency_ms: float
+    ttft_ms: Optional[float]
+    error: Optional[str]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest rank
+    index = min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))
+    return round(values[index], 2)
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    latencies = [s.latency_ms for s in samples if s.error is None]
+    ttfts = [s.ttft_ms for s in samples if s.error is None and s.ttft_ms is not None]
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if sample.error is not None:
+            errors[sample.error] = errors.get(sample.error, 0) + 1
+    summary = {
+        "requests": len(samples),
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(max(latencies), 2) if latencies else None
+        }
+    }
+    if ttfts:
+        summary["ttft_ms"] = {
+            "p50": percentile(ttfts, 0.50),
+            "p95": percentile(ttfts, 0.95),
+            "p99": percentile(ttfts, 0.99)
+        }
+    return summary
+
+
+def timeline(samples: List[Sample], users: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Per-second completed / errors / p95 / active users"""
+    seconds: Dict[int, List[Sample]] = {}
+    for sample in samples:
+        seconds.setdefault(int(sample.started + sample.latency_ms / 1000), []).append(sample)
+    active = dict(users)
+    rows = []
+    for second in range(max(list(seconds) + [0]) + 1):
+        bucket = seconds.get(second, [])
+        ok = [s.latency_ms for s in bucket if s.error is None]
+        rows.append({
+            "second": second,
+            "users": active.get(second),
+            "completed": len(ok),
+            "errors": len(bucket) - len(ok),
+            "p95_ms": percentile(ok, 0.95)
+        })
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REQUESTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class VirtualUser:
+    """One closed-loop client: sends the next request when the previous ended"""
+
+    def __init__(self, index: int, config: LoadConfig, prompts: Dict[str, List[str]], rng: random.Random):
+        self.index = index
+        self.config = config
+        self.prompts = prompts
+        self.rng = rng
+        self.user_id = f"loadtest-{index}"
+        self.conversation_id: Optional[str] = None
+        self.bridge_session = uuid.uuid4().hex[:12]
+        self.turn = 0
+
+    def next_request(self) -> Tuple[str, str, str]:
+        """(target, model, prompt)"""
+        targets, weights = zip(*self.config.mix.items())
+        target = self.rng.choices(targets, weights)[0]
+        groups = [g for g in self.prompts if self.config.prompt_weights.get(g, 1.0) > 0]
+        group = self.rng.choices(groups, [self.config.prompt_weights.get(g, 1.0) for g in groups])[0]
+        return target, self.rng.choice(self.config.models), self.rng.choice(self.prompts[group])
+
+    def advance_turn(self):
+        """Start a new conversation every `turns` requests"""
+        self.turn += 1
+        if self.turn >= self.config.turns:
+            self.turn = 0
+            self.conversation_id = None
+            self.bridge_session = uuid.uuid4().hex[:12]
+
+    async def send(self, clients: Dict[str, httpx.AsyncClient]) -> Tuple[str, float, Optional[float], Optional[str]]:
+        """One request: (target, latency ms, ttft ms, error type)"""
+        target, model, prompt = self.next_request()
+        started = time.perf_counter()
+        ttft = None
+        try:
+            if target == "chat":
+                error = await self._chat(clients["app"], model, prompt)
+            elif target == "stream":
+                error, ttft = await self._stream(clients["app"], model, prompt, started)
+            else:
+                error = await self._bridge(clients["bridge"], prompt)
+        except httpx.TimeoutException:
+            error = "timeout"
+        except httpx.TransportError:
+            error = "connection"
+        latency = (time.perf_counter() - started) * 1000
+        self.advance_turn()
+        return target, latency, ttft, error
+
+    def _body(self, model: str, prompt: str) -> Dict[str, Any]:
+        body = {"message": prompt, "model": model}
+        if self.config.turns > 1 and self.conversation_id:
+            body["conversation_id"] = self.conversation_id
+        return body
+
+    def _headers(self) -> Dict[str, str]:
+        return {"X-Session-ID": self.config.session} if self.config.session else {}
+
+    async def _chat(self, client: httpx.AsyncClient, model: str, prompt: str) -> Optional[str]:
+        response = await client.post("/api/chat", json=self._body(model, prompt), headers=self._headers())
+        if response.status_code != 200:
+            return f"http_{response.status_code}"
+        data = response.json()
+        if data.get("error"):
+            # The app reports provider failures in a 200 body
+            return "rejected" if data.get("retry_after") is not None else "app_error"
+        self.conversation_id = data.get("conversation_id")
+        return None
+
+    async def _stream(
+        self, client: httpx.AsyncClient, model: str, prompt: str, started: float
+    ) -> Tuple[Optional[str], Optional[float]]:
+        ttft = None
+        event = None
+        async with client.stream(
+            "POST", "/api/chat/stream", json=self._body(model, prompt), headers=self._headers()
+        ) as response:
+            if response.status_code != 200:
+                return f"http_{response.status_code}", None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    if event == "delta" and ttft is None:
+                        ttft = (time.perf_counter() - started) * 1000
+                    elif event == "error":
+                        data = json.loads(line[5:])
+                        return ("rejected" if data.get("retry_after") is not None else "app_error"), ttft
+                    elif event == "done":
+                        self.conversation_id = json.loads(line[5:]).get("conversation_id")
+        return (None if event == "done" else "incomplete_stream"), ttft
+
+    async def _bridge(self, client: httpx.AsyncClient, prompt: str) -> Optional[str]:
+        headers = {"X-ALFA-TOKEN": self.config.token} if self.config.token else {}
+        response = await client.post(
+            "/bridge/query",
+            json={"user_id": self.user_id, "message": prompt, "session_id": self.bridge_session},
+            headers=headers
+        )
+        if response.status_code != 200:
+            return f"http_{response.status_code}"
+        if response.json().get("reply", "").startswith("? Blad"):
+            # deepseek_client turns upstream failures into an error reply
+            return "app_error"
+        return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RUNNER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+async def _serve(app: Any, stack: AsyncExitStack) -> str:
+    """
+    Serve `app` with uvicorn on a free local port in a background thread;
+    return its URL.
+
+    A real server is used instead of httpx.ASGITransport: the transport
+    buffers the whole response (TTFT would equal latency) and skips the
+    app's startup/shutdown handlers (background flush, summaries, recall).
+    """
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+
+    async def stop():
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+        sock.close()
+
+    stack.push_async_callback(stop)
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"in-process server for {app!r} failed to start")
+        await asyncio.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def _clients(config: LoadConfig, stack: AsyncExitStack) -> Dict[str, httpx.AsyncClient]:
+    """HTTP clients per app (real servers, or the apps served from this process)"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(config.timeout)
+    uses = set(config.mix)
+    urls = {"app": config.url, "bridge": config.bridge_url}
+    if config.in_process:
+        if uses & {"chat", "stream"}:
+            import alfa_app
+            user = {"user": {"email": "loadtest@localhost", "name": "Load test"}}
+            alfa_app.app.dependency_overrides[alfa_app.require_user] = lambda: user
+            if alfa_app.STANDIN_URL:
+                # Offline: placeholder keys, only ever sent to the stand-in
+                session = alfa_app.ai_federation.get_session(user["user"]["email"])
+                for provider in alfa_app.AI_PROVIDERS:
+                    session.api_keys.setdefault(provider, "standin")
+            urls["app"] = await _serve(alfa_app.app, stack)
+        if "bridge" in uses:
+            import alfa_bridge
+            urls["bridge"] = await _serve(alfa_bridge.app, stack)
+    clients = {}
+    for name, url in urls.items():
+        client = httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+        clients[name] = await stack.enter_async_context(client)
+    return clients
+
+
+async def run(config: LoadConfig) -> Dict[str, Any]:
+    """Run the load test, return the JSON report"""
+    rng = random.Random(config.seed)
+    max_users = max(users for _, users in config.ramp)
+    duration = config.total_duration()
+    samples: List[Sample] = []
+    active_users: List[Tuple[int, int]] = []
+    sent = 0
+
+    async with AsyncExitStack() as stack:
+        clients = await _clients(config, stack)
+        started = time.perf_counter()
+
+        def elapsed() -> float:
+            return time.perf_counter() - started
+
+        async def user_loop(user: VirtualUser):
+            nonlocal sent
+            while elapsed() < duration:
+                if user.index >= users_at(config.ramp, elapsed()):
+                    await asyncio.sleep(0.05)
+                    continue
+                if config.max_requests is not None and sent >= config.max_requests:
+                    return
+                sent += 1
+                at = elapsed()
+                target, latency, ttft, error = await user.send(clients)
+                samples.append(Sample(target, at, latency, ttft, error))
+
+        async def track_users():
+            while elapsed() < duration:
+                active_users.append((int(elapsed()), users_at(config.ramp, elapsed())))
+                await asyncio.sleep(1.0)
+
+        version = await _versions(clients, config)
+        users = [VirtualUser(i, config, config.prompts, random.Random(rng.random())) for i in range(max_users)]
+        tracker = asyncio.create_task(track_users())
+        await asyncio.gather(*(user_loop(user) for user in users))
+        tracker.cancel()
+        total_elapsed = elapsed()
+
+    config_dict = asdict(config)
+    config_dict.pop("session", None)
+    config_dict.pop("token", None)
+    config_dict["prompts"] = {group: len(texts) for group, texts in config.prompts.items()}
+    return {
+        "label": config.label,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "version": version,
+        "config": config_dict,
+        "elapsed_s": round(total_elapsed, 2),
+        "overall": summarize(samples, total_elapsed),
+        "targets": {
+            target: summarize([s for s in samples if s.target == target], total_elapsed)
+            for target in TARGETS if target in config.mix
+        },
+        "timeline": timeline(samples, active_users)
+    }
+
+
+async def _versions(clients: Dict[str, httpx.AsyncClient], config: LoadConfig) -> Dict[str, Any]:
+    """App version (from /health) and git commit of the tree under test"""
+    versions: Dict[str, Any] = {"app": None}
+    if set(config.mix) & {"chat", "stream"}:
+        try:
+            versions["app"] = (await clients["app"].get("/health")).json().get("version")
+        except (httpx.HTTPError, ValueError):
+            pass
+    try:
+        versions["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        versions["commit"] = None
+    return versions
+
+
+def store(report: Dict[str, Any], directory: Path = RESULTS_DIR) -> Path:
+    """Save a report as <directory>/<timestamp>_<commit>_<label>.json"""
+    directory.mkdir(parents=True, exist_ok=True)
+    parts = [datetime.now().strftime("%Y%m%d-%H%M%S"), report["version"].get("commit") or "nogit"]
+    if report.get("label"):
+        parts.append("".join(c if c.isalnum() or c in "-." else "_" for c in report["label"]))
+    path = directory / ("_".join(parts) + ".json")
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPARISON
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _metric(summary: Dict[str, Any], name: str) -> Optional[float]:
+    value: Any = summary
+    for key in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.10) -> Dict[str, Any]:
+    """
+    Relative change of each compared metric, per target and overall.
+    A metric regresses when it is worse by more than `tolerance` (10%);
+    error rates regress when they grow by more than `tolerance` points / 10.
+    """
+    rows = []
+    sections = ["overall"] + sorted(set(baseline.get("targets", {})) & set(current.get("targets", {})))
+    for section in sections:
+        before = baseline["overall"] if section == "overall" else baseline["targets"][section]
+        after = current["overall"] if section == "overall" else current["targets"][section]
+        for name, higher_is_better in COMPARED.items():
+            old, new = _metric(before, name), _metric(after, name)
+            if old is None or new is None:
+                continue
+            if name == "error_rate":
+                change = new - old
+                regressed = change > tolerance / 10
+            else:
+                change = (new - old) / old if old else 0.0
+                regressed = (-change if higher_is_better else change) > tolerance
+            rows.append({
+                "target": section,
+                "metric": name,
+                "baseline": old,
+                "current": new,
+                "change": round(change, 4),
+                "regressed": regressed
+            })
+    return {
+        "baseline": {"label": baseline.get("label"), **baseline.get("version", {})},
+        "current": {"label": current.get("label"), **current.get("version", {})},
+        "tolerance": tolerance,
+        "regressions": [row for row in rows if row["regressed"]],
+        "metrics": rows
+    }
+
+
+def _print_comparison(result: Dict[str, Any]):
+    print(f"\n{'target':8} {'metric':16} {'baseline':>11} {'current':>11} {'change':>9}")
+    for row in result["metrics"]:
+        change = f"{row['change']:+.1%}" if row["metric"] != "error_rate" else f"{row['change']:+.4f}"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['target']:8} {row['metric']:16} {row['baseline']:11} {row['current']:11} {change:>9}{flag}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def main():
+    parser = argparse.ArgumentParser(description="ALFA load test harness")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a load test")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8765", help="alfa_app base URL")
+    run_parser.add_argument("--bridge-url", default="http://127.0.0.1:8000", help="alfa_bridge base URL")
+    run_parser.add_argument("--session", default=os.getenv("ALFA_LOADTEST_SESSION"), help="X-Session-ID for alfa_app")
+    run_parser.add_argument("--token", default=os.getenv("ALFA_SERVICE_TOKEN"), help="X-ALFA-TOKEN for alfa_bridge")
+    run_parser.add_argument("--mix", default="chat=1", help="endpoint weights, e.g. chat=5,stream=4,bridge=1")
+    run_parser.add_argument("--models", default="gemini-pro", help="comma separated models for alfa_app")
+    run_parser.add_argument("--ramp", default="0:10,30:10", help="seconds:users stages, linear in between")
+    run_parser.add_argument("--duration", type=float, help="test length (default: last ramp stage)")
+    run_parser.add_argument("--requests", type=int, help="stop after this many requests")
+    run_parser.add_argument("--turns", type=int, default=1, help="turns per conversation")
+    run_parser.add_argument("--prompts", help="prompt file (JSON groups / JSON list / lines)")
+    run_parser.add_argument("--prompt-mix", help="prompt group weights, e.g. short=5,medium=3,long=2")
+    run_parser.add_argument("--timeout", type=float, default=120.0)
+    run_parser.add_argument("--seed", type=int)
+    run_parser.add_argument("--label", default="", help="name stored with the result (e.g. version)")
+    run_parser.add_argument("--in-process", action="store_true", help="serve the apps in this process (no login)")
+    run_parser.add_argument("--out", help="also write the report to this file")
+    run_parser.add_argument("--no-store", action="store_true", help=f"do not save under {RESULTS_DIR}/")
+    run_parser.add_argument("--baseline", help="compare with this stored result afterwards")
+    run_parser.add_argument("--tolerance", type=float, default=0.10)
+
+    compare_parser = commands.add_parser("compare", help="compare two stored results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        result = compare(
+            json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+            json.loads(Path(args.current).read_text(encoding="utf-8")),
+            args.tolerance
+        )
+        _print_comparison(result)
+        raise SystemExit(1 if result["regressions"] else 0)
+
+    mix = parse_weights(args.mix)
+    unknown = set(mix) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets in --mix: {', '.join(sorted(unknown))}")
+    config = LoadConfig(
+        url=args.url,
+        bridge_url=args.bridge_url,
+        session=args.session,
+        token=args.token,
+        mix=mix,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        ramp=parse_ramp(args.ramp),
+        duration=args.duration,
+        max_requests=args.requests,
+        turns=max(1, args.turns),
+        prompt_weights=parse_weights(args.prompt_mix) if args.prompt_mix else (
+            dict(PROMPT_WEIGHTS) if not args.prompts else {}
+        ),
+        timeout=args.timeout,
+        seed=args.seed,
+        label=args.label,
+        in_process=args.in_process
+    )
+    config.prompts = load_prompts(args.prompts)
+
+    report = asyncio.run(run(config))
+    print(json.dumps({k: report[k] for k in ("label", "version", "elapsed_s", "overall", "targets")}, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    if not args.no_store:
+        print(f"\nStored: {store(report)}")
+    if args.baseline:
+        result = compare(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.tolerance)
+        _print_comparison(result)
+        raise SystemExit(1 if result["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
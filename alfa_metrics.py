@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - PROMETHEUS METRICS
+═══════════════════════════════════════════════════════════════════════════════
+
+Metryki dla /metrics (prometheus_client jest opcjonalny - bez niego
+wszystkie metody są no-op, a /metrics zwraca 503):
+- latencja żądań HTTP per endpoint (szablon ścieżki, nie surowy URL)
+- latencja providerów per provider/model, time-to-first-token, błędy wg typu
+- żądania w toku (HTTP i upstream per provider)
+- stan rejestru sesji, cache, singleflight i circuit breakerów - czytany
+  dopiero przy scrape, bez kosztu na ścieżce żądania
+
+Kardynalność etykiet jest ograniczona: modele spoza znanej listy trafiają
+do "other", typy błędów to stała lista, endpointy to zarejestrowane trasy.
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import time
+import asyncio
+from typing import Dict, Optional, Any, Callable, Iterable, Tuple
+
+import httpx
+
+from alfa_resilience import ProviderUnavailable, error_status
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # optional: metrics disabled
+    CollectorRegistry = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+OTHER = "other"
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def error_type(exc: BaseException) -> str:
+    """Bounded error label for an upstream exception"""
+    if isinstance(exc, ProviderUnavailable):
+        return "rejected"
+    status = error_status(exc)
+    if status == 429:
+        return "rate_limited"
+    if status is not None:
+        return "server_error" if status >= 500 else "client_error"
+    name = type(exc).__name__
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)) or "Timeout" in name:
+        return "timeout"
+    if isinstance(exc, (httpx.TransportError, ConnectionError)) or "Connection" in name:
+        return "connection"
+    return OTHER
+
+
+class AlfaMetrics:
+    """Metric set of one app instance (own registry, so tests can create many)"""
+
+    def __init__(self, models: Iterable[str], providers: Iterable[str]):
+        self.models = set(models)
+        self.providers = set(providers)
+        self.enabled = CollectorRegistry is not None
+        self._stats_sources: Dict[str, Tuple[Callable[[], Dict[str, Any]], str]] = {}
+        if not self.enabled:
+            return
+
+        self.registry = CollectorRegistry()
+        self.http_latency = Histogram(
+            "alfa_http_request_duration_seconds", "HTTP request latency per endpoint",
+            ["method", "route", "status"], registry=self.registry
+        )
+        self.http_in_flight = Gauge(
+            "alfa_http_requests_in_flight", "HTTP requests being served", registry=self.registry
+        )
+        self.upstream_latency = Histogram(
+            "alfa_upstream_duration_seconds", "Provider call latency",
+            ["provider", "model"], buckets=UPSTREAM_BUCKETS, registry=self.registry
+        )
+        self.upstream_ttft = Histogram(
+            "alfa_upstream_ttft_seconds", "Time to first streamed token",
+            ["provider", "model"], buckets=TTFT_BUCKETS, registry=self.registry
+        )
+        self.upstream_errors = Counter(
+            "alfa_upstream_errors_total", "Provider call errors by type",
+            ["provider", "type"], registry=self.registry
+        )
+        self.upstream_in_flight = Gauge(
+            "alfa_upstream_in_flight", "Provider calls in flight",
+            ["provider"], registry=self.registry
+        )
+        self.registry.register(_StatsCollector(self._stats_sources))
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # RECORDING
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        if self.enabled:
+            self.http_latency.labels(method, route, str(status)).observe(seconds)
+
+    def upstream_started(self, provider: str):
+        if self.enabled:
+            self.upstream_in_flight.labels(self._provider(provider)).inc()
+
+    def upstream_finished(self, provider: str, model: str, seconds: float, exc: Optional[BaseException] = None):
+        if not self.enabled:
+            return
+        provider = self._provider(provider)
+        self.upstream_in_flight.labels(provider).dec()
+        if exc is None:
+            self.upstream_latency.labels(provider, self._model(model)).observe(seconds)
+        else:
+            self.upstream_errors.labels(provider, error_type(exc)).inc()
+
+    def upstream_cancelled(self, provider: str):
+        """Call abandoned (lost race, client gone): neither latency nor error"""
+        if self.enabled:
+            self.upstream_in_flight.labels(self._provider(provider)).dec()
+
+    def upstream_rejected(self, provider: str, exc: ProviderUnavailable):
+        """Call refused locally (circuit open / rate limit), never reached the provider"""
+        if self.enabled:
+            self.upstream_errors.labels(self._provider(provider), error_type(exc)).inc()
+
+    def observe_ttft(self, provider: str, model: str, seconds: float):
+        if self.enabled:
+            self.upstream_ttft.labels(self._provider(provider), self._model(model)).observe(seconds)
+
+    def add_stats_source(self, name: str, source: Callable[[], Dict[str, Any]], label: str = "key"):
+        """
+        Export numeric values of source() (e.g. cache.stats) as gauges
+        alfa_<name>_<key> at scrape time. Dict values become a label
+        ({"openai": {"state": "open"}} -> alfa_<name>_state{<label>="openai"} 2).
+        """
+        self._stats_sources[name] = (source, label)
+
+    def render(self) -> Tuple[bytes, str]:
+        """Exposition payload + content type"""
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
+
+    def _model(self, model: str) -> str:
+        return model if model in self.models else OTHER
+
+    def _provider(self, provider: str) -> str:
+        return provider if provider in self.providers else OTHER
+
+
+class _StatsCollector:
+    """Turns stats() dicts into gauges when Prometheus scrapes"""
+
+    def __init__(self, sources: Dict[str, Tuple[Callable[[], Dict[str, Any]], str]]):
+        self.sources = sources
+
+    def collect(self):
+        for name, (source, label) in list(self.sources.items()):
+            try:
+                stats = source()
+            except Exception:
+                continue
+            labelled: Dict[str, Any] = {}
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    for field, field_value in value.items():
+                        labelled.setdefault(field, []).append((key, field_value))
+                    continue
+                value = _numeric(value)
+                if value is not None:
+                    gauge = GaugeMetricFamily(f"alfa_{name}_{key}", f"{name} {key}")
+                    gauge.add_metric([], value)
+                    yield gauge
+            for field, values in labelled.items():
+                gauge = GaugeMetricFamily(f"alfa_{name}_{field}", f"{name} {field}", labels=[label])
+                for key, value in values:
+                    value = _numeric(value)
+                    if value is not None:
+                        gauge.add_metric([key], value)
+                yield gauge
+
+    def describe(self):
+        return []
+
+
+def _numeric(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value in BREAKER_STATES:
+        return float(BREAKER_STATES[value])
+    return None
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-endpoint latency (by route template) and in-flight requests"""
+
+    def __init__(self, app, metrics: AlfaMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        self.metrics.http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.http_in_flight.dec()
+            # Route template ("/api/conversations/{conversation_id}"), set by the router
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.observe_request(scope["method"], route, status, time.perf_counter() - started)
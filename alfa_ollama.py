@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - OLLAMA WARM POOL
+═══════════════════════════════════════════════════════════════════════════════
+
+Utrzymywanie lokalnych modeli Ollama w pamięci (VRAM):
+- modele z listy preload ładowane przy starcie (i ponownie, jeśli Ollama
+  je zwolni lub zostanie zrestartowana) - pierwsze żądanie bez zimnego startu
+- keep_alive wysyłany z każdym żądaniem, liczony z niedawnego użycia:
+  często używane modele zostają długo, jednorazowe szybko zwalniają VRAM,
+  więc przełączanie llama3 / mistral / codellama nie wypycha gorących modeli
+- lista modeli rezydentnych (odświeżana z /api/ps) i koszt zimnego ładowania
+  (load_duration z odpowiedzi) - routing "auto" unika zimnych modeli
+- kontekst rozmowy (`context` z /api/generate) zapamiętany per historia:
+  kolejna tura wysyła tylko nową wiadomość zamiast całej rozmowy, więc
+  Ollama nie przelicza ponownie całego promptu; nieużywane konteksty są
+  usuwane (LRU z limitem łącznej liczby tokenów i TTL); po chybieniu cała
+  historia idzie jednym promptem przez /api/generate, więc odpowiedź
+  znowu niesie `context` dla następnej tury
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable, Iterable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# load_duration above this means the model had to be loaded for the request
+COLD_LOAD_MS = 500.0
+
+
+def model_name(name: str) -> str:
+    """Ollama model name without the "ollama-" prefix and default tag"""
+    name = name.replace("ollama-", "", 1) if name.startswith("ollama-") else name
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+async def ollama_has_model(client: httpx.AsyncClient, name: str, tags_url: str = "/api/tags") -> bool:
+    """True if Ollama has the model pulled (/api/tags); False also when Ollama is down"""
+    try:
+        response = await client.get(tags_url)
+        response.raise_for_status()
+        models = response.json().get("models", [])
+    except (httpx.HTTPError, ValueError):
+        return False
+    return model_name(name) in {model_name(m.get("name") or m.get("model", "")) for m in models}
+
+
+class ModelUsage:
+    """Recent use and residency of one local model"""
+
+    def __init__(self, name: str, pinned: bool = False):
+        self.name = name
+        self.pinned = pinned
+        self.uses: deque = deque()
+        self.resident_until = 0.0  # monotonic deadline, 0 = not loaded
+        self.size_vram = 0
+        self.load_ms: Optional[float] = None
+        self.cold_loads = 0
+        self.prompt_tokens = 0
+        self.prompt_eval_ms = 0.0
+
+    def resident(self, now: float) -> bool:
+        return self.resident_until > now
+
+
+class OllamaWarmPool:
+    """
+    Keeps preloaded / frequently used Ollama models resident.
+
+    keep_alive of a request grows linearly with the number of uses in the
+    last `usage_window` seconds, from `min_keep_alive` (single use) to
+    `max_keep_alive` (`hot_uses` or more); pinned (preloaded) models always
+    get `max_keep_alive` and are reloaded by the refresh loop when missing.
+    """
+
+    def __init__(
+        self,
+        client: Callable[[], httpx.AsyncClient],
+        preload: Iterable[str] = (),
+        min_keep_alive: float = 60.0,
+        max_keep_alive: float = 1800.0,
+        usage_window: float = 900.0,
+        hot_uses: int = 10,
+        refresh_interval: float = 30.0,
+        default_load_ms: float = 3000.0
+    ):
+        self._client = client
+        self.min_keep_alive = min_keep_alive
+        self.max_keep_alive = max_keep_alive
+        self.usage_window = usage_window
+        self.hot_uses = hot_uses
+        self.refresh_interval = refresh_interval
+        self.default_load_ms = default_load_ms
+        self._models: Dict[str, ModelUsage] = {}
+        for name in preload:
+            self._usage(name).pinned = True
+        self._task: Optional[asyncio.Task] = None
+
+        self.preloads = 0
+        self.refresh_errors = 0
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # LIFECYCLE
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def start(self):
+        """Preload pinned models and keep the residency table fresh (background)"""
+        if self._task is None and (self.refresh_interval > 0 or self.pinned()):
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+                await self.preload_missing()
+            except Exception as e:
+                # Ollama down / not installed: requests fail on their own
+                self.refresh_errors += 1
+                logger.debug(f"Ollama warm pool refresh failed: {e}")
+            if self.refresh_interval <= 0:
+                return
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self):
+        """Read resident models from /api/ps"""
+        response = await self._client().get("/api/ps")
+        response.raise_for_status()
+        now = time.monotonic()
+        loaded = {}
+        for entry in response.json().get("models", []):
+            loaded[model_name(entry.get("name") or entry.get("model", ""))] = entry
+        for name, usage in self._models.items():
+            if name not in loaded:
+                usage.resident_until = 0.0
+        for name, entry in loaded.items():
+            usage = self._usage(name)
+            usage.size_vram = entry.get("size_vram", 0)
+            usage.resident_until = now + _seconds_until(entry.get("expires_at"), self.max_keep_alive)
+
+    async def preload_missing(self):
+        """Load pinned models that are not resident (startup, Ollama restart)"""
+        now = time.monotonic()
+        for usage in list(self._models.values()):
+            if usage.pinned and not usage.resident(now):
+                await self.preload(usage.name)
+
+    async def preload(self, name: str):
+        """Load a model without generating (empty chat)"""
+        name = model_name(name)
+        keep_alive = self.keep_alive(name)
+        started = time.perf_counter()
+        response = await self._client().post(
+            "/api/chat",
+            json={"model": name, "messages": [], "keep_alive": keep_alive}
+        )
+        response.raise_for_status()
+        usage = self._usage(name)
+        usage.load_ms = (time.perf_counter() - started) * 1000
+        usage.resident_until = time.monotonic() + keep_alive
+        self.preloads += 1
+        logger.info(f"Ollama model {name} preloaded in {usage.load_ms:.0f} ms")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # REQUEST PATH
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def touch(self, name: str):
+        """Record a request for the model (before sending it)"""
+        usage = self._usage(model_name(name))
+        now = time.monotonic()
+        usage.uses.append(now)
+        self._expire_uses(usage, now)
+
+    def keep_alive(self, name: str) -> int:
+        """keep_alive (seconds) to send with a request for the model"""
+        usage = self._models.get(model_name(name))
+        if usage is None:
+            return int(self.min_keep_alive)
+        if usage.pinned:
+            return int(self.max_keep_alive)
+        self._expire_uses(usage, time.monotonic())
+        heat = min(1.0, max(0, len(usage.uses) - 1) / max(1, self.hot_uses - 1))
+        return int(self.min_keep_alive + (self.max_keep_alive - self.min_keep_alive) * heat)
+
+    def observe(self, name: str, data: Dict[str, Any]):
+        """Final Ollama response of a request: model is resident, note load cost"""
+        usage = self._usage(model_name(name))
+        usage.resident_until = time.monotonic() + self.keep_alive(usage.name)
+        usage.prompt_tokens += data.get("prompt_eval_count", 0)
+        usage.prompt_eval_ms += data.get("prompt_eval_duration", 0) / 1e6
+        load_ms = data.get("load_duration", 0) / 1e6
+        if load_ms >= COLD_LOAD_MS:
+            usage.cold_loads += 1
+            usage.load_ms = load_ms
+
+    def is_resident(self, name: str) -> bool:
+        usage = self._models.get(model_name(name))
+        return usage is not None and usage.resident(time.monotonic())
+
+    def load_penalty_ms(self, name: str) -> float:
+        """Expected extra latency of the next request (0 when resident)"""
+        usage = self._models.get(model_name(name))
+        if usage is not None and usage.resident(time.monotonic()):
+            return 0.0
+        if usage is not None and usage.load_ms is not None:
+            return usage.load_ms
+        return self.default_load_ms
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # INTROSPECTION
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def pinned(self) -> List[str]:
+        return [name for name, usage in self._models.items() if usage.pinned]
+
+    def resident(self) -> List[str]:
+        now = time.monotonic()
+        return [name for name, usage in self._models.items() if usage.resident(now)]
+
+    def models(self) -> List[Dict[str, Any]]:
+        """Residency / keep_alive table (for /api/ollama/models)"""
+        now = time.monotonic()
+        rows = []
+        for name, usage in sorted(self._models.items()):
+            self._expire_uses(usage, now)
+            rows.append({
+                "model": name,
+                "resident": usage.resident(now),
+                "expires_in": round(max(0.0, usage.resident_until - now), 1),
+                "pinned": usage.pinned,
+                "keep_alive": self.keep_alive(name),
+                "recent_uses": len(usage.uses),
+                "size_vram": usage.size_vram,
+                "load_ms": round(usage.load_ms, 1) if usage.load_ms is not None else None,
+                "cold_loads": usage.cold_loads,
+                "prompt_tokens": usage.prompt_tokens,
+                "prompt_eval_ms": round(usage.prompt_eval_ms, 1)
+            })
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resident": len(self.resident()),
+            "pinned": len(self.pinned()),
+            "preloads": self.preloads,
+            "cold_loads": sum(usage.cold_loads for usage in self._models.values()),
+            "refresh_errors": self.refresh_errors
+        }
+
+    def _usage(self, name: str) -> ModelUsage:
+        usage = self._models.get(name)
+        if usage is None:
+            usage = self._models[name] = ModelUsage(name)
+        return usage
+
+    def _expire_uses(self, usage: ModelUsage, now: float):
+        deadline = now - self.usage_window
+        while usage.uses and usage.uses[0] < deadline:
+            usage.uses.popleft()
+
+
+class OllamaContextCache:
+    """
+    Ollama `context` (prompt + reply token ids) keyed by model + conversation
+    history, so the next turn of a conversation sends only its new message.
+
+    The key is a hash of the messages the context encodes: a conversation
+    whose history changed (trimmed to the token budget, edited by another
+    worker, answered by another model) simply misses and is sent in full.
+    Entries are evicted LRU once they hold more than `max_tokens` token ids
+    in total, or after `ttl` seconds without use.
+    """
+
+    def __init__(self, max_tokens: int = 2_000_000, ttl: float = 3600.0):
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (context, last_used)
+        self._tokens = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, messages: Iterable[Dict[str, str]]) -> str:
+        payload = [model_name(model), [(m["role"], m["content"]) for m in messages]]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, model: str, history: List[Dict[str, str]]) -> Optional[List[int]]:
+        """Context encoding `history` ([] for a new conversation), None if unknown"""
+        if not history:
+            return []
+        key = self.key(model, history)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic() - self.ttl:
+            self.misses += 1
+            return None
+        self._entries[key] = (entry[0], time.monotonic())
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0].tolist()
+
+    def put(self, model: str, messages: List[Dict[str, str]], context: List[int], parent: Optional[List[Dict[str, str]]] = None):
+        """Store the context of `messages`; the `parent` turn's context is superseded"""
+        if parent:
+            self._discard(self.key(model, parent))
+        key = self.key(model, messages)
+        self._discard(key)
+        stored = array("i", context)
+        self._entries[key] = (stored, time.monotonic())
+        self._tokens += len(stored)
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "contexts": len(self._entries),
+            "tokens": self._tokens,
+            "max_tokens": self.max_tokens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._tokens -= len(entry[0])
+
+    def _evict(self):
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            key, (context, last_used) = next(iter(self._entries.items()))
+            if self._tokens <= self.max_tokens and last_used >= deadline:
+                break
+            self._discard(key)
+            self.evictions += 1
+
+
+def transcript_prompt(messages: List[Dict[str, str]]) -> tuple:
+    """
+    (system, prompt) of a chat history for /api/generate: system messages
+    go to `system`, earlier turns are rendered as a role-labelled transcript
+    ahead of the last message (the model template wraps it as one user turn).
+    """
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    turns = [m for m in messages if m["role"] != "system"]
+    if len(turns) <= 1:
+        return system, turns[-1]["content"] if turns else ""
+    labels = {"user": "User", "assistant": "Assistant"}
+    lines = [f"{labels.get(m['role'], m['role'].title())}: {m['content']}" for m in turns]
+    return system, "\n\n".join(lines)
+
+
+def _seconds_until(expires_at: Optional[str], default: float) -> float:
+    """Seconds left of an /api/ps expires_at timestamp"""
+    if not expires_at:
+        return default
+    try:
+        # Ollama uses nanosecond precision, fromisoformat takes microseconds
+        head, dot, rest = expires_at.partition(".")
+        if dot:
+            digits = len(rest) - len(rest.lstrip("0123456789"))
+            rest = rest[:min(digits, 6)] + rest[digits:]
+        expires = datetime.fromisoformat(head + dot + rest.replace("Z", "+00:00"))
+        return max(0.0, expires.timestamp() - time.time())
+    except ValueError:
+        return default
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - PROVIDER RESILIENCE
+═══════════════════════════════════════════════════════════════════════════════
+
+Ochrona wywołań providerów AI:
+- AdaptiveTokenBucket: limiter, który uczy się limitu z odpowiedzi 429 /
+  nagłówka Retry-After (AIMD: połowa tempa po 429, powolny wzrost po sukcesie)
+- CircuitBreaker: po serii awarii (5xx, timeout, brak połączenia) odrzuca
+  wywołania natychmiast, po czasie wpuszcza jedno wywołanie próbne (half-open)
+- ProviderGuard: łączy oba mechanizmy dla jednego providera - osobny limiter
+  dla każdego klucza API (429 jednego użytkownika nie dławi pozostałych),
+  jeden wyłącznik na providera (awaria providera dotyczy wszystkich)
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Any, AsyncIterator, Callable
+
+import httpx
+
+
+class ProviderUnavailable(Exception):
+    """Call rejected locally: circuit open or rate limit exhausted"""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        super().__init__(f"{provider} unavailable ({reason}), retry in {retry_after:.1f}s")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ERROR CLASSIFICATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP status of a provider error (httpx or SDK), if any"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def parse_retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from Retry-After / retry-after-ms headers of the error's response"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    "rate_limited" - 429 from provider
+    "unavailable"  - 5xx, timeout, connection error (counts against the breaker)
+    "client"       - anything else (bad key, bad request): provider is up
+    """
+    status = error_status(exc)
+    if status == 429:
+        return "rate_limited"
+    if status is not None:
+        return "unavailable" if status >= 500 else "client"
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return "unavailable"
+    name = type(exc).__name__
+    if "Timeout" in name or "Connection" in name:
+        return "unavailable"
+    return "client"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RATE LIMITER
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate adapts to the provider's 429 responses"""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: float = 20.0,
+        min_rate: float = 0.2,
+        increase: float = 0.1,
+        default_retry_after: float = 1.0
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.increase = increase
+        self.default_retry_after = default_retry_after
+        self.tokens = burst
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token; return 0, or seconds to wait before a token is free"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def on_success(self):
+        """Additive increase back towards the configured rate"""
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self, retry_after: Optional[float]):
+        """Multiplicative decrease + pause until Retry-After"""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        pause = retry_after if retry_after is not None else self.default_retry_after
+        self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": round(self.rate, 3),
+            "tokens": round(self.tokens, 2),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2)
+        }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CIRCUIT BREAKER
+# ─────────────────────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """0 if a call may go through now, else seconds until the next probe"""
+        if self.state == self.CLOSED:
+            return 0.0
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == self.OPEN and remaining <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return 1.0
+            self._probe_in_flight = True
+            return 0.0
+        return remaining
+
+    def on_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            # Failed probe: stay open longer
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open()
+        elif self.failures >= self.failure_threshold:
+            self._open()
+
+    def release_probe(self):
+        self._probe_in_flight = False
+
+    def healthy(self) -> bool:
+        return self.state == self.CLOSED
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_for": round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 2)
+            if self.state == self.OPEN else 0.0
+        }
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PROVIDER GUARD
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ProviderGuard:
+    """
+    Rate limiter + circuit breaker around every upstream call of a provider.
+
+    Provider quotas are per API key, so every credential (see
+    alfa_cache.credential_id) gets its own bucket from `make_bucket`;
+    at most `max_buckets` recently used buckets are kept.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        make_bucket: Callable[[], AdaptiveTokenBucket],
+        breaker: CircuitBreaker,
+        max_wait: float = 2.0,
+        max_buckets: int = 10000
+    ):
+        self.provider = provider
+        self.make_bucket = make_bucket
+        self.breaker = breaker
+        self.max_wait = max_wait
+        self.max_buckets = max_buckets
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, AdaptiveTokenBucket]" = OrderedDict()
+
+    def bucket(self, credential: str = "") -> AdaptiveTokenBucket:
+        """Rate limiter of one API key"""
+        bucket = self._buckets.get(credential)
+        if bucket is None:
+            bucket = self._buckets[credential] = self.make_bucket()
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(credential)
+        return bucket
+
+    async def admit(self, credential: str = ""):
+        """Fail fast if the circuit is open; wait briefly for a rate-limit token"""
+        retry_after = self.breaker.retry_after()
+        if retry_after > 0:
+            self.rejected += 1
+            raise ProviderUnavailable(self.provider, f"circuit {self.breaker.state}", retry_after)
+
+        bucket = self.bucket(credential)
+        try:
+            wait = bucket.reserve()
+            while wait > 0:
+                if wait > self.max_wait:
+                    self.rejected += 1
+                    raise ProviderUnavailable(self.provider, "rate limited", wait)
+                await asyncio.sleep(wait)
+                wait = bucket.reserve()
+        except BaseException:
+            # Rejected, or cancelled while waiting (race loser, hedge, client
+            # gone): a claimed half-open probe must not stay claimed
+            self.breaker.release_probe()
+            raise
+
+    def record(self, exc: Optional[BaseException], credential: str = ""):
+        """Feed call outcome back into the key's limiter and the provider's breaker"""
+        bucket = self.bucket(credential)
+        if exc is None:
+            bucket.on_success()
+            self.breaker.on_success()
+            return
+        kind = classify_error(exc)
+        if kind == "rate_limited":
+            bucket.on_rate_limited(parse_retry_after(exc))
+            self.breaker.release_probe()
+        elif kind == "unavailable":
+            self.breaker.on_failure()
+        else:
+            # Provider answered (e.g. bad API key) - it is up
+            self.breaker.on_success()
+
+    @asynccontextmanager
+    async def guard(self, credential: str = "") -> AsyncIterator[None]:
+        """async with guard.guard(credential): <upstream call>"""
+        await self.admit(credential)
+        try:
+            yield
+        except Exception as e:
+            self.record(e, credential)
+            raise
+        except BaseException:
+            # Cancelled, or a stream closed by its consumer (GeneratorExit):
+            # no verdict about the provider, but a half-open probe must be freed
+            self.breaker.release_probe()
+            raise
+        else:
+            self.record(None, credential)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        buckets = list(self._buckets.values())
+        return {
+            **self.breaker.stats(),
+            "keys": len(buckets),
+            "throttled_keys": sum(1 for b in buckets if b.rate < b.max_rate or b.blocked_until > now),
+            "min_rate": round(min((b.rate for b in buckets), default=0.0), 3),
+            "rejected": self.rejected
+        }
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - LATENCY-AWARE ROUTING
+═══════════════════════════════════════════════════════════════════════════════
+
+Routing modelu "auto" w AIFederation:
+- per provider/model: EWMA latencji, szkic p95 (histogram logarytmiczny
+  z wygaszaniem starych próbek) i EWMA współczynnika błędów, który wygasa
+  z czasem (model po serii błędów wraca do gry)
+- wybór: najszybszy zdrowy model spośród tych, do których użytkownik ma klucz
+  (wynik = mieszanka EWMA i p95, karany za błędy; modele bez pomiarów
+  dostają wartość startową, a mały procent ruchu odświeża statystyki -
+  także modeli chwilowo pominiętych z powodu błędów)
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import math
+import time
+import random
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple
+
+
+class QuantileSketch:
+    """
+    Log-bucketed histogram (relative error ~ (gamma - 1) / 2) for latency
+    quantiles. Counts are halved every `decay_every` samples, so the
+    sketch follows recent behaviour.
+    """
+
+    def __init__(self, gamma: float = 1.1, decay_every: int = 500):
+        self.gamma = gamma
+        self._log_gamma = math.log(gamma)
+        self.decay_every = decay_every
+        self._buckets: Dict[int, float] = {}
+        self._count = 0.0
+        self._since_decay = 0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(max(value, 1e-3)) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0.0) + 1
+        self._count += 1
+        self._since_decay += 1
+        if self._since_decay >= self.decay_every:
+            self._decay()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self._count <= 0:
+            return None
+        rank = q * self._count
+        seen = 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return self.gamma ** index * 2 / (1 + self.gamma)
+        return self.gamma ** max(self._buckets) * 2 / (1 + self.gamma)
+
+    def _decay(self):
+        self._since_decay = 0
+        self._buckets = {i: c / 2 for i, c in self._buckets.items() if c >= 0.5}
+        self._count = sum(self._buckets.values())
+
+
+class ModelStats:
+    """Rolling latency / error tracker of one provider model"""
+
+    def __init__(self, provider: str, model: str, alpha: float = 0.2, error_half_life: float = 60.0):
+        self.provider = provider
+        self.model = model
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.ewma_ms: Optional[float] = None
+        self._error_rate = 0.0
+        self._error_at = time.monotonic()
+        self.sketch = QuantileSketch()
+        self.requests = 0
+        self.errors = 0
+        self.last_used = 0.0
+
+    def record(self, latency_ms: float, ok: bool):
+        self.requests += 1
+        self.last_used = time.monotonic()
+        self._error_rate = self.error_rate + self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        self._error_at = self.last_used
+        if not ok:
+            self.errors += 1
+            return
+        self.sketch.add(latency_ms)
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms += self.alpha * (latency_ms - self.ewma_ms)
+
+    @property
+    def error_rate(self) -> float:
+        """Error EWMA, halved every `error_half_life` seconds without requests"""
+        idle = time.monotonic() - self._error_at
+        return self._error_rate * 0.5 ** (idle / self.error_half_life)
+
+    def p95_ms(self) -> Optional[float]:
+        return self.sketch.quantile(0.95)
+
+
+class LatencyRouter:
+    """Routing table: known models -> rolling stats, picks the fastest healthy one"""
+
+    def __init__(
+        self,
+        models: Iterable[Tuple[str, str]],
+        prior_ms: float = 2000.0,
+        max_error_rate: float = 0.5,
+        error_penalty: float = 4.0,
+        explore: float = 0.05
+    ):
+        # Only models from the table are tracked, so cardinality stays bounded
+        self._stats: Dict[str, ModelStats] = {
+            model: ModelStats(provider, model) for provider, model in models
+        }
+        self.prior_ms = prior_ms
+        self.max_error_rate = max_error_rate
+        self.error_penalty = error_penalty
+        self.explore = explore
+
+    def record(self, model: str, latency_ms: float, ok: bool):
+        stats = self._stats.get(model)
+        if stats is not None:
+            stats.record(latency_ms, ok)
+
+    def score(self, stats: ModelStats) -> float:
+        """Expected latency: mix of EWMA and p95, inflated by recent errors"""
+        if stats.ewma_ms is None:
+            base = self.prior_ms
+        else:
+            base = 0.5 * stats.ewma_ms + 0.5 * (stats.p95_ms() or stats.ewma_ms)
+        return base * (1 + self.error_penalty * stats.error_rate)
+
+    def choose(
+        self,
+        allowed: Callable[[str], bool],
+        healthy: Callable[[str], bool],
+        extra_ms: Optional[Callable[[str], float]] = None
+    ) -> Optional[str]:
+        """
+        Fastest model whose provider passes `allowed` (user has a key) and
+        `healthy` (circuit not open), skipping models with a high error rate.
+        `extra_ms(model)` adds a known one-off cost (e.g. loading a local model).
+        With probability `explore` a random eligible model is picked instead -
+        including unreliable ones, so a recovered model gets probed.
+        """
+        eligible = [
+            stats for stats in self._stats.values()
+            if allowed(stats.provider) and healthy(stats.provider)
+        ]
+        if not eligible:
+            return None
+        reliable = [s for s in eligible if s.error_rate < self.max_error_rate] or eligible
+        if len(eligible) > 1 and random.random() < self.explore:
+            return random.choice(eligible).model
+        if extra_ms is None:
+            return min(reliable, key=self.score).model
+        return min(reliable, key=lambda stats: self.score(stats) + extra_ms(stats.model)).model
+
+    def table(self) -> List[Dict[str, Any]]:
+        """Routing table ordered by score (for introspection)"""
+        rows = []
+        for stats in sorted(self._stats.values(), key=self.score):
+            p95 = stats.p95_ms()
+            rows.append({
+                "model": stats.model,
+                "provider": stats.provider,
+                "score_ms": round(self.score(stats), 1),
+                "ewma_ms": round(stats.ewma_ms, 1) if stats.ewma_ms is not None else None,
+                "p95_ms": round(p95, 1) if p95 is not None else None,
+                "error_rate": round(stats.error_rate, 4),
+                "requests": stats.requests,
+                "errors": stats.errors
+            })
+        return rows
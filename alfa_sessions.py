@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - SESSION REGISTRY
+═══════════════════════════════════════════════════════════════════════════════
+
+Rejestr sesji użytkowników dla AIFederation:
+- LRU z limitem rozmiaru + eviction sesji bezczynnych (stała pamięć)
+- write-behind: zmiany zapisywane w tle, paczkami
+- jeden wspólny magazyn SQLite (WAL) zamiast pliku JSON na użytkownika
+  (stare pliki ~/.alfa/users/<email>.json są importowane przy pierwszym odczycie)
+- cache zweryfikowanych sesji logowania (TTL + unieważnienie przy wylogowaniu),
+  żeby uwierzytelnione żądanie kosztowało jedno trafienie w słownik
+- wiele procesów (uvicorn --workers N): rejestr sprawdza rewizję rekordu
+  w magazynie, a sesje logowania są zapisywane we wspólnym AuthSessionStore
+  (implementacje SQLite i w pamięci - patrz alfa_state.py)
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Consolidated SQLite store for all users' settings"""
+
+    def __init__(self, db_path: Path, legacy_dir: Optional[Path] = None):
+        self.db_path = Path(db_path)
+        self.legacy_dir = Path(legacy_dir) if legacy_dir else None
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " user_email TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def load(self, user_email: str) -> Optional[Dict[str, Any]]:
+        """Load user record (falls back to the legacy per-user JSON file)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM users WHERE user_email = ?", (user_email,)
+            ).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        return self._load_legacy(user_email)
+
+    def revision(self, user_email: str) -> Optional[str]:
+        """Changes whenever the user's record is saved (by any process)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT updated_at FROM users WHERE user_email = ?", (user_email,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, records: Dict[str, Dict[str, Any]]):
+        """Upsert many user records in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [
+            (email, json.dumps(record, ensure_ascii=False), now)
+            for email, record in records.items()
+        ]
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO users (user_email, data, updated_at) VALUES (?, ?, ?)",
+                    rows
+                )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _load_legacy(self, user_email: str) -> Optional[Dict[str, Any]]:
+        """Import ~/.alfa/users/<email>.json written by older versions"""
+        if self.legacy_dir is None:
+            return None
+        legacy_path = self.legacy_dir / f"{user_email}.json"
+        if not legacy_path.exists():
+            return None
+        try:
+            data = json.loads(legacy_path.read_text())
+        except Exception:
+            return None
+        record = {"api_keys": data.get("api_keys", {})}
+        self.save_many({user_email: record})
+        return record
+
+
+class MemorySessionStore:
+    """In-process SessionStore (tests, single worker)"""
+
+    def __init__(self):
+        self._records: Dict[str, tuple] = {}
+        self._revisions = 0
+
+    def load(self, user_email: str) -> Optional[Dict[str, Any]]:
+        entry = self._records.get(user_email)
+        return json.loads(entry[0]) if entry else None
+
+    def revision(self, user_email: str) -> Optional[str]:
+        entry = self._records.get(user_email)
+        return entry[1] if entry else None
+
+    def save_many(self, records: Dict[str, Dict[str, Any]]):
+        for email, record in records.items():
+            self._revisions += 1
+            self._records[email] = (json.dumps(record, ensure_ascii=False), str(self._revisions))
+
+    def close(self):
+        pass
+
+
+class AuthSessionStore:
+    """Login sessions shared by all worker processes (SQLite, WAL)"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS auth_sessions ("
+            " session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM auth_sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, user: Dict[str, Any], ttl: float):
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO auth_sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(user, ensure_ascii=False, default=str), time.time() + ttl)
+                )
+                self._db.execute("DELETE FROM auth_sessions WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM auth_sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MemoryAuthSessionStore:
+    """In-process AuthSessionStore (tests, single worker)"""
+
+    def __init__(self):
+        self._sessions: Dict[str, tuple] = {}
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def set(self, session_id: str, user: Dict[str, Any], ttl: float):
+        self._sessions[session_id] = (time.time() + ttl, user)
+
+    def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def close(self):
+        pass
+
+
+class SessionRegistry:
+    """
+    LRU-bounded registry of user sessions with idle eviction and
+    write-behind persistence.
+
+    Sessions are built by `factory(user_email, record)` and must provide
+    `to_record()` and a `last_seen` attribute. Changed sessions are reported
+    with `mark_dirty()` and flushed to the store in the background every
+    `flush_interval` seconds or as soon as `flush_batch` sessions are dirty.
+    With `revalidate=True` (store shared with other processes) a resident
+    session is reloaded when its record was saved elsewhere; the record's
+    revision is checked at most once per `revalidate_interval` seconds
+    per session, so hot sessions do not query the store on every request.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        factory: Callable[[str, Dict[str, Any]], Any],
+        max_sessions: int = 10000,
+        idle_ttl: float = 1800.0,
+        flush_interval: float = 2.0,
+        flush_batch: int = 500,
+        revalidate: bool = False,
+        revalidate_interval: float = 1.0
+    ):
+        self.store = store
+        self.revalidate = revalidate
+        self.revalidate_interval = revalidate_interval
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._revisions: Dict[str, Optional[str]] = {}
+        self._checked: Dict[str, float] = {}
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.evictions = 0
+        self.flushes = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_email: str) -> bool:
+        return user_email in self._sessions
+
+    def get(self, user_email: str) -> Any:
+        """Get session from memory, or load it (pending writes win over the store)"""
+        now = time.monotonic()
+        session = self._sessions.get(user_email)
+        if (
+            session is not None and self.revalidate and not self._pending(user_email)
+            and now - self._checked.get(user_email, 0.0) >= self.revalidate_interval
+        ):
+            self._checked[user_email] = now
+            if self.store.revision(user_email) != self._revisions.get(user_email):
+                # Saved by another worker since we loaded it
+                session = None
+                self.reloads += 1
+        if session is None:
+            pending = self._pending(user_email)
+            if not pending and self.revalidate:
+                self._revisions[user_email] = self.store.revision(user_email)
+                self._checked[user_email] = now
+            record = pending or self.store.load(user_email) or {}
+            session = self.factory(user_email, record)
+            self._sessions[user_email] = session
+            self._evict_overflow()
+        else:
+            self._sessions.move_to_end(user_email)
+        session.last_seen = now
+        return session
+
+    def mark_dirty(self, session: Any):
+        """Queue session for the next background flush"""
+        self._dirty[session.user_email] = session.to_record()
+        if self._wake is not None and len(self._dirty) >= self.flush_batch:
+            self._wake.set()
+
+    async def start(self):
+        """Start background flush / idle eviction loop"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop background loop and flush pending writes"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """Write all dirty sessions to the store in one batch (one flush at a time)"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self.store.save_many, self._flushing)
+                self.flushes += 1
+                if self.revalidate:
+                    for user_email in self._flushing:
+                        self._revisions[user_email] = await asyncio.to_thread(self.store.revision, user_email)
+            except Exception as e:
+                logger.error(f"Session flush failed: {e}")
+                # Keep failed writes, newer changes win
+                self._dirty = {**self._flushing, **self._dirty}
+            finally:
+                self._flushing = {}
+
+    def evict_idle(self):
+        """Drop sessions not used for idle_ttl seconds (oldest are first in LRU order)"""
+        deadline = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_email, session = next(iter(self._sessions.items()))
+            if session.last_seen > deadline:
+                break
+            self._drop(user_email)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resident": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "dirty": len(self._dirty),
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "reloads": self.reloads
+        }
+
+    def _pending(self, user_email: str) -> Optional[Dict[str, Any]]:
+        """Record not yet written to the store"""
+        return self._dirty.get(user_email) or self._flushing.get(user_email)
+
+    def _drop(self, user_email: str):
+        self._sessions.pop(user_email, None)
+        self._revisions.pop(user_email, None)
+        self._checked.pop(user_email, None)
+        self.evictions += 1
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            self.evict_idle()
+
+
+class VerifiedSessionCache:
+    """
+    session_id -> user of sessions already checked by the auth manager
+    (`verify_session` + `get_session`), kept for `ttl` seconds.
+    Only valid sessions are cached; `invalidate()` on logout.
+
+    With a `shared` AuthSessionStore, logins remembered by one worker
+    process are accepted by the others (the auth manager keeps its
+    sessions in process memory). The shared store is consulted only for
+    session ids this worker's auth manager has never accepted - once it
+    has, its negative answer (expired, revoked) is final. Shared records
+    expire together with the login (`expires_at` of the auth session,
+    at most `shared_ttl`). A logout in another worker is seen here after
+    at most `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        auth_manager: Any,
+        ttl: float = 60.0,
+        max_entries: int = 10000,
+        shared: Optional[Any] = None,
+        shared_ttl: float = 86400.0
+    ):
+        self.auth_manager = auth_manager
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Session ids the local auth manager has verified at least once
+        self._local: "OrderedDict[str, None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """User data of a valid session, None if missing / invalid"""
+        if not session_id:
+            return None
+        entry = self._entries.get(session_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        user = None
+        if self.auth_manager.verify_session(session_id):
+            user = self.auth_manager.get_session(session_id)
+            if user:
+                self._mark_local(session_id)
+        elif session_id in self._local:
+            # Expired or revoked here - the shared copy must not revive it
+            self._local.pop(session_id)
+            if self.shared is not None:
+                self.shared.delete(session_id)
+        elif self.shared is not None:
+            user = self.shared.get(session_id)
+        if not user:
+            self._entries.pop(session_id, None)
+            return None
+        self._entries[session_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return user
+
+    def remember(self, session_id: str):
+        """Publish a fresh login to the other workers"""
+        if self.shared is None or not self.auth_manager.verify_session(session_id):
+            return
+        user = self.auth_manager.get_session(session_id)
+        if not user:
+            return
+        self._mark_local(session_id)
+        ttl = _seconds_until(user.get("expires_at") if isinstance(user, dict) else None, self.shared_ttl)
+        if ttl > 0:
+            self.shared.set(session_id, user, ttl)
+
+    def invalidate(self, session_id: str):
+        self._entries.pop(session_id, None)
+        self._local.pop(session_id, None)
+        if self.shared is not None:
+            self.shared.delete(session_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._local.clear()
+
+    def _mark_local(self, session_id: str):
+        self._local[session_id] = None
+        self._local.move_to_end(session_id)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def _seconds_until(expires_at: Any, default: float) -> float:
+    """Seconds left until an auth session's expires_at (ISO string or epoch), capped at `default`"""
+    if expires_at is None:
+        return default
+    try:
+        if isinstance(expires_at, (int, float)):
+            left = expires_at - time.time()
+        else:
+            expires = datetime.fromisoformat(str(expires_at))
+            left = (expires - datetime.now(expires.tzinfo)).total_seconds()
+    except ValueError:
+        return default
+    return min(left, default)
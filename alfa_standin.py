@@ -0,0 +1,627 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - OFFLINE PROVIDER STAND-IN
+═══════════════════════════════════════════════════════════════════════════════
+
+Lokalny serwer udający API providerów - benchmarki i testy obciążeniowe
+bez kluczy API i bez sieci. Każdy provider ma własny prefiks ścieżki:
+
+    /openai/v1/chat/completions                    (OpenAI, SSE)
+    /anthropic/v1/messages                         (Anthropic, SSE z eventami)
+    /gemini/v1beta/models/<m>:generateContent      (Gemini, streamGenerateContent?alt=sse)
+    /deepseek/v1/chat/completions                  (DeepSeek, jak OpenAI)
+    /ollama/api/chat, /api/generate, /api/ps       (Ollama, NDJSON, context)
+
+Profil per provider (JSON, `--config`, albo PUT /standin/config w trakcie):
+- latency: rozkład czasu do pierwszego tokenu w ms - "120", "fixed:120",
+  "uniform:50:200", "normal:200:40", "lognormal:200:0.5", "exp:200"
+- tokens_per_sec / chunk_tokens: tempo i ziarnistość generowania odpowiedzi
+- prompt_tokens_per_sec: koszt przetwarzania promptu (0 = pomijany)
+- reply_tokens: długość odpowiedzi ("20:80" = losowo z zakresu)
+- error_rate + errors ({"429": waga, "500": ..., "503": ...}), timeout_rate
+- load_ms: zimne ładowanie modelu Ollama (modele trzymane wg keep_alive)
+
+alfa_app kieruje wszystkich providerów na stand-in przez
+ALFA_STANDIN_URL=http://127.0.0.1:8799 (zob. standin_base_urls).
+
+Użycie:
+    python alfa_standin.py --port 8799 --config alfa_standin.example.json --seed 1
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass, field, asdict, fields
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("openai", "anthropic", "gemini", "deepseek", "ollama")
+
+# API root of each provider below the stand-in URL (as in AI_PROVIDERS["..."]["base_url"])
+BASE_PATHS = {
+    "openai": "/openai/v1",
+    "anthropic": "/anthropic",
+    "gemini": "/gemini",
+    "deepseek": "/deepseek",
+    "ollama": "/ollama"
+}
+
+WORDS = (
+    "the model answers with plain filler text so that benchmarks measure "
+    "transport latency token pacing and error handling rather than content"
+).split()
+
+
+def standin_base_urls(root: str) -> Dict[str, str]:
+    """base_url per provider for a stand-in running at `root`"""
+    root = root.rstrip("/")
+    return {provider: root + path for provider, path in BASE_PATHS.items()}
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (whitespace words, at least 1 per non-empty text)"""
+    return max(1, len(text.split())) if text else 0
+
+
+def sample_ms(spec: str, rng: random.Random) -> float:
+    """Sample a latency in ms from a distribution spec ("lognormal:200:0.5", ...)"""
+    kind, *args = str(spec).split(":")
+    try:
+        if not args:
+            return max(0.0, float(kind))
+        values = [float(a) for a in args]
+    except ValueError:
+        raise ValueError(f"Bad latency spec: {spec}")
+    if kind == "fixed":
+        value = values[0]
+    elif kind == "uniform":
+        value = rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        value = rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        # median, sigma of the underlying normal
+        value = values[0] * math.exp(rng.gauss(0.0, values[1]))
+    elif kind == "exp":
+        value = rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    else:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    return max(0.0, value)
+
+
+def sample_count(spec: str, rng: random.Random) -> int:
+    """"40" or "20:80" (uniform) -> int"""
+    low, _, high = str(spec).partition(":")
+    return rng.randint(int(low), int(high)) if high else int(low)
+
+
+@dataclass
+class Profile:
+    """Simulated behaviour of one provider"""
+    latency: str = "lognormal:300:0.4"
+    tokens_per_sec: float = 50.0
+    chunk_tokens: int = 1
+    prompt_tokens_per_sec: float = 0.0
+    reply_tokens: str = "20:80"
+    error_rate: float = 0.0
+    errors: Dict[str, float] = field(default_factory=lambda: {"429": 0.4, "500": 0.3, "503": 0.3})
+    timeout_rate: float = 0.0
+    timeout: float = 120.0
+    load_ms: float = 0.0
+
+    def update(self, values: Dict[str, Any]) -> "Profile":
+        known = {f.name for f in fields(self)}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown profile fields: {', '.join(sorted(unknown))}")
+        for name, value in values.items():
+            setattr(self, name, value)
+        sample_ms(self.latency, random.Random(0))  # validate spec early
+        return self
+
+
+@dataclass
+class Plan:
+    """What one request will do"""
+    error: Optional[int]
+    hang: bool
+    ttft: float  # seconds
+    reply: List[str]  # chunks of chunk_tokens tokens
+    tokens: int
+    prompt_tokens: int
+    prompt_seconds: float
+    load_seconds: float
+
+
+class Standin:
+    """Profiles, randomness, counters and Ollama residency of a stand-in server"""
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.profiles: Dict[str, Profile] = {}
+        self.configure(profiles or {})
+        self.stats: Dict[str, Dict[str, int]] = {provider: self._empty_stats() for provider in PROVIDERS}
+        self._ollama_loaded: Dict[str, float] = {}  # model -> expires (monotonic)
+
+    def configure(self, profiles: Dict[str, Dict[str, Any]]):
+        """Apply {"default": {...}, "<provider>": {...}} (provider keys override default)"""
+        default = profiles.get("default", {})
+        for provider in PROVIDERS:
+            current = self.profiles.get(provider) or Profile()
+            self.profiles[provider] = current.update({**default, **profiles.get(provider, {})})
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {"requests": 0, "streams": 0, "errors": 0, "timeouts": 0, "prompt_tokens": 0, "reply_tokens": 0}
+
+    def plan(self, provider: str, prompt: str, max_tokens: Optional[int] = None, stream: bool = False) -> Plan:
+        profile = self.profiles[provider]
+        stats = self.stats[provider]
+        stats["requests"] += 1
+        stats["streams"] += int(stream)
+
+        error = None
+        hang = self.rng.random() < profile.timeout_rate
+        if not hang and self.rng.random() < profile.error_rate and profile.errors:
+            codes, weights = zip(*profile.errors.items())
+            error = int(self.rng.choices(codes, weights)[0])
+        if hang:
+            stats["timeouts"] += 1
+        if error is not None:
+            stats["errors"] += 1
+
+        tokens = sample_count(profile.reply_tokens, self.rng)
+        if max_tokens:
+            tokens = min(tokens, max_tokens)
+        words = [WORDS[(self.rng.randrange(len(WORDS)) + i) % len(WORDS)] for i in range(max(1, tokens))]
+        size = max(1, profile.chunk_tokens)
+        reply = [
+            ("" if i == 0 else " ") + " ".join(words[i:i + size])
+            for i in range(0, len(words), size)
+        ]
+        prompt_tokens = count_tokens(prompt)
+        if error is None and not hang:
+            stats["prompt_tokens"] += prompt_tokens
+            stats["reply_tokens"] += len(words)
+        return Plan(
+            error=error,
+            hang=hang,
+            ttft=sample_ms(profile.latency, self.rng) / 1000,
+            reply=reply,
+            tokens=len(words),
+            prompt_tokens=prompt_tokens,
+            prompt_seconds=prompt_tokens / profile.prompt_tokens_per_sec if profile.prompt_tokens_per_sec > 0 else 0.0,
+            load_seconds=0.0
+        )
+
+    def chunk_delay(self, provider: str) -> float:
+        profile = self.profiles[provider]
+        if profile.tokens_per_sec <= 0:
+            return 0.0
+        return max(1, profile.chunk_tokens) / profile.tokens_per_sec
+
+    def ollama_load(self, model: str, keep_alive: Any) -> float:
+        """Seconds to load `model` (0 if resident); keeps it for keep_alive"""
+        now = time.monotonic()
+        resident = self._ollama_loaded.get(model, 0.0) > now
+        seconds = _keep_alive_seconds(keep_alive)
+        if seconds == 0:
+            self._ollama_loaded.pop(model, None)
+        else:
+            self._ollama_loaded[model] = now + seconds
+        return 0.0 if resident else self.profiles["ollama"].load_ms / 1000
+
+    def ollama_resident(self) -> Dict[str, float]:
+        now = time.monotonic()
+        return {model: expires - now for model, expires in self._ollama_loaded.items() if expires > now}
+
+
+def _keep_alive_seconds(keep_alive: Any) -> float:
+    """Ollama keep_alive: seconds, "5m" / "1h" / "30s" strings, negative = forever"""
+    if keep_alive is None:
+        return 300.0
+    if isinstance(keep_alive, (int, float)):
+        return math.inf if keep_alive < 0 else float(keep_alive)
+    text = str(keep_alive).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    try:
+        if text[-1:] in units:
+            value = float(text[:-1]) * units[text[-1]]
+        else:
+            value = float(text)
+    except ValueError:
+        return 300.0
+    return math.inf if value < 0 else value
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ERRORS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+ERROR_TYPES = {429: "rate_limit_error", 500: "api_error", 503: "overloaded_error"}
+
+
+def error_response(provider: str, status: int) -> JSONResponse:
+    """Error in the provider's own body format (429 / 503 carry Retry-After)"""
+    message = f"stand-in injected error {status}"
+    if provider == "anthropic":
+        body = {"type": "error", "error": {"type": ERROR_TYPES.get(status, "api_error"), "message": message}}
+    elif provider == "gemini":
+        body = {"error": {"code": status, "message": message, "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"}}
+    elif provider == "ollama":
+        body = {"error": message}
+    else:
+        body = {"error": {"message": message, "type": ERROR_TYPES.get(status, "api_error"), "code": status}}
+    headers = {"retry-after": "1"} if status in (429, 503) else {}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def _delay(plan: Plan, hang_timeout: float) -> None:
+    """Wait until the first token (or hang for a timeout)"""
+    if plan.hang:
+        await asyncio.sleep(hang_timeout)
+    await asyncio.sleep(plan.load_seconds + plan.prompt_seconds + plan.ttft)
+
+
+def _sse(data: Any, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+def _messages_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# APPLICATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def create_app(standin: Optional[Standin] = None) -> FastAPI:
+    standin = standin or Standin()
+    app = FastAPI(title="ALFA provider stand-in")
+    app.state.standin = standin
+
+    async def paced(provider: str, plan: Plan) -> AsyncIterator[Tuple[int, str]]:
+        """(index, chunk) at the profile's token rate (after the first-token delay)"""
+        delay = standin.chunk_delay(provider)
+        for index, chunk in enumerate(plan.reply):
+            if index and delay:
+                await asyncio.sleep(delay)
+            yield index, chunk
+
+    async def finish(provider: str, plan: Plan) -> str:
+        """Whole reply after ttft + generation time (non-streaming calls)"""
+        await asyncio.sleep(standin.chunk_delay(provider) * max(0, len(plan.reply) - 1))
+        return "".join(plan.reply)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # OPENAI / DEEPSEEK
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def chat_completions(provider: str, body: Dict[str, Any]):
+        stream = bool(body.get("stream"))
+        plan = standin.plan(provider, _messages_text(body.get("messages")), body.get("max_tokens"), stream)
+        profile = standin.profiles[provider]
+        await _delay(plan, profile.timeout)
+        if plan.error:
+            return error_response(provider, plan.error)
+        model = body.get("model", "standin")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": plan.prompt_tokens,
+            "completion_tokens": plan.tokens,
+            "total_tokens": plan.prompt_tokens + plan.tokens
+        }
+
+        if not stream:
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": await finish(provider, plan)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        async def events():
+            base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+            async for index, chunk in paced(provider, plan):
+                delta = {"role": "assistant", "content": chunk} if index == 0 else {"content": chunk}
+                yield _sse({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            yield _sse({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        return await chat_completions("openai", await request.json())
+
+    @app.post("/deepseek/v1/chat/completions")
+    @app.post("/deepseek/chat/completions")
+    async def deepseek_chat(request: Request):
+        return await chat_completions("deepseek", await request.json())
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # ANTHROPIC
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @app.post("/anthropic/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await request.json()
+        stream = bool(body.get("stream"))
+        plan = standin.plan("anthropic", _messages_text(body.get("messages")), body.get("max_tokens"), stream)
+        await _delay(plan, standin.profiles["anthropic"].timeout)
+        if plan.error:
+            return error_response("anthropic", plan.error)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "standin"),
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": plan.prompt_tokens, "output_tokens": 0}
+        }
+
+        if not stream:
+            text = await finish("anthropic", plan)
+            return {
+                **message,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": plan.prompt_tokens, "output_tokens": plan.tokens}
+            }
+
+        async def events():
+            yield _sse({"type": "message_start", "message": {**message, "content": []}}, "message_start")
+            yield _sse(
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                "content_block_start"
+            )
+            async for _, chunk in paced("anthropic", plan):
+                yield _sse(
+                    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}},
+                    "content_block_delta"
+                )
+            yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            yield _sse({
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": plan.tokens}
+            }, "message_delta")
+            yield _sse({"type": "message_stop"}, "message_stop")
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # GEMINI
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @app.post("/gemini/v1beta/models/{target}")
+    async def gemini_generate(target: str, request: Request):
+        model, _, method = target.partition(":")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}"}}, status_code=404)
+        body = await request.json()
+        stream = method == "streamGenerateContent"
+        prompt = "\n".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        max_tokens = body.get("generationConfig", {}).get("maxOutputTokens")
+        plan = standin.plan("gemini", prompt, max_tokens, stream)
+        await _delay(plan, standin.profiles["gemini"].timeout)
+        if plan.error:
+            return error_response("gemini", plan.error)
+
+        def candidate(text: str, finish_reason: Optional[str]) -> Dict[str, Any]:
+            entry: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            if finish_reason:
+                entry["finishReason"] = finish_reason
+            return {
+                "candidates": [entry],
+                "usageMetadata": {
+                    "promptTokenCount": plan.prompt_tokens,
+                    "candidatesTokenCount": plan.tokens,
+                    "totalTokenCount": plan.prompt_tokens + plan.tokens
+                },
+                "modelVersion": model
+            }
+
+        if not stream:
+            return candidate(await finish("gemini", plan), "STOP")
+
+        async def events():
+            last = len(plan.reply) - 1
+            async for index, chunk in paced("gemini", plan):
+                yield _sse(candidate(chunk, "STOP" if index == last else None))
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # OLLAMA
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def ollama_reply(body: Dict[str, Any], generate: bool):
+        model = body.get("model", "standin")
+        stream = body.get("stream", True)
+        if generate:
+            context = list(body.get("context") or [])
+            prompt = body.get("prompt", "")
+            if not prompt and not context:
+                # Load-only request
+                load = standin.ollama_load(model, body.get("keep_alive"))
+                await asyncio.sleep(load)
+                return {"model": model, "response": "", "done": True, "done_reason": "load"}
+        else:
+            messages = body.get("messages") or []
+            if not messages:
+                load = standin.ollama_load(model, body.get("keep_alive"))
+                await asyncio.sleep(load)
+                return {
+                    "model": model,
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "done_reason": "load"
+                }
+            prompt = _messages_text(messages)
+        max_tokens = (body.get("options") or {}).get("num_predict")
+        plan = standin.plan("ollama", prompt, max_tokens, bool(stream))
+        if plan.error is None and not plan.hang:
+            plan.load_seconds = standin.ollama_load(model, body.get("keep_alive"))
+        await _delay(plan, standin.profiles["ollama"].timeout)
+        if plan.error:
+            return error_response("ollama", plan.error)
+
+        created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        eval_seconds = standin.chunk_delay("ollama") * len(plan.reply)
+
+        def chunk(text: str) -> Dict[str, Any]:
+            if generate:
+                return {"model": model, "created_at": created_at, "response": text, "done": False}
+            return {"model": model, "created_at": created_at, "message": {"role": "assistant", "content": text}, "done": False}
+
+        def final(text: str) -> Dict[str, Any]:
+            data = {
+                **chunk(text),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((plan.load_seconds + plan.prompt_seconds + plan.ttft + eval_seconds) * 1e9),
+                "load_duration": int(plan.load_seconds * 1e9),
+                "prompt_eval_count": plan.prompt_tokens,
+                "prompt_eval_duration": int(plan.prompt_seconds * 1e9),
+                "eval_count": plan.tokens,
+                "eval_duration": int(eval_seconds * 1e9)
+            }
+            if generate:
+                # Token ids are fake, only the length matters to clients
+                data["context"] = context + list(range(plan.prompt_tokens + plan.tokens))
+            return data
+
+        if not stream:
+            return final(await finish("ollama", plan))
+
+        async def lines():
+            async for _, text in paced("ollama", plan):
+                yield json.dumps(chunk(text)) + "\n"
+            yield json.dumps(final("")) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/ollama/api/chat")
+    async def ollama_chat(request: Request):
+        return await ollama_reply(await request.json(), generate=False)
+
+    @app.post("/ollama/api/generate")
+    async def ollama_generate(request: Request):
+        return await ollama_reply(await request.json(), generate=True)
+
+    @app.get("/ollama/api/ps")
+    async def ollama_ps():
+        now = time.time()
+        return {"models": [
+            {
+                "name": f"{model}:latest" if ":" not in model else model,
+                "model": model,
+                "size_vram": 4 * 1024 ** 3,
+                "expires_at": time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(now + min(remaining, 10 * 365 * 86400))
+                )
+            }
+            for model, remaining in standin.ollama_resident().items()
+        ]}
+
+    @app.get("/ollama/api/tags")
+    async def ollama_tags():
+        return {"models": [{"name": f"{m}:latest", "model": f"{m}:latest"} for m in ("llama3", "mistral", "codellama", "deepseek-r1")]}
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # CONTROL
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @app.get("/standin/config")
+    async def get_config():
+        return {provider: asdict(profile) for provider, profile in standin.profiles.items()}
+
+    @app.put("/standin/config")
+    async def put_config(request: Request):
+        try:
+            standin.configure(await request.json())
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return await get_config()
+
+    @app.get("/standin/stats")
+    async def get_stats():
+        return standin.stats
+
+    @app.post("/standin/stats/reset")
+    async def reset_stats():
+        standin.stats = {provider: standin._empty_stats() for provider in PROVIDERS}
+        return standin.stats
+
+    return app
+
+
+def start_standin(
+    host: str = "127.0.0.1",
+    port: int = 8799,
+    profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+    seed: Optional[int] = None
+) -> uvicorn.Server:
+    """Run a stand-in in a background thread (for benchmarks); stop with server.should_exit = True"""
+    app = create_app(Standin(profiles, seed))
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the ALFA AI providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--config", help="JSON file: {\"default\": {...}, \"openai\": {...}, ...}")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible latencies / errors")
+    parser.add_argument("--latency", help="default latency spec, e.g. lognormal:300:0.4")
+    parser.add_argument("--tokens-per-sec", type=float, help="default token rate")
+    parser.add_argument("--error-rate", type=float, help="default injected error rate")
+    args = parser.parse_args()
+
+    profiles: Dict[str, Dict[str, Any]] = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            profiles = json.load(f)
+    overrides = {
+        "latency": args.latency,
+        "tokens_per_sec": args.tokens_per_sec,
+        "error_rate": args.error_rate
+    }
+    profiles.setdefault("default", {}).update({k: v for k, v in overrides.items() if v is not None})
+
+    print(f"ALFA stand-in on http://{args.host}:{args.port}")
+    print(f"  ALFA_STANDIN_URL=http://{args.host}:{args.port} python alfa_app.py")
+    uvicorn.run(create_app(Standin(profiles, args.seed)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - SHARED STATE BACKEND
+═══════════════════════════════════════════════════════════════════════════════
+
+Wymienny magazyn stanu aplikacji (ustawienia użytkowników, sesje logowania,
+historia rozmów, cache odpowiedzi):
+- "sqlite": pliki SQLite w trybie WAL - współdzielone przez procesy
+  `uvicorn --workers N`; pamięć podręczna w procesach jest rewalidowana
+- "memory": wszystko w pamięci procesu - testy i pojedynczy worker
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from alfa_cache import SQLiteResponseStore, MemoryResponseStore
+from alfa_sessions import SessionStore, MemorySessionStore, AuthSessionStore, MemoryAuthSessionStore
+from alfa_conversations import ConversationStore, MemoryConversationStore
+
+
+@dataclass
+class StateBackend:
+    """Stores used by AIFederation; `shared` = visible to other processes"""
+    sessions: Any
+    auth_sessions: Any
+    conversations: Any
+    responses: Any
+    shared: bool
+
+    def close(self):
+        for store in (self.sessions, self.auth_sessions, self.conversations, self.responses):
+            store.close()
+
+
+def sqlite_state(
+    sessions_path: Path,
+    auth_sessions_path: Path,
+    conversations_path: Path,
+    responses_path: Path,
+    legacy_sessions_dir: Path = None
+) -> StateBackend:
+    """SQLite (WAL) stores - safe for several worker processes"""
+    return StateBackend(
+        sessions=SessionStore(sessions_path, legacy_dir=legacy_sessions_dir),
+        auth_sessions=AuthSessionStore(auth_sessions_path),
+        conversations=ConversationStore(conversations_path),
+        responses=SQLiteResponseStore(responses_path),
+        shared=True
+    )
+
+
+def memory_state() -> StateBackend:
+    """In-process stores - one worker only, lost on restart"""
+    return StateBackend(
+        sessions=MemorySessionStore(),
+        auth_sessions=MemoryAuthSessionStore(),
+        conversations=MemoryConversationStore(),
+        responses=MemoryResponseStore(),
+        shared=False
+    )
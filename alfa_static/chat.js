@@ -0,0 +1,89 @@
+const sessionId = document.body.dataset.session;
+const chatContainer = document.getElementById('chat');
+const messageInput = document.getElementById('message');
+const modelSelect = document.getElementById('model');
+let conversationId = null;
+
+messageInput.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') sendMessage();
+});
+
+async function sendMessage() {
+    const message = messageInput.value.trim();
+    if (!message) return;
+
+    // Add user message
+    addMessage(message, 'user');
+    messageInput.value = '';
+
+    // Typing indicator, replaced by tokens as they arrive
+    const bubble = addMessage('⏳ Myślę...', 'ai');
+    let text = '';
+
+    try {
+        const response = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Session-ID': sessionId
+            },
+            body: JSON.stringify({
+                message: message,
+                model: modelSelect.value,
+                conversation_id: conversationId
+            })
+        });
+        if (!response.ok) throw new Error('HTTP ' + response.status);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event.type === 'delta') {
+                    text += event.data.text;
+                    bubble.textContent = text;
+                } else if (event.type === 'error') {
+                    bubble.textContent = '❌ ' + event.data.error + (event.data.setup_url ? '\n\n🔗 ' + event.data.setup_url : '');
+                } else if (event.type === 'done') {
+                    conversationId = event.data.conversation_id;
+                    const meta = document.createElement('div');
+                    meta.className = 'message-meta';
+                    meta.textContent = event.data.model + ' · TTFT ' + event.data.ttft_ms + ' ms · ' + event.data.total_ms + ' ms';
+                    bubble.appendChild(meta);
+                }
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            }
+        }
+    } catch (e) {
+        bubble.textContent = '❌ Błąd połączenia: ' + e.message;
+    }
+}
+
+function parseEvent(raw) {
+    const event = { type: 'message', data: {} };
+    for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event.type = line.slice(6).trim();
+        else if (line.startsWith('data:')) event.data = JSON.parse(line.slice(5));
+    }
+    return event;
+}
+
+function addMessage(text, type) {
+    const div = document.createElement('div');
+    div.className = 'message ' + (type === 'user' ? 'user-message' : 'ai-message');
+    div.textContent = text;
+    chatContainer.appendChild(div);
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+    return div;
+}
+
@@ -0,0 +1,23 @@
+const sessionId = document.body.dataset.session;
+
+async function saveKey(provider) {
+    const key = document.getElementById(provider + '_key').value;
+    if (!key) return alert('Wpisz klucz API');
+
+    const response = await fetch('/api/settings/key', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Session-ID': sessionId
+        },
+        body: JSON.stringify({ provider, api_key: key })
+    });
+
+    if (response.ok) {
+        alert('✅ Klucz zapisany!');
+        location.reload();
+    } else {
+        alert('❌ Błąd zapisu');
+    }
+}
+
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+                         ALFA - WEB UI ASSETS
+═══════════════════════════════════════════════════════════════════════════════
+
+Serwowanie interfejsu WWW bez składania HTML przy każdym żądaniu:
+- szablony Jinja2 kompilowane raz przy starcie (bez sprawdzania mtime),
+  stałe fragmenty (np. lista modeli) renderowane tylko raz
+- statyczne CSS/JS ładowane do pamięci, wstępnie skompresowane (gzip,
+  brotli jeśli zainstalowany), z ETag i adresami wersjonowanymi hashem
+  (/static/chat.css?v=<etag>) => Cache-Control: immutable
+- strony bez danych użytkownika renderowane raz i rewalidowane przez ETag
+
+Autor: Karen86Tonoyan
+Licencja: Apache 2.0
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def accepted_encoding(request: Request) -> Optional[str]:
+    """Best supported Content-Encoding from Accept-Encoding ("br", "gzip" or None)"""
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, quality = part.partition(";")
+        quality = quality.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                pass
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str], best: bool = False) -> bytes:
+    """best=True for one-off precompression, fast levels for per-request bodies"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else 4)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else 5)
+    return body
+
+
+def make_etag(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already has this ETag"""
+    header = request.headers.get("if-none-match", "")
+    return f'"{etag}"' in header or header.strip() == "*"
+
+
+@dataclass
+class Asset:
+    """Static file kept in memory in every encoding we serve"""
+    media_type: str
+    etag: str
+    encoded: Dict[Optional[str], bytes]
+
+
+class PrecompressedResponse(Response):
+    """Response picking the precompressed variant the client accepts"""
+
+    def __init__(
+        self,
+        request: Request,
+        encoded: Dict[Optional[str], bytes],
+        media_type: str,
+        etag: Optional[str] = None,
+        cache_control: str = "no-cache"
+    ):
+        encoding = accepted_encoding(request)
+        if encoding not in encoded:
+            encoding = None
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if etag is not None:
+            headers["ETag"] = f'"{etag}"'
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        super().__init__(encoded[encoding], media_type=media_type, headers=headers)
+
+
+def encode_all(body: bytes) -> Dict[Optional[str], bytes]:
+    """Identity + every supported compressed variant of body"""
+    encoded: Dict[Optional[str], bytes] = {None: body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoded["gzip"] = compress(body, "gzip", best=True)
+        if brotli is not None:
+            encoded["br"] = compress(body, "br", best=True)
+    return encoded
+
+
+class StaticAssets:
+    """In-memory, precompressed static files with content-hashed URLs"""
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    def __init__(self, directory: Path, url_prefix: str = "/static"):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self._assets: Dict[str, Asset] = {}
+        self.load()
+
+    def load(self):
+        """(Re)load every file of the directory"""
+        assets = {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            body = path.read_bytes()
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type.endswith("javascript"):
+                media_type += "; charset=utf-8"
+            name = path.relative_to(self.directory).as_posix()
+            assets[name] = Asset(media_type, make_etag(body), encode_all(body))
+        self._assets = assets
+
+    def url(self, name: str) -> str:
+        """Versioned URL - changes whenever the file content changes"""
+        return f"{self.url_prefix}/{name}?v={self._assets[name].etag}"
+
+    def response(self, request: Request, name: str) -> Response:
+        asset = self._assets.get(name)
+        if asset is None:
+            return Response(status_code=404)
+        # Versioned URLs never change content; plain ones must revalidate
+        cache_control = self.IMMUTABLE if request.query_params.get("v") == asset.etag else "no-cache"
+        if not_modified(request, asset.etag):
+            return Response(
+                status_code=304,
+                headers={"ETag": f'"{asset.etag}"', "Cache-Control": cache_control}
+            )
+        return PrecompressedResponse(request, asset.encoded, asset.media_type, asset.etag, cache_control)
+
+
+class PageRenderer:
+    """Jinja2 templates compiled once at startup"""
+
+    def __init__(self, directory: Path, assets: StaticAssets, constants: Optional[Dict[str, Any]] = None):
+        self.env = Environment(
+            loader=FileSystemLoader(str(directory)),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=False,
+            cache_size=-1
+        )
+        self.env.globals.update(constants or {})
+        self.env.globals["static_url"] = assets.url
+        self.env.globals["fragment"] = self.fragment
+        self._fragments: Dict[str, Markup] = {}
+        self._static_pages: Dict[str, Asset] = {}
+        for name in self.env.list_templates():
+            self.env.get_template(name)
+
+    def fragment(self, name: str) -> Markup:
+        """Template rendered once from constants only ({{ fragment("x.html") }})"""
+        html = self._fragments.get(name)
+        if html is None:
+            html = Markup(self.env.get_template(name).render())
+            self._fragments[name] = html
+        return html
+
+    def render(self, name: str, **context: Any) -> str:
+        return self.env.get_template(name).render(**context)
+
+    def page(self, request: Request, name: str, **context: Any) -> Response:
+        """Per-user page: rendered per request, compressed, never cached"""
+        body = self.render(name, **context).encode("utf-8")
+        encoding = accepted_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else None
+        encoded = {encoding: compress(body, encoding)}
+        return PrecompressedResponse(
+            request, encoded, "text/html; charset=utf-8", cache_control="private, no-store"
+        )
+
+    def static_page(self, request: Request, name: str, **context: Any) -> Response:
+        """Page without per-user data: rendered and compressed once, ETag revalidation"""
+        page = self._static_pages.get(name)
+        if page is None:
+            body = self.render(name, **context).encode("utf-8")
+            page = Asset("text/html; charset=utf-8", make_etag(body), encode_all(body))
+            self._static_pages[name] = page
+        if not_modified(request, page.etag):
+            return Response(status_code=304, headers={"ETag": f'"{page.etag}"', "Cache-Control": "no-cache"})
+        return PrecompressedResponse(request, page.encoded, page.media_type, page.etag)
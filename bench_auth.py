@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+ALFA - auth path micro-benchmark
+
+Koszt uwierzytelnienia jednego żądania API:
+- before: auth_manager.verify_session() + auth_manager.get_session()
+- after:  VerifiedSessionCache.get() (jedno trafienie w słownik)
+- miss:   VerifiedSessionCache.get() przy pustym cache (pierwsze żądanie sesji)
+
+Stand-in auth managera robi to samo co typowy menedżer sesji:
+wyszukanie w słowniku + sprawdzenie daty wygaśnięcia.
+
+Użycie:
+    python bench_auth.py --iterations 200000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from alfa_sessions import VerifiedSessionCache
+
+SESSION = "bench-session"
+
+
+class StandInAuthManager:
+    """Dict of sessions with ISO expiry timestamps"""
+
+    def __init__(self):
+        expires = (datetime.now() + timedelta(hours=1)).isoformat()
+        self.sessions = {SESSION: {"user": {"email": "bench@localhost", "name": "Bench"}, "expires_at": expires}}
+
+    def verify_session(self, session_id: str) -> bool:
+        session = self.sessions.get(session_id)
+        return session is not None and datetime.fromisoformat(session["expires_at"]) > datetime.now()
+
+    def get_session(self, session_id: str):
+        session = self.sessions.get(session_id)
+        if session is None or datetime.fromisoformat(session["expires_at"]) <= datetime.now():
+            return None
+        return session
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - started) / iterations
+
+
+def main(iterations: int) -> None:
+    manager = StandInAuthManager()
+    cache = VerifiedSessionCache(manager, ttl=60)
+
+    def old_path():
+        if not manager.verify_session(SESSION):
+            raise RuntimeError("invalid session")
+        return manager.get_session(SESSION)
+
+    def cold_path():
+        cache.invalidate(SESSION)
+        return cache.get(SESSION)
+
+    results = {
+        "before (verify + get)": per_call_ns(old_path, iterations),
+        "after (cache hit)": per_call_ns(lambda: cache.get(SESSION), iterations),
+        "after (cache miss)": per_call_ns(cold_path, iterations)
+    }
+
+    print(f"\n{'auth path':28} {'ns / request':>14}")
+    for label, ns in results.items():
+        print(f"{label:28} {ns:14.0f}")
+    print(f"\nSpeed-up on cached sessions: "
+          f"{results['before (verify + get)'] / results['after (cache hit)']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cached session verification")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+ALFA - Bridge memory sharding benchmark
+
+Mierzy przepustowość magazynu pamięci alfa_bridge przy rosnącej liczbie
+równoczesnych użytkowników, dla jednej bazy i dla N shardów
+(memory.open_bridge_memory). Każdy użytkownik wykonuje tury tak jak
+bridge_query bez cache: load_history + zapis pary user/assistant.
+
+- processes: każdy użytkownik w osobnym procesie (kilka workerów bridge
+  na tych samych plikach) - jedna baza = jeden zamek zapisu SQLite
+- threads:   użytkownicy jako wątki jednego procesu - jedna baza = jedna
+  blokada AlfaBridgeMemory._lock
+
+Skalowanie widać dopiero przy liczbie rdzeni >= liczby użytkowników.
+
+Użycie:
+    python bench_bridge_memory.py --mode processes --users 1,2,4,8,16 --shards 1,8
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from memory import open_bridge_memory
+
+USER_MESSAGE = "Explain what a hash map is in two sentences. " * 4
+REPLY = "A hash map stores key/value pairs in buckets chosen by a hash of the key. " * 6
+
+
+def user_turns(path: str, shards: int, user: int, turns: int) -> None:
+    """One simulated user: `turns` bridge turns against the store"""
+    store = open_bridge_memory(path, shards)
+    user_id = f"bench-user-{user}@localhost"
+    try:
+        for _ in range(turns):
+            store.load_history(user_id)
+            store.append_many([
+                (user_id, None, "user", USER_MESSAGE),
+                (user_id, None, "assistant", REPLY)
+            ])
+    finally:
+        store.close()
+
+
+def _process_user(args: tuple) -> None:
+    user_turns(*args)
+
+
+def run(mode: str, path: str, shards: int, users: int, turns: int) -> float:
+    """Turns per second for `users` concurrent users"""
+    open_bridge_memory(path, shards).close()   # create schema outside the timing
+    jobs = [(path, shards, user, turns) for user in range(users)]
+
+    if mode == "processes":
+        with multiprocessing.Pool(users) as pool:
+            started = time.perf_counter()
+            pool.map(_process_user, jobs)
+            elapsed = time.perf_counter() - started
+    else:
+        threads = [threading.Thread(target=user_turns, args=job) for job in jobs]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    return users * turns / elapsed
+
+
+def main(mode: str, users_list: list, shards_list: list, turns: int) -> None:
+    print(f"mode: {mode}, {turns} turns per user, CPUs: {multiprocessing.cpu_count()}")
+    print(f"\n{'users':>5} " + " ".join(f"{f'{s} shard(s)':>12}" for s in shards_list))
+    with tempfile.TemporaryDirectory() as tmp:
+        for users in users_list:
+            row = []
+            for shards in shards_list:
+                path = str(Path(tmp) / f"bridge_{shards}_{users}.db")
+                row.append(run(mode, path, shards, users, turns))
+            print(f"{users:5d} " + " ".join(f"{rate:9.0f}/s " for rate in row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bridge memory throughput with and without sharding")
+    parser.add_argument("--mode", choices=["processes", "threads"], default="processes")
+    parser.add_argument("--users", default="1,2,4,8,16", help="comma separated concurrent user counts")
+    parser.add_argument("--shards", default="1,8", help="comma separated shard counts")
+    parser.add_argument("--turns", type=int, default=500, help="turns per user")
+    args = parser.parse_args()
+    main(
+        args.mode,
+        [int(n) for n in args.users.split(",")],
+        [int(n) for n in args.shards.split(",")],
+        args.turns
+    )
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+ALFA - HTTP pool benchmark
+
+Mierzy narzut per-request dla wywołań providerów HTTP (DeepSeek / Ollama):
+- before: nowy httpx.AsyncClient na każdą wiadomość (stary _call_deepseek)
+- after:  jeden długo żyjący klient z pulą keep-alive (AIFederation._http_client)
+
+Serwer docelowy to lokalny stand-in (alfa_standin.py) bez opóźnień, więc wynik
+pokazuje sam narzut połączenia (bez TLS - w produkcji zysk jest większy).
+
+Użycie:
+    python bench_http_pool.py --requests 500 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from alfa_standin import start_standin, standin_base_urls
+
+STANDIN_HOST = "127.0.0.1"
+STANDIN_PORT = 8799
+# No simulated latency: only connection overhead is measured
+STANDIN_PROFILES = {"default": {"latency": "0", "tokens_per_sec": 0, "reply_tokens": "1"}}
+
+PAYLOAD = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "ping"}]}
+
+
+async def call_fresh_client(base_url: str) -> None:
+    """Old behaviour: new client (and TCP connection) per request"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{base_url}/v1/chat/completions", json=PAYLOAD)
+        response.json()["choices"][0]["message"]["content"]
+
+
+async def run(label: str, call, total: int, concurrency: int) -> dict:
+    """Run `total` calls with bounded concurrency, collect per-request latency"""
+    latencies: list = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "label": label,
+        "requests": total,
+        "rps": total / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000
+    }
+
+
+async def main(total: int, concurrency: int) -> None:
+    base_url = standin_base_urls(f"http://{STANDIN_HOST}:{STANDIN_PORT}")["deepseek"]
+
+    # Warm-up
+    await call_fresh_client(base_url)
+
+    before = await run("before (client per request)", lambda: call_fresh_client(base_url),
+                       total, concurrency)
+
+    from alfa_app import AIFederation, AI_PROVIDERS, UserSession
+    AI_PROVIDERS["deepseek"]["base_url"] = base_url
+
+    federation = AIFederation()
+    await federation.startup()
+    session = UserSession("bench@localhost")
+    session.api_keys["deepseek"] = "bench"
+    try:
+        after = await run(
+            "after (pooled keep-alive)",
+            lambda: federation._call_deepseek("deepseek-chat", PAYLOAD["messages"], session, {}),
+            total, concurrency
+        )
+    finally:
+        await federation.shutdown()
+
+    print(f"\n{'mode':32} {'req/s':>10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for result in (before, after):
+        print(f"{result['label']:32} {result['rps']:10.1f} {result['mean_ms']:10.2f} "
+              f"{result['p50_ms']:10.2f} {result['p99_ms']:10.2f}")
+    print(f"\nPer-request overhead saved: {before['mean_ms'] - after['mean_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-request HTTP clients")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_standin(STANDIN_HOST, STANDIN_PORT, STANDIN_PROFILES)
+    try:
+        asyncio.run(main(args.requests, args.concurrency))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+ALFA - Ollama context reuse benchmark
+
+Porównuje czas przetwarzania promptu (prompt eval) w rozmowach wieloturowych:
+- before: cała historia wysyłana co turę do /api/chat (Ollama przelicza
+          cały prompt od nowa)
+- after:  kontynuacja `context` poprzedniej tury przez /api/generate -
+          wysyłana jest tylko nowa wiadomość (AIFederation._ollama_request)
+
+Liczby pochodzą z odpowiedzi Ollamy (prompt_eval_count / prompt_eval_duration),
+więc potrzebny jest działający serwer Ollama z pobranym modelem.
+
+Użycie:
+    OLLAMA_HOST=http://localhost:11434 python bench_ollama_context.py --model llama3 --turns 20
+"""
+
+import argparse
+import asyncio
+import time
+
+import alfa_app
+from alfa_state import memory_state
+
+USER = "bench@localhost"
+PROMPTS = [
+    "Explain in two sentences what a hash map is.",
+    "How does it handle collisions?",
+    "Compare that with open addressing.",
+    "Which one is more cache friendly and why?",
+    "Give a short Python example of the better one.",
+]
+
+
+def prompt_stats(federation: alfa_app.AIFederation, model: str) -> tuple:
+    """(prompt tokens, prompt eval ms) accumulated for model so far"""
+    for row in federation.ollama.models():
+        if row["model"] == model:
+            return row["prompt_tokens"], row["prompt_eval_ms"]
+    return 0, 0.0
+
+
+async def conversation(model: str, turns: int, reuse: bool, max_tokens: int) -> list:
+    """Run one conversation, per-turn prompt tokens / prompt eval ms / wall ms"""
+    alfa_app.OLLAMA_CONTEXT_REUSE = reuse
+    federation = alfa_app.AIFederation(state=memory_state())
+    await federation.startup()
+    rows = []
+    conversation_id = None
+    try:
+        for turn in range(turns):
+            before_tokens, before_ms = prompt_stats(federation, model)
+            started = time.perf_counter()
+            result = await federation.chat(
+                USER,
+                PROMPTS[turn % len(PROMPTS)],
+                model=f"ollama-{model}",
+                conversation_id=conversation_id,
+                params={"temperature": 0, "max_tokens": max_tokens}
+            )
+            if not result.get("success"):
+                raise SystemExit(f"Turn {turn + 1} failed: {result.get('error')}")
+            wall_ms = (time.perf_counter() - started) * 1000
+            conversation_id = result["conversation_id"]
+            tokens, eval_ms = prompt_stats(federation, model)
+            rows.append((tokens - before_tokens, eval_ms - before_ms, wall_ms))
+    finally:
+        await federation.shutdown()
+    return rows
+
+
+async def main(model: str, turns: int, max_tokens: int) -> None:
+    before = await conversation(model, turns, reuse=False, max_tokens=max_tokens)
+    after = await conversation(model, turns, reuse=True, max_tokens=max_tokens)
+
+    print(f"\n{'turn':>4} {'full tok':>9} {'full ms':>9} {'ctx tok':>9} {'ctx ms':>9}")
+    for turn, (full, reused) in enumerate(zip(before, after), 1):
+        print(f"{turn:4d} {full[0]:9d} {full[1]:9.1f} {reused[0]:9d} {reused[1]:9.1f}")
+
+    for label, rows in (("before (full history)", before), ("after (context reuse)", after)):
+        tokens = sum(r[0] for r in rows)
+        eval_ms = sum(r[1] for r in rows)
+        wall_ms = sum(r[2] for r in rows)
+        print(f"\n{label}: prompt tokens {tokens}, prompt eval {eval_ms:.0f} ms, wall {wall_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Ollama prompt eval with and without context reuse")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=128, help="reply length cap per turn")
+    args = parser.parse_args()
+    asyncio.run(main(args.model, args.turns, args.max_tokens))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+ALFA - web UI benchmark
+
+Porównuje stronę czatu:
+- before: cały HTML z wklejonym CSS/JS składany f-stringiem przy każdym
+          żądaniu, bez kompresji i bez cache przeglądarki (stary chat_page)
+- after:  prekompilowany szablon + statyczne CSS/JS (gzip/brotli, ETag,
+          Cache-Control: immutable) - alfa_web.py
+
+Mierzy czas odpowiedzi (in-process, ASGI, ten sam stos middleware), bajty
+przesłane przy pierwszej i kolejnej wizycie oraz szacowany czas dostarczenia
+strony przy danej przepustowości łącza.
+
+Użycie:
+    python bench_web_ui.py --requests 2000
+"""
+
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+import httpx
+from fastapi.responses import HTMLResponse
+
+import alfa_app
+
+SESSION = "bench-session"
+ENCODING = {"accept-encoding": "br, gzip"}
+
+alfa_app.auth_manager.verify_session = lambda session: True
+alfa_app.auth_manager.get_session = lambda session: {"user": {"email": "bench@localhost", "name": "Bench"}}
+
+LEGACY_CSS = (alfa_app.WEB_STATIC_DIR / "chat.css").read_text()
+LEGACY_JS = (alfa_app.WEB_STATIC_DIR / "chat.js").read_text()
+
+
+async def legacy_chat_page(session: str):
+    """Old behaviour: inline assets, whole document formatted per request"""
+    css, js = LEGACY_CSS, LEGACY_JS
+    options = "".join(
+        f'<optgroup label="{group}">'
+        + "".join(f'<option value="{value}">{label}</option>' for value, label in models)
+        + "</optgroup>"
+        for group, models in alfa_app.CHAT_MODEL_GROUPS
+    )
+    return HTMLResponse(f"""
+    <!DOCTYPE html>
+    <html>
+    <head><title>ALFA Chat</title><style>{css}</style></head>
+    <body data-session="{session}">
+        <div class="header"><div class="logo">🤖 ALFA</div>
+        <select class="model-select" id="model">{options}</select><span>👤 Bench</span></div>
+        <div class="chat-container" id="chat"><div class="message ai-message">Cześć Bench!</div></div>
+        <div class="input-container"><input type="text" id="message"><button>Wyślij</button></div>
+        <script>{js}</script>
+    </body>
+    </html>
+    """)
+
+
+# Same app and middleware stack as the new page, only the rendering differs
+alfa_app.app.add_api_route("/bench/legacy-chat", legacy_chat_page, methods=["GET"])
+
+
+def wire_bytes(response: httpx.Response) -> int:
+    """Bytes of the (possibly compressed) body as sent"""
+    return int(response.headers.get("content-length", len(response.content)))
+
+
+async def timed(client: httpx.AsyncClient, path: str, total: int) -> dict:
+    latencies = []
+    for _ in range(total):
+        started = time.perf_counter()
+        response = await client.get(f"{path}?session={SESSION}", headers=ENCODING)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000
+    }
+
+
+async def main(total: int, mbps: float) -> None:
+    transport = httpx.ASGITransport(app=alfa_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        before = await timed(client, "/bench/legacy-chat", total)
+        after = await timed(client, "/chat", total)
+
+        old_page = await client.get(f"/bench/legacy-chat?session={SESSION}", headers=ENCODING)
+        before["first_visit_bytes"] = before["repeat_visit_bytes"] = wire_bytes(old_page)
+
+        page = await client.get(f"/chat?session={SESSION}", headers=ENCODING)
+        assets = [
+            await client.get(url, headers=ENCODING)
+            for url in re.findall(r'(?:href|src)="(/static/[^"]+)"', page.text)
+        ]
+        after["first_visit_bytes"] = wire_bytes(page) + sum(wire_bytes(a) for a in assets)
+        # Assets are immutable (versioned URLs) - the browser does not ask again
+        after["repeat_visit_bytes"] = wire_bytes(page)
+
+    # Server time + transfer of the repeat-visit bytes on a link of `mbps`
+    for result in (before, after):
+        result["delivered_ms"] = result["mean_ms"] + result["repeat_visit_bytes"] * 8 / (mbps * 1000)
+
+    print(f"\n{'mode':10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'1st visit B':>12} {'repeat B':>10} "
+          f"{f'@{mbps:g}Mbit ms':>12}")
+    for label, result in (("before", before), ("after", after)):
+        print(f"{label:10} {result['mean_ms']:10.3f} {result['p50_ms']:10.3f} {result['p99_ms']:10.3f} "
+              f"{result['first_visit_bytes']:12d} {result['repeat_visit_bytes']:10d} {result['delivered_ms']:12.2f}")
+    print(f"\nBytes per repeat visit: {before['repeat_visit_bytes']} -> {after['repeat_visit_bytes']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inline vs templated/static web UI")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mbps", type=float, default=10.0, help="link speed for the delivery estimate")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.mbps))
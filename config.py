@@ -39,17 +39,24 @@ for d in [CONFIG_DIR, LOGS_DIR, DATA_DIR]:
 # OLLAMA (LOCAL AI)
 # =============================================================================
 
-OLLAMA_BASE_URL = "http://127.0.0.1:11434"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
 OLLAMA_DEFAULT_MODEL = "deepseek-r1:7b"
 
 # =============================================================================
 # DEEPSEEK API (EXTERNAL AI)
 # =============================================================================
 
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.environ.get("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 DEEPSEEK_MODEL = "deepseek-chat"
 
+# Testy offline: ALFA_STANDIN_URL kieruje Ollamę i DeepSeek na lokalny
+# stand-in (alfa_standin.py)
+STANDIN_URL = os.environ.get("ALFA_STANDIN_URL", "").rstrip("/")
+if STANDIN_URL:
+    OLLAMA_BASE_URL = f"{STANDIN_URL}/ollama"
+    DEEPSEEK_API_URL = f"{STANDIN_URL}/deepseek/v1/chat/completions"
+
 # =============================================================================
 # MODEL PROFILES (AMUNICJA)
 # =============================================================================
@@ -142,6 +149,32 @@ CERBER_LOG_PATH = LOGS_DIR / "cerber.log"
 DB_PATH = DATA_DIR / "alfa_memory.db"
 DB_ENCRYPTION_KEY = os.environ.get("ALFA_DB_KEY", "")
 
+# =============================================================================
+# ALFA BRIDGE (alfa_bridge.py)
+# =============================================================================
+
+BRIDGE_MEMORY_FILE = os.environ.get("ALFA_BRIDGE_MEMORY", "bridge_memory.json")
+ALFA_SERVICE_TOKEN = os.environ.get("ALFA_SERVICE_TOKEN", "")
+# >1: baza dzielona po user_id (istniejąca bridge_memory.db jest przenoszona
+# do shardów przy pierwszym starcie); zysk dopiero przy wielu rdzeniach
+BRIDGE_MEMORY_SHARDS = int(os.environ.get("ALFA_BRIDGE_MEMORY_SHARDS", "1"))  # 1 = jedna baza
+BRIDGE_FLUSH_INTERVAL = float(os.environ.get("ALFA_BRIDGE_FLUSH_INTERVAL", "1.0"))  # s
+BRIDGE_FLUSH_BATCH = int(os.environ.get("ALFA_BRIDGE_FLUSH_BATCH", "200"))
+BRIDGE_MAX_SESSIONS = int(os.environ.get("ALFA_BRIDGE_MAX_SESSIONS", "10000"))
+
+# Streszczanie starszych wiadomości w tle (profil z MODELS, np. "fast"; "" = wyłączone)
+BRIDGE_SUMMARY_PROFILE = os.environ.get("ALFA_BRIDGE_SUMMARY_PROFILE", "")
+BRIDGE_SUMMARY_KEEP = int(os.environ.get("ALFA_BRIDGE_SUMMARY_KEEP", "10"))  # ostatnie wiadomości bez streszczania
+BRIDGE_SUMMARY_MIN = int(os.environ.get("ALFA_BRIDGE_SUMMARY_MIN", "10"))  # min. nowych wiadomości na przebieg
+BRIDGE_SUMMARY_INTERVAL = float(os.environ.get("ALFA_BRIDGE_SUMMARY_INTERVAL", "5.0"))  # s
+
+# Semantyczne przypominanie dawnych wiadomości (model embeddingów Ollamy,
+# np. "nomic-embed-text"; "" = wyłączone)
+BRIDGE_RECALL_MODEL = os.environ.get("ALFA_BRIDGE_RECALL_MODEL", "")
+BRIDGE_RECALL_TOP_K = int(os.environ.get("ALFA_BRIDGE_RECALL_TOP_K", "4"))
+BRIDGE_RECALL_TOKENS = int(os.environ.get("ALFA_BRIDGE_RECALL_TOKENS", "800"))  # budżet w prompcie
+BRIDGE_RECALL_PROJECTION_DIM = int(os.environ.get("ALFA_BRIDGE_RECALL_PROJECTION_DIM", "64"))  # wymiar rzutu indeksu
+
 # =============================================================================
 # MODES
 # =============================================================================
@@ -183,3 +216,23 @@ def get_ollama_url(endpoint: str = "/api/chat") -> str:
 # =============================================================================
 
 CHAT_MODEL = OLLAMA_DEFAULT_MODEL
+
+
+class Config:
+    """Settings namespace used by alfa_bridge.py / deepseek_client.py"""
+    DEEPSEEK_API_KEY = DEEPSEEK_API_KEY
+    DEEPSEEK_API_URL = DEEPSEEK_API_URL
+    MEMORY_FILE = BRIDGE_MEMORY_FILE
+    MEMORY_SHARDS = BRIDGE_MEMORY_SHARDS
+    MEMORY_FLUSH_INTERVAL = BRIDGE_FLUSH_INTERVAL
+    MEMORY_FLUSH_BATCH = BRIDGE_FLUSH_BATCH
+    MEMORY_MAX_SESSIONS = BRIDGE_MAX_SESSIONS
+    SUMMARY_PROFILE = BRIDGE_SUMMARY_PROFILE
+    SUMMARY_KEEP = BRIDGE_SUMMARY_KEEP
+    SUMMARY_MIN = BRIDGE_SUMMARY_MIN
+    SUMMARY_INTERVAL = BRIDGE_SUMMARY_INTERVAL
+    RECALL_MODEL = BRIDGE_RECALL_MODEL
+    RECALL_TOP_K = BRIDGE_RECALL_TOP_K
+    RECALL_TOKENS = BRIDGE_RECALL_TOKENS
+    RECALL_PROJECTION_DIM = BRIDGE_RECALL_PROJECTION_DIM
+    ALFA_SERVICE_TOKEN = ALFA_SERVICE_TOKEN
@@ -1,56 +1,82 @@
 import httpx
-from config import Config
+from config import Config, get_model_config
+from token_budget import pack_messages
 
 class DeepSeekClient:
-    def __init__(self):
+    def __init__(self, profile='deepseek', reply_tokens=2000):
         self.api_key = Config.DEEPSEEK_API_KEY
         if not self.api_key:
             raise ValueError('? DEEPSEEK_API_KEY is required!')
+        # Budzet kontekstu z profilu (config.MODELS), czesc zarezerwowana na odpowiedz
+        model_config = get_model_config(profile)
+        self.model = model_config['name']
+        self.reply_tokens = reply_tokens
+        self.prompt_budget = model_config['max_tokens'] - reply_tokens
+        self._client = None
 
-    async def call_deepseek(self, message, history):
-        messages = []
+    def _http_client(self):
+        """Long-lived pooled client (created on first use, closed at shutdown)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=30.0)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def call_deepseek(self, message, history, summary=None, recalled=None):
+        system = []
         
         # System prompt
-        messages.append({
+        system.append({
             'role': 'system',
             'content': 'Jestes pomocnym asystentem AI. Odpowiadaj zwiezle i na temat.'
         })
         
-        # Historia
-        recent_history = history[-10:] if len(history) > 10 else history
-        messages.extend(recent_history)
+        # Streszczenie starszej czesci rozmowy (summarizer.py)
+        if summary:
+            system.append({
+                'role': 'system',
+                'content': f'Streszczenie wczesniejszej rozmowy: {summary}'
+            })
         
-        # Aktualna wiadomosc
-        messages.append({
-            'role': 'user',
-            'content': message
-        })
+        # Powiazane dawne wiadomosci (recall.py)
+        if recalled:
+            fragments = '\n'.join(f"- {m['role']}: {m['content']}" for m in recalled)
+            system.append({
+                'role': 'system',
+                'content': f'Powiazane fragmenty wczesniejszych rozmow:\n{fragments}'
+            })
+        
+        # Historia od najnowszej, ile zmiesci sie w budzecie + aktualna wiadomosc
+        messages, prompt_tokens, dropped = pack_messages(system, history, message, self.prompt_budget)
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    'https://api.deepseek.com/v1/chat/completions',
-                    headers={
-                        'Authorization': f'Bearer {self.api_key}',
-                        'Content-Type': 'application/json'
-                    },
-                    json={
-                        'model': 'deepseek-chat',
-                        'messages': messages,
-                        'temperature': 0.7,
-                        'max_tokens': 2000
-                    },
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                reply = data['choices'][0]['message']['content']
-                
-                return {
-                    'reply': reply,
-                    'model': data.get('model', 'deepseek-chat')
+            response = await self._http_client().post(
+                Config.DEEPSEEK_API_URL,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                },
+                json={
+                    'model': self.model,
+                    'messages': messages,
+                    'temperature': 0.7,
+                    'max_tokens': self.reply_tokens
                 }
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            reply = data['choices'][0]['message']['content']
+            
+            return {
+                'reply': reply,
+                'model': data.get('model', self.model),
+                'prompt_tokens': prompt_tokens,
+                'history_dropped': dropped
+            }
                 
         except Exception as e:
             return {'reply': f'? Blad DeepSeek: {str(e)}', 'error': True}
@@ -1,45 +1,674 @@
+"""
+Pamięć rozmów ALFA Bridge.
+
+Wpisy trzymane w SQLite (WAL) jako log tylko do dopisywania:
+- append_entry = jeden INSERT (koszt nie rośnie z liczbą użytkowników)
+- load_history = odczyt ostatnich wpisów po indeksie (user_id, session, id)
+- stary plik bridge_memory.json importowany automatycznie przy pierwszym
+  otwarciu (albo ręcznie: python memory.py migrate <json> [<db>])
+- ShardedBridgeMemory: N baz wybieranych po hashu user_id, każda z własną
+  blokadą - niezwiązani użytkownicy nie czekają na siebie; istniejąca
+  niedzielona baza jest przenoszona do shardów przy pierwszym otwarciu
+- BridgeHistoryCache: historia w pamięci procesu, para user/assistant
+  dopisywana atomowo, zapis do bazy w tle (write-behind, osobno per shard)
+- liczba tokenów wpisu liczona raz przy dopisaniu i trzymana obok niego
+  (token_budget.py)
+"""
+
 import json
-import os
-from pathlib import Path
+import zlib
+import sqlite3
+import asyncio
+import logging
+import argparse
 import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+
+from token_budget import MESSAGE_OVERHEAD, count_tokens, message_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = 'default'
+HISTORY_LENGTH = 20
+
 
 class AlfaBridgeMemory:
-    def __init__(self, file_path='bridge_memory.json'):
-        self.file_path = Path(file_path)
+    """
+    Per-(user, session) chat history.
+
+    `file_path` may still name the old JSON file: the database is then kept
+    next to it (bridge_memory.json -> bridge_memory.db) and the JSON content
+    is imported once. load_history returns the last `max_length` entries,
+    like the old file that was cut to that length on every append.
+    """
+
+    def __init__(self, file_path='bridge_memory.json', max_length=HISTORY_LENGTH):
+        path = Path(file_path)
+        self.legacy_path = path if path.suffix == '.json' else None
+        self.db_path = path.with_suffix('.db') if self.legacy_path else path
+        self.max_length = max_length
         self._lock = threading.Lock()
-        if not self.file_path.exists():
-            self._save_data({})
 
-    def _load_data(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' user_id TEXT NOT NULL, session_key TEXT NOT NULL,'
+            ' role TEXT NOT NULL, content TEXT NOT NULL, created_at TEXT NOT NULL,'
+            ' tokens INTEGER)'
+        )
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(entries)')}
+        if 'tokens' not in columns:
+            # Databases created before token counts were cached
+            self._db.execute('ALTER TABLE entries ADD COLUMN tokens INTEGER')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS entries_by_session ON entries (user_id, session_key, id)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_by_user ON entries (user_id, id)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS summaries ('
+            ' user_id TEXT NOT NULL, session_key TEXT NOT NULL, summary TEXT NOT NULL,'
+            ' through_id INTEGER NOT NULL, updated_at TEXT NOT NULL,'
+            ' PRIMARY KEY (user_id, session_key))'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            ' entry_id INTEGER NOT NULL, model TEXT NOT NULL, user_id TEXT NOT NULL, vector BLOB NOT NULL,'
+            ' PRIMARY KEY (entry_id, model))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS embeddings_by_user ON embeddings (user_id, model, entry_id)')
+        self._db.commit()
+
+        if self.legacy_path is not None and self.legacy_path.exists():
+            self.migrate_json(self.legacy_path)
+
+    def shard_for(self, user_id):
+        """The database holding `user_id` (this one; see ShardedBridgeMemory)"""
+        return self
+
+    def load_history(self, user_id, session_id=None, max_length=None, max_tokens=None):
+        """
+        Newest messages of the session, oldest first, with entry ids and cached token counts:
+        the last `max_length` (default: the store's; no limit with `max_tokens`)
+        and, with `max_tokens`, only as many as fit in that many prompt tokens.
+        """
+        if max_length is None:
+            max_length = self.max_length if max_tokens is None else -1
+        rows = []
+        missing = []
+        used = 0
+        with self._lock:
+            cursor = self._db.execute(
+                'SELECT id, role, content, tokens FROM entries WHERE user_id = ? AND session_key = ?'
+                ' ORDER BY id DESC LIMIT ?',
+                (user_id, session_id or DEFAULT_SESSION, max_length)
+            )
+            for entry_id, role, content, tokens in cursor:
+                if tokens is None:
+                    # Row from a database older than the tokens column
+                    tokens = count_tokens(content)
+                    missing.append((tokens, entry_id))
+                if max_tokens is not None and used + tokens + MESSAGE_OVERHEAD > max_tokens:
+                    break
+                rows.append((entry_id, role, content, tokens))
+                used += tokens + MESSAGE_OVERHEAD
+            if missing:
+                with self._db:
+                    self._db.executemany('UPDATE entries SET tokens = ? WHERE id = ?', missing)
+        return [
+            {'id': entry_id, 'role': role, 'content': content, 'tokens': tokens}
+            for entry_id, role, content, tokens in reversed(rows)
+        ]
+
+    def append_entry(self, user_id, role, content, session_id=None, max_length=None):
+        """
+        Append one message (a single INSERT; older entries stay in the log).
+        `max_length` is accepted for compatibility with the JSON store, which
+        cut the session on append; pass it to load_history instead - it never
+        changes the store's default for other users.
+        """
+        self.append_many([(user_id, session_id, role, content)])
+
+    def append_many(self, entries):
+        """
+        Append (user_id, session_id, role, content[, tokens]) tuples in one
+        transaction: after a crash either all of them are in the log or none is.
+        Token counts not given are computed here, once per entry. Returns
+        the ids of the new entries, in order.
+        """
+        rows = _entry_rows(entries)
+        if not rows:
+            return []
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'INSERT INTO entries (user_id, session_key, role, content, tokens, created_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                # One write transaction: the ids are consecutive
+                (last_id,) = self._db.execute('SELECT last_insert_rowid()').fetchone()
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    def load_summary(self, user_id, session_id=None):
+        """(rolling summary, id of the last summarized entry); ('', 0) if none yet"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT summary, through_id FROM summaries WHERE user_id = ? AND session_key = ?',
+                (user_id, session_id or DEFAULT_SESSION)
+            ).fetchone()
+        return tuple(row) if row else ('', 0)
+
+    def save_summary(self, user_id, session_id, summary, through_id):
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO summaries (user_id, session_key, summary, through_id, updated_at)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    (user_id, session_id or DEFAULT_SESSION, summary, through_id, datetime.now().isoformat())
+                )
+
+    def unsummarized(self, user_id, session_id=None, keep=HISTORY_LENGTH, after_id=0, limit=200):
+        """
+        (id, role, content) of entries newer than `after_id` but older than the
+        last `keep` messages of the session, oldest first, at most `limit`.
+        """
+        session_key = session_id or DEFAULT_SESSION
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, role, content FROM entries WHERE user_id = ? AND session_key = ?'
+                ' AND id > ? AND id < ('
+                '  SELECT id FROM entries WHERE user_id = ? AND session_key = ?'
+                '  ORDER BY id DESC LIMIT 1 OFFSET ?)'
+                ' ORDER BY id LIMIT ?',
+                (user_id, session_key, after_id, user_id, session_key, max(keep - 1, 0), limit)
+            ).fetchall()
+        return rows
+
+    def unembedded(self, user_id, model, after_id=0, limit=64):
+        """(id, content) of the user's entries after `after_id` without a `model` embedding"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT e.id, e.content FROM entries e'
+                ' LEFT JOIN embeddings v ON v.entry_id = e.id AND v.model = ?'
+                ' WHERE e.user_id = ? AND e.id > ? AND v.entry_id IS NULL'
+                ' ORDER BY e.id LIMIT ?',
+                (model, user_id, after_id, limit)
+            ).fetchall()
+
+    def save_embeddings(self, user_id, model, vectors):
+        """Store (entry_id, vector bytes) pairs computed by `model`"""
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO embeddings (entry_id, model, user_id, vector) VALUES (?, ?, ?, ?)',
+                    [(entry_id, model, user_id, vector) for entry_id, vector in vectors]
+                )
+
+    def load_embeddings(self, user_id, model):
+        """(entry_id, vector bytes) of all the user's embedded entries, oldest first"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT entry_id, vector FROM embeddings WHERE user_id = ? AND model = ? ORDER BY entry_id',
+                (user_id, model)
+            ).fetchall()
+
+    def load_embedded_entries(self, user_id, model, entry_ids):
+        """(id, role, content, tokens, vector bytes) of the given entries"""
+        if not entry_ids:
+            return []
+        marks = ','.join('?' * len(entry_ids))
+        with self._lock:
+            return self._db.execute(
+                'SELECT e.id, e.role, e.content, e.tokens, v.vector FROM entries e'
+                ' JOIN embeddings v ON v.entry_id = e.id AND v.model = ?'
+                f' WHERE e.user_id = ? AND e.id IN ({marks})',
+                (model, user_id, *entry_ids)
+            ).fetchall()
+
+    def migrate_json(self, json_path, force=False):
+        """
+        Import an old bridge_memory.json ({user: {session: [messages]}}).
+        Each file is imported once unless `force`; returns the number of
+        imported messages.
+        """
+        marker = _migration_marker(json_path)
+        if not force and self.is_migrated(marker):
+            return 0
+        return self.import_entries(read_legacy_json(json_path), marker, force)
+
+    def is_migrated(self, marker):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM meta WHERE key = ?', (marker,)).fetchone() is not None
+
+    def migration_markers(self):
+        """Sources already imported into this database"""
+        with self._lock:
+            return [key for (key,) in self._db.execute("SELECT key FROM meta WHERE key LIKE 'migrated:%'")]
+
+    def export_entries(self):
+        """(user_id, session_key, role, content, tokens) of the whole log, oldest first"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT user_id, session_key, role, content, tokens FROM entries ORDER BY id'
+            ).fetchall()
+
+    def import_entries(self, entries, marker, force=False, inherited=()):
+        """
+        Append entries and record `marker` (plus the `inherited` markers of
+        the source) in one transaction; skipped if `marker` is already recorded.
+        """
+        rows = _entry_rows(entries)
+        with self._lock:
+            with self._db:
+                if not force and self._db.execute('SELECT 1 FROM meta WHERE key = ?', (marker,)).fetchone():
+                    return 0
+                self._db.executemany(
+                    'INSERT INTO entries (user_id, session_key, role, content, tokens, created_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                now = datetime.now().isoformat()
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    [(key, now) for key in (marker, *inherited)]
+                )
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ShardedBridgeMemory:
+    """
+    AlfaBridgeMemory split into `shards` databases by a hash of user_id
+    (bridge_memory.db -> bridge_memory.0.db ... bridge_memory.N-1.db).
+
+    Every shard has its own file and lock, so requests of users in different
+    shards never wait for each other (threads in one process, or several
+    bridge processes sharing the files). All entries of a user live in one
+    shard. Same API as AlfaBridgeMemory.
+
+    An unsharded database of the same name (bridge_memory.db, used before
+    sharding was enabled) is moved into the shards on first open, together
+    with its record of imported JSON files. Its summaries and embeddings are
+    not carried over - they are rebuilt in the background.
+    """
+
+    def __init__(self, file_path='bridge_memory.json', shards=8, max_length=HISTORY_LENGTH):
+        path = Path(file_path)
+        self.legacy_path = path if path.suffix == '.json' else None
+        self.unsharded_path = path.with_suffix('.db')
+        base = path.with_suffix('')
+        self.shards = [
+            AlfaBridgeMemory(base.with_name(f'{base.name}.{index}.db'), max_length)
+            for index in range(shards)
+        ]
+
+        if self.unsharded_path.exists():
+            self.migrate_db(self.unsharded_path)
+        if self.legacy_path is not None and self.legacy_path.exists():
+            self.migrate_json(self.legacy_path)
+
+    @property
+    def max_length(self):
+        return self.shards[0].max_length
+
+    @max_length.setter
+    def max_length(self, value):
+        for shard in self.shards:
+            shard.max_length = value
+
+    @property
+    def db_paths(self):
+        return [shard.db_path for shard in self.shards]
+
+    def shard_for(self, user_id):
+        """Stable across processes and restarts (unlike hash())"""
+        return self.shards[zlib.crc32(user_id.encode('utf-8')) % len(self.shards)]
+
+    def load_history(self, user_id, session_id=None, max_length=None, max_tokens=None):
+        return self.shard_for(user_id).load_history(user_id, session_id, max_length, max_tokens)
+
+    def append_entry(self, user_id, role, content, session_id=None, max_length=None):
+        self.shard_for(user_id).append_entry(user_id, role, content, session_id, max_length)
+
+    def append_many(self, entries):
+        """One transaction per shard; entries of one user are always written together"""
+        positions = {}
+        for index, entry in enumerate(entries):
+            positions.setdefault(self.shard_for(entry[0]), []).append(index)
+        ids = [None] * len(entries)
+        for shard, indexes in positions.items():
+            for index, entry_id in zip(indexes, shard.append_many([entries[i] for i in indexes])):
+                ids[index] = entry_id
+        return ids
+
+    def load_summary(self, user_id, session_id=None):
+        return self.shard_for(user_id).load_summary(user_id, session_id)
+
+    def save_summary(self, user_id, session_id, summary, through_id):
+        self.shard_for(user_id).save_summary(user_id, session_id, summary, through_id)
+
+    def unsummarized(self, user_id, session_id=None, keep=HISTORY_LENGTH, after_id=0, limit=200):
+        return self.shard_for(user_id).unsummarized(user_id, session_id, keep, after_id, limit)
+
+    def unembedded(self, user_id, model, after_id=0, limit=64):
+        return self.shard_for(user_id).unembedded(user_id, model, after_id, limit)
+
+    def save_embeddings(self, user_id, model, vectors):
+        self.shard_for(user_id).save_embeddings(user_id, model, vectors)
+
+    def load_embeddings(self, user_id, model):
+        return self.shard_for(user_id).load_embeddings(user_id, model)
+
+    def load_embedded_entries(self, user_id, model, entry_ids):
+        return self.shard_for(user_id).load_embedded_entries(user_id, model, entry_ids)
+
+    def migrate_json(self, json_path, force=False):
+        """Import an old bridge_memory.json, each shard in its own idempotent transaction"""
+        marker = _migration_marker(json_path)
+        if not force and all(shard.is_migrated(marker) for shard in self.shards):
+            return 0
+        groups = self._group(read_legacy_json(json_path))
+        return sum(shard.import_entries(groups.get(shard, []), marker, force) for shard in self.shards)
+
+    def migrate_db(self, db_path):
+        """Move the log of an unsharded database into the shards (once); returns the number of entries"""
+        marker = _migration_marker(db_path)
+        if all(shard.is_migrated(marker) for shard in self.shards):
+            return 0
+        source = AlfaBridgeMemory(db_path)
+        try:
+            entries, inherited = source.export_entries(), source.migration_markers()
+        finally:
+            source.close()
+        groups = self._group(entries)
+        count = sum(shard.import_entries(groups.get(shard, []), marker, inherited=inherited) for shard in self.shards)
+        logger.info(f'Bridge memory: moved {count} entries from {db_path} into {len(self.shards)} shards')
+        return count
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def _group(self, entries):
+        groups = {}
+        for entry in entries:
+            groups.setdefault(self.shard_for(entry[0]), []).append(entry)
+        return groups
+
+
+def open_bridge_memory(file_path='bridge_memory.json', shards=1, max_length=HISTORY_LENGTH):
+    """AlfaBridgeMemory for one shard, ShardedBridgeMemory for more"""
+    if shards > 1:
+        return ShardedBridgeMemory(file_path, shards, max_length)
+    return AlfaBridgeMemory(file_path, max_length)
+
+
+def read_legacy_json(json_path):
+    """(user_id, session_id, role, content) of every message in an old bridge_memory.json"""
+    try:
+        data = json.loads(Path(json_path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return []
+    if not isinstance(data, dict):
+        return []
+    return [
+        (user_id, session_key, entry.get('role', 'user'), entry.get('content', ''))
+        for user_id, sessions in data.items() if isinstance(sessions, dict)
+        for session_key, entries in sessions.items() if isinstance(entries, list)
+        for entry in entries if isinstance(entry, dict)
+    ]
+
+
+def _entry_rows(entries):
+    """INSERT rows for (user_id, session_id, role, content[, tokens]) tuples"""
+    now = datetime.now().isoformat()
+    rows = []
+    for entry in entries:
+        user_id, session_id, role, content = entry[:4]
+        tokens = entry[4] if len(entry) > 4 and entry[4] is not None else count_tokens(content)
+        rows.append((user_id, session_id or DEFAULT_SESSION, role, content, tokens, now))
+    return rows
+
+
+def _migration_marker(json_path):
+    return f'migrated:{Path(json_path).resolve()}'
+
+
+class SessionHistory:
+    """Newest messages of one session: at most `max_length` entries and `max_tokens` prompt tokens"""
+
+    def __init__(self, entries=(), max_length=None, max_tokens=None):
+        self.entries = deque(maxlen=max_length)
+        self.max_tokens = max_tokens
+        self.tokens = 0
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        if len(self.entries) == self.entries.maxlen:
+            self.tokens -= message_tokens(self.entries[0])
+        self.entries.append(entry)
+        self.tokens += message_tokens(entry)
+        while self.max_tokens is not None and self.tokens > self.max_tokens and len(self.entries) > 1:
+            self.tokens -= message_tokens(self.entries.popleft())
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class BridgeHistoryCache:
+    """
+    Per-(user, session) history served from process memory, write-behind
+    to an AlfaBridgeMemory. With `max_tokens` a session keeps as many of
+    its newest messages as fit in that many prompt tokens (e.g. the model's
+    prompt budget), otherwise the store's `max_length` messages.
+
+    A session missing from memory is read from the store in a worker thread
+    (concurrent misses of one session share the read), so a cold user does
+    not stall the event loop while a flush is committing. `append_pair`
+    then adds the user message and the reply in one step (no await in
+    between), so concurrent turns of the same user cannot overwrite each
+    other. New entries are written in the background every `flush_interval`
+    seconds or as soon as `flush_batch` entries are pending. A flush writes
+    every shard of the store in its own thread and transaction, in parallel;
+    a shard whose write fails keeps its entries for the next flush.
+    """
+
+    def __init__(self, store, max_tokens=None, max_sessions=10000, flush_interval=1.0, flush_batch=200):
+        self.store = store
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._histories = OrderedDict()
+        self._loading = {}  # (user, session) -> task reading a missed session
+        self._dirty = []
+        self._flushing = {}  # shard -> entries being written
+        # Per shard, held while a flush commits and while a miss reads it, so
+        # a reader sees each entry either in the shard or in _flushing, never both
+        self._write_locks = {}
+        self._wake = None
+        self._task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    async def load_history(self, user_id, session_id=None):
+        """Newest messages of the session (within the token / length limit), oldest first"""
+        return list(await self._history(user_id, session_id))
+
+    async def append_pair(self, user_id, message, reply, session_id=None):
+        """Append user message + assistant reply atomically, return the updated history"""
+        history = await self._history(user_id, session_id)
+        entries = []
+        for role, content in (('user', message), ('assistant', reply)):
+            # The cached message gets its entry id once the flush commits it
+            cached = {'id': None, 'role': role, 'content': content, 'tokens': count_tokens(content)}
+            history.append(cached)
+            entries.append((user_id, session_id, role, content, cached['tokens'], cached))
+        self._dirty.extend(entries)
+        if self._wake is not None and len(self._dirty) >= self.flush_batch:
+            self._wake.set()
+        return list(history)
+
+    async def start(self):
+        """Start background flush loop"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop background loop and flush pending writes"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """Write all pending entries, one transaction per shard, shards in parallel"""
+        if not self._dirty:
+            return
+        for entry in self._dirty:
+            shard = self.store.shard_for(entry[0])
+            self._write_lock(shard)
+            self._flushing.setdefault(shard, []).append(entry)
+        self._dirty = []
+        writes = asyncio.gather(
+            *(asyncio.to_thread(self._write, shard) for shard in list(self._flushing)),
+            return_exceptions=True
+        )
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-
-    def _save_data(self, data):
-        with self._lock:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-
-    def load_history(self, user_id, session_id=None):
-        data = self._load_data()
-        session_key = session_id or 'default'
-        user_data = data.get(user_id, {})
-        return user_data.get(session_key, [])
-
-    def append_entry(self, user_id, role, content, session_id=None, max_length=20):
-        data = self._load_data()
-        session_key = session_id or 'default'
-        
-        if user_id not in data:
-            data[user_id] = {}
-        if session_key not in data[user_id]:
-            data[user_id][session_key] = []
-        
-        data[user_id][session_key].append({'role': role, 'content': content})
-        
-        if len(data[user_id][session_key]) > max_length:
-            data[user_id][session_key] = data[user_id][session_key][-max_length:]
-        
-        self._save_data(data)
+            try:
+                results = await asyncio.shield(writes)
+            except asyncio.CancelledError:
+                # stop() during a flush: let running commits finish first,
+                # or their entries would be queued (and written) again
+                await writes
+                raise
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                logger.error(f'Bridge history flush failed for {len(errors)} shard(s): {errors[0]}')
+            else:
+                self.flushes += 1
+        finally:
+            # Keep failed writes in front of newer ones
+            failed = [entry for entries in self._flushing.values() for entry in entries]
+            self._dirty = failed + self._dirty
+            self._flushing = {}
+
+    def stats(self):
+        return {
+            'resident': len(self._histories),
+            'max_sessions': self.max_sessions,
+            'pending': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'flushes': self.flushes
+        }
+
+    async def _history(self, user_id, session_id):
+        key = (user_id, session_id or DEFAULT_SESSION)
+        history = self._histories.get(key)
+        if history is not None:
+            self._histories.move_to_end(key)
+            self.hits += 1
+            return history
+
+        loading = self._loading.get(key)
+        if loading is None:
+            self.misses += 1
+            loading = self._loading[key] = asyncio.create_task(self._load(key, user_id, session_id))
+        # A cancelled caller does not cancel the read other callers wait for
+        return await asyncio.shield(loading)
+
+    async def _load(self, key, user_id, session_id):
+        """Read a missed session from its shard and keep it in memory"""
+        try:
+            shard = self.store.shard_for(user_id)
+            lock = self._write_lock(shard)
+            # Entries of an evicted session that may not be in the store yet
+            pending = [
+                entry[5] for entry in self._flushing.get(shard, []) + self._dirty
+                if (entry[0], entry[1] or DEFAULT_SESSION) == key
+            ]
+            entries, pending = await asyncio.to_thread(self._read, shard, lock, user_id, session_id, pending)
+            history = SessionHistory(
+                entries,
+                max_length=self.store.max_length if self.max_tokens is None else None,
+                max_tokens=self.max_tokens
+            )
+            for cached in pending:
+                history.append(cached)
+            self._histories[key] = history
+            while len(self._histories) > self.max_sessions:
+                self._histories.popitem(last=False)
+            return history
+        finally:
+            del self._loading[key]
+
+    def _read(self, shard, lock, user_id, session_id, pending):
+        """Stored entries + pending ones not committed yet (worker thread)"""
+        with lock:
+            entries = shard.load_history(user_id, session_id, max_tokens=self.max_tokens)
+            # A commit sets the ids under this lock: entries without one are not in the store
+            return entries, [cached for cached in pending if cached['id'] is None]
+
+    def _write_lock(self, shard):
+        """Lock of a shard (created on the event loop, before any write to it)"""
+        lock = self._write_locks.get(shard)
+        if lock is None:
+            lock = self._write_locks[shard] = threading.Lock()
+        return lock
+
+    def _write(self, shard):
+        """Commit the shard's entries and forget them in one step (worker thread)"""
+        with self._write_lock(shard):
+            entries = self._flushing[shard]
+            for entry, entry_id in zip(entries, shard.append_many(entries)):
+                entry[5]['id'] = entry_id
+            del self._flushing[shard]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ALFA Bridge memory tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help='import an old bridge_memory.json into SQLite')
+    migrate.add_argument('json_path')
+    migrate.add_argument('db_path', nargs='?', help='default: <json_path> with .db suffix')
+    migrate.add_argument('--shards', type=int, default=1, help='split into N databases by user_id')
+    migrate.add_argument('--force', action='store_true', help='import again even if already imported')
+    args = parser.parse_args()
+
+    db_path = args.db_path or str(Path(args.json_path).with_suffix('.db'))
+    store = open_bridge_memory(db_path, args.shards)
+    count = store.migrate_json(args.json_path, force=args.force)
+    store.close()
+    print(f'Imported {count} messages from {args.json_path} into {db_path}')
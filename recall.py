@@ -0,0 +1,351 @@
+"""
+Semantyczne przypominanie dla ALFA Bridge.
+
+Każda zapisana wiadomość dostaje embedding z Ollamy (/api/embed), liczony
+raz i trzymany w bazie obok wpisu. Indeks per użytkownik (NumPy, cosinus)
+jest uzupełniany w tle o nowe wpisy; do promptu trafiają najtrafniejsze
+dawne wiadomości w ramach budżetu tokenów.
+
+Wyszukiwanie: wektory rzutowane losowo do `projection_dim` wymiarów
+(Johnson-Lindenstrauss) - jedno mnożenie macierz-wektor po indeksie,
+potem dokładny cosinus dla `candidates` najlepszych na pełnych wektorach.
+Rzut do 64 wymiarów (ALFA_BRIDGE_RECALL_PROJECTION_DIM): ~1.8 ms na
+wyszukiwanie przy 100k wpisów x 768 (bench_recall.py).
+
+Włączane przez ALFA_BRIDGE_RECALL_MODEL; przy starcie sprawdzane jest, czy
+Ollama ma ten model - jeśli nie, przypominanie się wyłącza.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import httpx
+
+import config
+from alfa_ollama import ollama_has_model
+from token_budget import count_tokens
+
+try:
+    import numpy as np
+except ImportError:  # optional: semantic recall disabled
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_projections = {}
+
+
+def recall_available():
+    return np is not None
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _projection(dim, projection_dim):
+    """Fixed random projection dim -> projection_dim (None if not smaller)"""
+    if dim <= projection_dim:
+        return None
+    key = (dim, projection_dim)
+    if key not in _projections:
+        rng = np.random.default_rng(dim)
+        _projections[key] = (rng.standard_normal((dim, projection_dim)) / np.sqrt(projection_dim)).astype(np.float32)
+    return _projections[key]
+
+
+class OllamaEmbedder:
+    """embed(texts) -> list of vectors from Ollama /api/embed"""
+
+    def __init__(self, model='nomic-embed-text', timeout=30.0):
+        self.model = model
+        self.timeout = timeout
+        self._client = None
+
+    async def available(self):
+        """Model is pulled in Ollama"""
+        return await ollama_has_model(self._http(), self.model, config.get_ollama_url('/api/tags'))
+
+    async def __call__(self, texts):
+        response = await self._http().post(
+            config.get_ollama_url('/api/embed'),
+            json={'model': self.model, 'input': list(texts)}
+        )
+        response.raise_for_status()
+        return response.json()['embeddings']
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+
+class VectorIndex:
+    """Entry ids + normalized (projected) float32 vectors, grown in place"""
+
+    def __init__(self, dim, projection_dim=64):
+        self.dim = dim
+        self.projection = _projection(dim, projection_dim)
+        width = dim if self.projection is None else projection_dim
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, width), dtype=np.float32)
+        self.size = 0
+        self.last_id = 0
+
+    def add(self, ids, vectors):
+        """Append vectors (n, dim) of entries `ids` (ascending)"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.projection is not None:
+            vectors = vectors @ self.projection
+        vectors = _normalize(vectors)
+
+        needed = self.size + len(vectors)
+        if needed > len(self.matrix):
+            capacity = max(needed, 2 * len(self.matrix), 1024)
+            matrix = np.empty((capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            entry_ids = np.empty(capacity, dtype=np.int64)
+            entry_ids[:self.size] = self.ids[:self.size]
+            self.matrix, self.ids = matrix, entry_ids
+
+        self.matrix[self.size:needed] = vectors
+        self.ids[self.size:needed] = ids
+        self.size = needed
+        if len(ids):
+            self.last_id = max(self.last_id, int(ids[-1]))
+
+    def search(self, query, k):
+        """Ids of the (approximately) k most similar entries, best first"""
+        if self.size == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if self.projection is not None:
+            query = query @ self.projection
+        scores = self.matrix[:self.size] @ _normalize(query)
+        k = min(k, self.size)
+        top = np.argpartition(scores, self.size - k)[self.size - k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return self.ids[top].tolist()
+
+
+class SemanticRecall:
+    """
+    Per-user semantic search over stored bridge messages.
+
+    `mark(user_id)` after a turn queues the user; every `interval` seconds
+    the background loop embeds entries that have no `model` embedding yet
+    (in batches of `batch`), saves them and appends them to the user's
+    in-memory index - existing vectors are never recomputed. Indexes of at
+    most `max_users` users stay resident (LRU).
+
+    `recall()` runs on the request path: one embedding of the query, one
+    index search, exact rerank of the candidates. When Ollama is down it
+    returns [] and stops trying for `retry_after` seconds.
+
+    `start()` first asks `embed.available()` (when it has one); if the
+    model is missing, recall stays off: `mark()` is a no-op and `recall()`
+    returns [].
+    """
+
+    def __init__(
+        self,
+        store,
+        embed,
+        model,
+        top_k=4,
+        budget_tokens=800,
+        min_score=0.3,
+        candidates=50,
+        projection_dim=64,
+        batch=64,
+        interval=1.0,
+        max_users=1000,
+        retry_after=30.0
+    ):
+        self.store = store
+        self.embed = embed
+        self.model = model
+        self.top_k = top_k
+        self.budget_tokens = budget_tokens
+        self.min_score = min_score
+        self.candidates = candidates
+        self.projection_dim = projection_dim
+        self.batch = batch
+        self.interval = interval
+        self.max_users = max_users
+        self.retry_after = retry_after
+
+        self._indexes = OrderedDict()
+        self._marked = set()
+        self._task = None
+        self._paused_until = 0.0
+        self.active = True
+
+        self.embedded = 0
+        self.searches = 0
+        self.errors = 0
+        self.last_search_ms = 0.0
+
+    def mark(self, user_id):
+        """User got new messages - index them on the next run"""
+        if self.active:
+            self._marked.add(user_id)
+
+    async def recall(self, user_id, query, exclude=(), budget_tokens=None):
+        """Most relevant past messages of the user within the token budget, oldest first"""
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        index = self._indexes.get(user_id)
+        if index is None or index.size == 0 or budget <= 0:
+            self.mark(user_id)
+            return []
+        if time.monotonic() < self._paused_until:
+            return []
+        self._indexes.move_to_end(user_id)
+
+        try:
+            query_vector = np.asarray((await self.embed([query]))[0], dtype=np.float32)
+        except Exception as e:
+            self.errors += 1
+            self._paused_until = time.monotonic() + self.retry_after
+            logger.warning(f'Bridge recall embedding failed: {e}')
+            return []
+        if query_vector.shape != (index.dim,):
+            return []
+
+        started = time.perf_counter()
+        candidates = index.search(query_vector, self.candidates)
+        self.last_search_ms = (time.perf_counter() - started) * 1000
+        self.searches += 1
+
+        rows = await asyncio.to_thread(self.store.load_embedded_entries, user_id, self.model, candidates)
+        query_vector = _normalize(query_vector)
+        scored = sorted(
+            (
+                (float(_normalize(np.frombuffer(vector, dtype=np.float32)) @ query_vector), entry_id, role, content, tokens)
+                for entry_id, role, content, tokens, vector in rows
+            ),
+            reverse=True
+        )
+
+        excluded = set(exclude)
+        picked = []
+        used = 0
+        for score, entry_id, role, content, tokens in scored:
+            if score < self.min_score or len(picked) >= self.top_k:
+                break
+            cost = count_tokens(content) if tokens is None else tokens
+            if content in excluded or used + cost > budget:
+                continue
+            picked.append((entry_id, role, content))
+            used += cost
+        return [{'role': role, 'content': content} for _, role, content in sorted(picked)]
+
+    async def start(self):
+        """Start background indexing loop (if the embedding model is available)"""
+        if self._task is not None:
+            return
+        available = getattr(self.embed, 'available', None)
+        if available is not None and not await available():
+            self.active = False
+            self._marked.clear()
+            logger.warning(f'Bridge recall disabled: embedding model {self.model} is not available')
+            return
+        self.active = True
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        close = getattr(self.embed, 'close', None)
+        if close is not None:
+            await close()
+
+    async def run_once(self):
+        """Index new entries of all marked users"""
+        if time.monotonic() < self._paused_until:
+            return
+        marked, self._marked = self._marked, set()
+        for user_id in marked:
+            try:
+                await self._update(user_id)
+            except Exception as e:
+                self.errors += 1
+                self._marked.add(user_id)
+                self._paused_until = time.monotonic() + self.retry_after
+                logger.warning(f'Bridge recall indexing failed for {user_id}: {e}')
+                break
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'model': self.model,
+            'users': len(self._indexes),
+            'entries': sum(index.size for index in self._indexes.values()),
+            'embedded': self.embedded,
+            'searches': self.searches,
+            'last_search_ms': round(self.last_search_ms, 3),
+            'errors': self.errors
+        }
+
+    async def _update(self, user_id):
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = await self._load(user_id)
+        after_id = index.last_id if index is not None else 0
+
+        while True:
+            rows = await asyncio.to_thread(self.store.unembedded, user_id, self.model, after_id, self.batch)
+            if not rows:
+                return
+            vectors = np.asarray(await self.embed([content for _, content in rows]), dtype=np.float32)
+            ids = [entry_id for entry_id, _ in rows]
+            await asyncio.to_thread(
+                self.store.save_embeddings, user_id, self.model,
+                [(entry_id, vector.tobytes()) for entry_id, vector in zip(ids, vectors)]
+            )
+            if index is None:
+                index = self._remember(user_id, VectorIndex(vectors.shape[1], self.projection_dim))
+            index.add(ids, vectors)
+            self.embedded += len(rows)
+            after_id = ids[-1]
+            if len(rows) < self.batch:
+                return
+
+    async def _load(self, user_id):
+        """Index of the user's stored embeddings (None if there are none yet)"""
+        rows = await asyncio.to_thread(self.store.load_embeddings, user_id, self.model)
+        if not rows:
+            return None
+        dim = len(rows[0][1]) // 4
+        rows = [(entry_id, vector) for entry_id, vector in rows if len(vector) == dim * 4]
+        index = VectorIndex(dim, self.projection_dim)
+        index.add(
+            [entry_id for entry_id, _ in rows],
+            np.frombuffer(b''.join(vector for _, vector in rows), dtype=np.float32).reshape(-1, dim)
+        )
+        return self._remember(user_id, index)
+
+    def _remember(self, user_id, index):
+        self._indexes[user_id] = index
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
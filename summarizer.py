@@ -0,0 +1,247 @@
+"""
+Streszczenia rozmów ALFA Bridge.
+
+Wiadomości starsze niż ostatnie `keep` nie przepadają: zadanie w tle składa
+je w kroczące streszczenie sesji (model lokalny Ollama albo profil z
+config.MODELS). Ścieżka żądania tylko czyta gotowe streszczenie z pamięci.
+Włączane przez ALFA_BRIDGE_SUMMARY_PROFILE; przy starcie sprawdzane jest,
+czy model profilu jest dostępny - jeśli nie, streszczanie się wyłącza.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+import httpx
+
+import config
+from alfa_ollama import ollama_has_model
+from memory import DEFAULT_SESSION
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    'Streszczasz rozmowe uzytkownika z asystentem AI. Zaktualizuj dotychczasowe '
+    'streszczenie o nowe wiadomosci. Zachowaj fakty o uzytkowniku, ustalenia, '
+    'decyzje i otwarte watki; pomin powitania i powtorzenia. Pisz zwiezle, '
+    'najwyzej {words} slow, w jezyku rozmowy. Zwroc tylko streszczenie.'
+)
+
+
+def summary_messages(previous, entries, words=200):
+    """Chat messages asking the model to fold `entries` into `previous`"""
+    transcript = '\n'.join(f'{role}: {content}' for role, content in entries)
+    parts = []
+    if previous:
+        parts.append(f'Dotychczasowe streszczenie:\n{previous}')
+    parts.append(f'Nowe wiadomosci:\n{transcript}')
+    return [
+        {'role': 'system', 'content': SUMMARY_PROMPT.format(words=words)},
+        {'role': 'user', 'content': '\n\n'.join(parts)}
+    ]
+
+
+class ProfileSummarizer:
+    """
+    summarize(previous, entries) -> str using a config.MODELS profile
+    (backend "ollama" -> /api/chat, "deepseek" -> DeepSeek API).
+    """
+
+    def __init__(self, profile='fast', max_tokens=400, words=200, timeout=120.0):
+        self.profile = profile
+        self.model = config.get_model_config(profile)
+        self.max_tokens = max_tokens
+        self.words = words
+        self.timeout = timeout
+        self._client = None
+
+    async def available(self):
+        """Model of the profile can be used (pulled in Ollama / DeepSeek key set)"""
+        if self.model.get('backend') == 'deepseek':
+            return bool(config.DEEPSEEK_API_KEY)
+        return await ollama_has_model(self._http(), self.model['name'], config.get_ollama_url('/api/tags'))
+
+    async def __call__(self, previous, entries):
+        messages = summary_messages(previous, entries, self.words)
+
+        if self.model.get('backend') == 'deepseek':
+            response = await self._http().post(
+                config.DEEPSEEK_API_URL,
+                headers={'Authorization': f'Bearer {config.DEEPSEEK_API_KEY}'},
+                json={
+                    'model': self.model['name'],
+                    'messages': messages,
+                    'temperature': 0.2,
+                    'max_tokens': self.max_tokens
+                }
+            )
+            response.raise_for_status()
+            return response.json()['choices'][0]['message']['content'].strip()
+
+        response = await self._http().post(
+            config.get_ollama_url('/api/chat'),
+            json={
+                'model': self.model['name'],
+                'messages': messages,
+                'stream': False,
+                'options': {'temperature': 0.2, 'num_predict': self.max_tokens}
+            }
+        )
+        response.raise_for_status()
+        return response.json()['message']['content'].strip()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+
+class BridgeSummarizer:
+    """
+    Rolling per-(user, session) summaries of messages older than the last
+    `keep`, built in the background.
+
+    The request path calls `mark()` after a turn (a set insert) and reads
+    `summary()` (a dict lookup, one indexed read on a miss). Every
+    `interval` seconds marked sessions with at least `min_entries` new old
+    messages are folded into their summary by `summarize(previous, entries)`
+    and saved with the id of the last folded entry, so each message is
+    summarized once.
+
+    `start()` first asks `summarize.available()` (when it has one); if the
+    model cannot be used, summarization stays off and `mark()` is a no-op.
+    """
+
+    def __init__(
+        self,
+        store,
+        summarize,
+        keep=10,
+        min_entries=10,
+        batch=200,
+        interval=5.0,
+        max_sessions=10000
+    ):
+        self.store = store
+        self.summarize = summarize
+        self.keep = keep
+        self.min_entries = min_entries
+        self.batch = batch
+        self.interval = interval
+        self.max_sessions = max_sessions
+
+        self._summaries = OrderedDict()
+        self._marked = set()
+        self._task = None
+        self.active = True
+
+        self.runs = 0
+        self.folded = 0
+        self.errors = 0
+
+    def summary(self, user_id, session_id=None):
+        """Current summary of the session ('' if none yet)"""
+        return self._entry(user_id, session_id)[0]
+
+    def through_id(self, user_id, session_id=None):
+        """Id of the last entry folded into the summary (0 if none yet)"""
+        return self._entry(user_id, session_id)[1]
+
+    def unsummarized(self, history, user_id, session_id=None):
+        """Messages of `history` not folded into the summary yet (no id = not stored yet)"""
+        through_id = self.through_id(user_id, session_id)
+        return [m for m in history if m.get('id') is None or m['id'] > through_id]
+
+    def mark(self, user_id, session_id=None):
+        """Session got new messages - check it on the next run"""
+        if self.active:
+            self._marked.add((user_id, session_id or DEFAULT_SESSION))
+
+    async def start(self):
+        """Start background summarization loop (if the model is available)"""
+        if self._task is not None:
+            return
+        available = getattr(self.summarize, 'available', None)
+        if available is not None and not await available():
+            self.active = False
+            self._marked.clear()
+            logger.warning('Bridge summaries disabled: summary model is not available')
+            return
+        self.active = True
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        close = getattr(self.summarize, 'close', None)
+        if close is not None:
+            await close()
+
+    async def run_once(self):
+        """Fold old messages of all marked sessions"""
+        marked, self._marked = self._marked, set()
+        for user_id, session_id in marked:
+            try:
+                while await self._fold(user_id, session_id):
+                    pass
+            except Exception as e:
+                self.errors += 1
+                logger.error(f'Bridge summary failed for {user_id}: {e}')
+        self.runs += 1
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'resident': len(self._summaries),
+            'marked': len(self._marked),
+            'runs': self.runs,
+            'folded': self.folded,
+            'errors': self.errors
+        }
+
+    async def _fold(self, user_id, session_id):
+        """Fold one batch; True if a full batch was folded (more may be waiting)"""
+        previous, through_id = await asyncio.to_thread(self.store.load_summary, user_id, session_id)
+        rows = await asyncio.to_thread(
+            self.store.unsummarized, user_id, session_id, self.keep, through_id, self.batch
+        )
+        if len(rows) < self.min_entries:
+            return False
+
+        summary = await self.summarize(previous, [(role, content) for _, role, content in rows])
+        through_id = rows[-1][0]
+        await asyncio.to_thread(self.store.save_summary, user_id, session_id, summary, through_id)
+        self._remember((user_id, session_id), (summary, through_id))
+        self.folded += len(rows)
+        return len(rows) == self.batch
+
+    def _entry(self, user_id, session_id):
+        key = (user_id, session_id or DEFAULT_SESSION)
+        entry = self._summaries.get(key)
+        if entry is None:
+            entry = self.store.load_summary(user_id, session_id)
+            self._remember(key, entry)
+        else:
+            self._summaries.move_to_end(key)
+        return entry
+
+    def _remember(self, key, entry):
+        self._summaries[key] = entry
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
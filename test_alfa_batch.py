@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+ALFA - /api/chat/batch tests
+
+Sprawdza endpoint wsadowy (NDJSON): jedna linia na element - wynik albo
+błąd tego elementu (reszta paczki idzie dalej), linie w kolejności
+ukończenia z "index" elementu, na końcu linia {"summary": ...}, oraz
+limit równoczesnych wywołań providera.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_batch.py
+"""
+
+import asyncio
+import json
+
+import httpx
+
+import alfa_app
+from alfa_app import AIFederation
+from alfa_state import memory_state
+
+USER = {"user": {"email": "batch@test", "name": "Batch"}}
+
+
+class FakeDeepSeek:
+    """Answers "<seconds> <text>" after that many seconds, "fail ..." with 503; tracks concurrency"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        message = json.loads(request.content)["messages"][-1]["content"]
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if message.startswith("fail"):
+                return httpx.Response(503, json={"error": {"message": "overloaded"}})
+            delay, _, text = message.partition(" ")
+            await asyncio.sleep(float(delay))
+            return httpx.Response(200, json={"choices": [{"message": {"content": text.upper()}}]})
+        finally:
+            self.in_flight -= 1
+
+
+def post_batch(monkeypatch, body) -> tuple:
+    """(NDJSON records, fake provider) of one /api/chat/batch request"""
+    deepseek = FakeDeepSeek()
+    federation = AIFederation(state=memory_state())
+    federation._http_clients["deepseek"] = httpx.AsyncClient(
+        base_url="http://fake", transport=httpx.MockTransport(deepseek)
+    )
+    federation.get_session(USER["user"]["email"]).api_keys["deepseek"] = "key"
+    monkeypatch.setattr(alfa_app, "ai_federation", federation)
+    monkeypatch.setitem(alfa_app.app.dependency_overrides, alfa_app.require_user, lambda: USER)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=alfa_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://alfa") as client:
+            response = await client.post("/api/chat/batch", json={"model": "deepseek-chat", **body})
+        await federation.shutdown()
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    return asyncio.run(scenario()), deepseek
+
+
+def test_each_item_gets_its_own_result_or_error(monkeypatch):
+    records, _ = post_batch(monkeypatch, {"items": [
+        {"message": "0 one"},
+        {"message": "fail two"},
+        {"message": "0 three", "model": "gpt-4o"},     # no OpenAI key
+        {"message": "0 four"},
+    ]})
+
+    *results, summary = records
+    by_index = {record["index"]: record for record in results}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[0]["success"] and by_index[0]["response"] == "ONE"
+    assert by_index[3]["response"] == "FOUR"
+    assert "success" not in by_index[1] and "503" in by_index[1]["error"]
+    assert "success" not in by_index[2] and by_index[2]["error"] == "API key not configured for openai"
+    assert summary["summary"]["total"] == 4
+    assert (summary["summary"]["succeeded"], summary["summary"]["failed"]) == (2, 2)
+
+
+def test_results_arrive_in_completion_order(monkeypatch):
+    records, _ = post_batch(monkeypatch, {"concurrency": 3, "items": [
+        {"message": "0.3 slow"},
+        {"message": "0.1 medium"},
+        {"message": "0 fast"},
+    ]})
+
+    assert [record.get("index") for record in records] == [2, 1, 0, None]
+    assert [record.get("response") for record in records[:3]] == ["FAST", "MEDIUM", "SLOW"]
+    assert "summary" in records[-1]
+
+
+def test_concurrency_limit(monkeypatch):
+    items = [{"message": f"0.05 item{i}"} for i in range(8)]
+
+    records, deepseek = post_batch(monkeypatch, {"concurrency": 2, "items": items})
+
+    assert deepseek.max_in_flight == 2
+    assert records[-1]["summary"]["concurrency"] == 2
+    assert records[-1]["summary"]["succeeded"] == 8
+
+
+if __name__ == "__main__":
+    import pytest
+
+    for test in (
+        test_each_item_gets_its_own_result_or_error,
+        test_results_arrive_in_completion_order,
+        test_concurrency_limit,
+    ):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    print("OK")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+ALFA - ResponseCache tests
+
+Sprawdza dwupoziomowy cache odpowiedzi: trafienia w L1 bez sięgania do L2,
+przeniesienie trafienia z L2 (wspólna baza SQLite innego workera) do L1,
+wygasanie po TTL w obu poziomach, limit LRU oraz klucze rozdzielone per
+klucz API - użytkownik z innym kluczem nie dostaje cudzej odpowiedzi.
+SingleFlight anuluje wywołanie providera dopiero, gdy nikt już nie czeka.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_cache.py
+"""
+
+import asyncio
+
+import httpx
+
+from alfa_app import AIFederation, UserSession
+from alfa_cache import (
+    MemoryResponseStore,
+    ResponseCache,
+    SingleFlight,
+    SQLiteResponseStore,
+    credential_id,
+    make_key,
+)
+from alfa_state import memory_state
+
+
+class CountingStore(MemoryResponseStore):
+    """L2 that counts lookups"""
+
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return super().get(key)
+
+
+def test_local_tier_hit_skips_shared_store():
+    store = CountingStore()
+    cache = ResponseCache(store)
+
+    async def scenario():
+        assert await cache.get("k") is None
+        await cache.set("k", "answer")
+        return await cache.get("k"), await cache.get("k")
+
+    assert asyncio.run(scenario()) == ("answer", "answer")
+    assert store.gets == 1                      # only the first miss reached L2
+    stats = cache.stats()
+    assert (stats["hits_memory"], stats["hits_disk"], stats["misses"]) == (2, 0, 1)
+
+
+def test_shared_tier_hit_is_promoted(tmp_path):
+    """A response stored by one worker is served to another from SQLite, then from its memory"""
+    db_path = tmp_path / "responses.db"
+    writer = ResponseCache(SQLiteResponseStore(db_path))
+    reader = ResponseCache(SQLiteResponseStore(db_path))
+
+    async def scenario():
+        await writer.set("k", "answer")
+        return await reader.get("k"), await reader.get("k")
+
+    assert asyncio.run(scenario()) == ("answer", "answer")
+    stats = reader.stats()
+    assert (stats["hits_disk"], stats["hits_memory"], stats["memory_entries"]) == (1, 1, 1)
+    writer.close()
+    reader.close()
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    store = SQLiteResponseStore(tmp_path / "responses.db")
+    cache = ResponseCache(store, ttl=0.05)
+
+    async def scenario():
+        await cache.set("k", "answer")
+        assert await cache.get("k") == "answer"
+        await asyncio.sleep(0.06)
+        return await cache.get("k")
+
+    assert asyncio.run(scenario()) is None
+    assert cache.stats()["memory_entries"] == 0
+    # A fresh worker does not get the expired row from the shared tier either
+    assert asyncio.run(ResponseCache(store).get("k")) is None
+    store.close()
+
+
+def test_local_tier_is_lru_bounded():
+    store = CountingStore()
+    cache = ResponseCache(store, max_entries=2)
+
+    async def scenario():
+        for key in ("a", "b"):
+            await cache.set(key, key)
+        await cache.get("a")                    # "b" is now least recently used
+        await cache.set("c", "c")
+        assert await cache.get("b") == "b"      # evicted from L1, still in L2
+
+    asyncio.run(scenario())
+
+    assert cache.stats()["hits_disk"] == 1
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_keys_are_scoped_per_credential():
+    alice, bob = credential_id("alice-key"), credential_id("bob-key")
+
+    assert alice != bob and credential_id(None) == ""
+    assert "alice-key" not in alice
+    assert make_key("openai", "gpt-4o", "hi  there", {"temperature": 0}, credential=alice) == \
+        make_key("openai", "gpt-4o", "hi there", {"temperature": 0}, credential=alice)
+    assert make_key("openai", "gpt-4o", "hi", {"temperature": 0}, credential=alice) != \
+        make_key("openai", "gpt-4o", "hi", {"temperature": 0}, credential=bob)
+
+
+def test_cached_response_is_not_shared_across_api_keys():
+    """Deterministic calls are cached per API key; default temperature bypasses the cache"""
+    calls = []
+
+    def deepseek(request: httpx.Request) -> httpx.Response:
+        calls.append(request.headers["authorization"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"reply {len(calls)}"}}]})
+
+    federation = AIFederation(state=memory_state(), cache=ResponseCache(MemoryResponseStore()))
+    federation._http_clients["deepseek"] = httpx.AsyncClient(
+        base_url="http://fake", transport=httpx.MockTransport(deepseek)
+    )
+    alice, bob = UserSession("alice@test"), UserSession("bob@test")
+    alice.api_keys["deepseek"] = "alice-key"
+    bob.api_keys["deepseek"] = "bob-key"
+    greedy = {"temperature": 0}
+
+    async def scenario():
+        replies = [
+            await federation._call_ai("deepseek", "deepseek-chat", "hi", alice, greedy),
+            await federation._call_ai("deepseek", "deepseek-chat", "hi", alice, greedy),
+            await federation._call_ai("deepseek", "deepseek-chat", "hi", bob, greedy),
+            await federation._call_ai("deepseek", "deepseek-chat", "hi", bob),
+        ]
+        await federation.shutdown()
+        return replies
+
+    assert asyncio.run(scenario()) == ["reply 1", "reply 1", "reply 2", "reply 3"]
+    assert calls == ["Bearer alice-key", "Bearer bob-key", "Bearer bob-key"]
+    assert federation.cache.stats()["bypassed"] == 1
+
+
+def test_singleflight_cancels_upstream_only_without_waiters():
+    flight = SingleFlight()
+    upstream = []
+
+    async def call():
+        upstream.append(asyncio.current_task())
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("k", call))
+        second = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()                          # e.g. a lost race
+        assert await second == "answer"         # the other waiter still gets it
+
+        alone = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        alone.cancel()
+        await asyncio.sleep(0)
+        return flight.stats()["inflight"]
+
+    assert asyncio.run(scenario()) == 0
+    assert [task.cancelled() for task in upstream] == [False, True]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_local_tier_hit_skips_shared_store()
+    test_shared_tier_hit_is_promoted(Path(tempfile.mkdtemp()))
+    test_entries_expire_after_ttl(Path(tempfile.mkdtemp()))
+    test_local_tier_is_lru_bounded()
+    test_keys_are_scoped_per_credential()
+    test_cached_response_is_not_shared_across_api_keys()
+    test_singleflight_cancels_upstream_only_without_waiters()
+    print("OK")
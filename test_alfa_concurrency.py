@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+ALFA - AIFederation concurrency tests
+
+Sprawdza, że wywołania różnych providerów nie blokują pętli zdarzeń
+i nakładają się w czasie, a limit per-provider ogranicza tylko swojego providera.
+Identyczne równoczesne zapytania (także z domyślnym temperature) są łączone
+w jedno wywołanie providera, ale tylko w obrębie jednego klucza API.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_concurrency.py
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from alfa_app import AIFederation, UserSession
+
+DELAY = 0.3
+
+
+class SlowOpenAI:
+    """Fake AsyncOpenAI: chat.completions.create sleeps DELAY"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        await asyncio.sleep(DELAY)
+        message = SimpleNamespace(content="openai")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class SlowAnthropic:
+    """Fake AsyncAnthropic: messages.create sleeps DELAY"""
+
+    def __init__(self):
+        self.messages = SimpleNamespace(create=self._create)
+
+    async def _create(self, **kwargs):
+        await asyncio.sleep(DELAY)
+        return SimpleNamespace(content=[SimpleNamespace(text="claude")])
+
+
+async def slow_http(request: httpx.Request) -> httpx.Response:
+    """Fake Gemini / DeepSeek HTTP endpoint: sleeps DELAY"""
+    await asyncio.sleep(DELAY)
+    if "generateContent" in request.url.path:
+        return httpx.Response(200, json={
+            "candidates": [{"content": {"parts": [{"text": "gemini"}]}}]
+        })
+    return httpx.Response(200, json={
+        "choices": [{"message": {"content": "deepseek"}}]
+    })
+
+
+def make_federation(**kwargs) -> AIFederation:
+    federation = AIFederation(**kwargs)
+    federation._openai_client = lambda api_key: SlowOpenAI()
+    federation._claude_client = lambda api_key: SlowAnthropic()
+    for provider in ("gemini", "deepseek"):
+        federation._http_clients[provider] = httpx.AsyncClient(
+            base_url="http://fake", transport=httpx.MockTransport(slow_http)
+        )
+    return federation
+
+
+def make_session() -> UserSession:
+    session = UserSession("concurrency@test")
+    session.api_keys = {p: "key" for p in ("gemini", "openai", "anthropic", "deepseek")}
+    return session
+
+
+def test_different_providers_overlap():
+    """Four slow providers called together finish in ~one DELAY, not four"""
+    federation = make_federation()
+    session = make_session()
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            federation._call_ai("openai", "gpt-4o", "hi", session),
+            federation._call_ai("anthropic", "claude-3-haiku", "hi", session),
+            federation._call_ai("gemini", "gemini-pro", "hi", session),
+            federation._call_ai("deepseek", "deepseek-chat", "hi", session),
+        )
+        await federation.shutdown()
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+
+    assert results == ["openai", "claude", "gemini", "deepseek"]
+    assert elapsed < DELAY * 2, f"calls did not overlap: {elapsed:.2f}s"
+
+
+def test_provider_cap_does_not_starve_others():
+    """Saturated Claude cap serialises Claude calls only"""
+    federation = make_federation(concurrency={"anthropic": 1})
+    session = make_session()
+    finished = {}
+
+    async def timed(name, coro, started):
+        await coro
+        finished[name] = time.perf_counter() - started
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(
+            timed("claude-1", federation._call_ai("anthropic", "claude-3-opus", "a", session), started),
+            timed("claude-2", federation._call_ai("anthropic", "claude-3-opus", "b", session), started),
+            timed("openai", federation._call_ai("openai", "gpt-4o", "c", session), started),
+        )
+        await federation.shutdown()
+
+    asyncio.run(scenario())
+
+    assert max(finished["claude-1"], finished["claude-2"]) >= DELAY * 2
+    assert finished["openai"] < DELAY * 2
+
+
+def test_singleflight_not_shared_across_api_keys():
+    """Same prompt at the same time from two users: each runs with (and is billed to) its own key"""
+    federation = make_federation()
+    seen_keys = []
+
+    async def per_key_http(request: httpx.Request) -> httpx.Response:
+        seen_keys.append(request.headers["authorization"])
+        await asyncio.sleep(DELAY)
+        if request.headers["authorization"] == "Bearer bad-key":
+            return httpx.Response(401, json={"error": {"message": "invalid key"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "deepseek"}}]})
+
+    federation._http_clients["deepseek"] = httpx.AsyncClient(
+        base_url="http://fake", transport=httpx.MockTransport(per_key_http)
+    )
+    alice, bob = make_session(), make_session()
+    alice.api_keys["deepseek"] = "bad-key"
+    params = {"temperature": 0}
+
+    async def scenario():
+        results = await asyncio.gather(
+            federation._call_ai("deepseek", "deepseek-chat", "hi", alice, params),
+            federation._call_ai("deepseek", "deepseek-chat", "hi", bob, params),
+            return_exceptions=True
+        )
+        await federation.shutdown()
+        return results
+
+    alice_result, bob_result = asyncio.run(scenario())
+
+    assert isinstance(alice_result, Exception)
+    assert bob_result == "deepseek"
+    assert sorted(seen_keys) == ["Bearer bad-key", "Bearer key"]
+
+
+def test_identical_default_temperature_prompts_share_one_call():
+    """N users with the same key asking the same thing at once: one upstream call, no caching"""
+    federation = make_federation()
+    calls = []
+
+    async def counting_http(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return await slow_http(request)
+
+    federation._http_clients["deepseek"] = httpx.AsyncClient(
+        base_url="http://fake", transport=httpx.MockTransport(counting_http)
+    )
+    session = make_session()
+
+    async def scenario():
+        results = await asyncio.gather(*(
+            federation._call_ai("deepseek", "deepseek-chat", "What is  UTC+2?", session) for _ in range(10)
+        ))
+        # Not deterministic, so not cached: a later identical prompt calls again
+        await federation._call_ai("deepseek", "deepseek-chat", "What is UTC+2?", session)
+        await federation.shutdown()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results == ["deepseek"] * 10
+    assert len(calls) == 2
+    assert federation.singleflight.stats()["coalesced"] == 9
+
+
+if __name__ == "__main__":
+    test_different_providers_overlap()
+    test_provider_cap_does_not_starve_others()
+    test_singleflight_not_shared_across_api_keys()
+    test_identical_default_temperature_prompts_share_one_call()
+    print("OK")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+ALFA - ConversationStore tests
+
+Sprawdza, że kilka procesów (uvicorn --workers N) dopisujących tury
+do tej samej rozmowy nie koliduje na numerze wiadomości (seq).
+
+Uruchomienie:
+    python -m pytest -q test_alfa_conversations.py
+"""
+
+import multiprocessing
+
+from alfa_conversations import ConversationStore
+
+TURNS = 100
+
+
+def append_turns(db_path):
+    store = ConversationStore(db_path)
+    for i in range(TURNS):
+        store.append("c1", [("user", f"m{i}", None, 3), ("assistant", "ok", "model", 3)])
+    store.close()
+
+
+def test_concurrent_workers_append_without_seq_conflict(tmp_path):
+    db_path = tmp_path / "conversations.db"
+    workers = [multiprocessing.Process(target=append_turns, args=(db_path,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert [worker.exitcode for worker in workers] == [0] * 4
+    store = ConversationStore(db_path)
+    assert store.last_seq("c1") == 4 * TURNS * 2
+    assert [seq for seq, *_ in store.since("c1", 0)] == list(range(1, 4 * TURNS * 2 + 1))
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_concurrent_workers_append_without_seq_conflict(Path(tempfile.mkdtemp()))
+    print("OK")
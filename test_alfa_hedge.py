@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+ALFA - race / hedge tests
+
+Sprawdza tryby wielu providerów: w race wygrywa pierwsza udana odpowiedź,
+przegrani są anulowani i nie liczą się jako awarie (router, wyłącznik),
+a w hedge zapasowy kandydat startuje dopiero po HEDGE_DELAY bez odpowiedzi
+(albo od razu po błędzie poprzedniego).
+
+Uruchomienie:
+    python -m pytest -q test_alfa_hedge.py
+"""
+
+import asyncio
+import time
+
+import httpx
+
+import alfa_app
+from alfa_app import AIFederation
+from alfa_state import memory_state
+
+USER = "hedge@test"
+
+
+class FakeProvider:
+    """HTTP provider answering after `delay` seconds (or with `status`); records starts / cancellations"""
+
+    def __init__(self, reply, delay, status=200):
+        self.reply = reply
+        self.delay = delay
+        self.status = status
+        self.started = []
+        self.cancelled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.started.append(time.perf_counter())
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": {"message": "upstream down"}})
+        if "generateContent" in request.url.path:
+            return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": self.reply}]}}]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": self.reply}}]})
+
+
+def make_federation(gemini: FakeProvider, deepseek: FakeProvider) -> AIFederation:
+    federation = AIFederation(state=memory_state())
+    for provider, fake in (("gemini", gemini), ("deepseek", deepseek)):
+        federation._http_clients[provider] = httpx.AsyncClient(
+            base_url="http://fake", transport=httpx.MockTransport(fake)
+        )
+    session = federation.get_session(USER)
+    session.api_keys.update({"gemini": "key", "deepseek": "key"})
+    return federation
+
+
+def model_errors(federation: AIFederation, model: str) -> int:
+    return next(row["errors"] for row in federation.routing_table()["models"] if row["model"] == model)
+
+
+def run(federation: AIFederation, model: str) -> tuple:
+    """(result, seconds) of one prompt; the federation is shut down afterwards"""
+    async def scenario():
+        started = time.perf_counter()
+        result = await federation._chat_once(USER, "hi", model)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)            # let cancelled losers unwind
+        # No provider call outlives the prompt (losers are not left running)
+        assert federation.singleflight.stats()["inflight"] == 0
+        await federation.shutdown()
+        return result, elapsed
+
+    return asyncio.run(scenario())
+
+
+def test_race_first_success_wins_and_loser_is_cancelled():
+    gemini, deepseek = FakeProvider("gemini", delay=0.5), FakeProvider("deepseek", delay=0.05)
+    federation = make_federation(gemini, deepseek)
+
+    result, elapsed = run(federation, "race:gemini-pro,deepseek-chat")
+
+    assert result["success"] and result["response"] == "deepseek"
+    assert result["race"]["winner"] == "deepseek-chat"
+    assert result["race"]["launched"] == 2
+    assert elapsed < 0.3                     # did not wait for the slow candidate
+    assert gemini.cancelled == 1
+    # A cancelled loser is neither an error of its model nor a breaker failure
+    assert model_errors(federation, "gemini-pro") == 0
+    assert federation.guards["gemini"].breaker.failures == 0
+
+
+def test_race_skips_a_failed_candidate():
+    gemini, deepseek = FakeProvider("gemini", delay=0.15), FakeProvider("deepseek", delay=0.01, status=503)
+    federation = make_federation(gemini, deepseek)
+
+    result, _ = run(federation, "race:deepseek-chat,gemini-pro")
+
+    assert result["race"]["winner"] == "gemini-pro"
+    assert list(result["race"]["failed"]) == ["deepseek-chat"]
+    assert model_errors(federation, "deepseek-chat") == 1     # a real failure is counted
+
+
+def test_hedge_waits_for_the_delay(monkeypatch):
+    monkeypatch.setattr(alfa_app, "HEDGE_DELAY", 0.1)
+
+    # Primary answers within the delay: the backup is never sent
+    gemini, deepseek = FakeProvider("gemini", delay=0.03), FakeProvider("deepseek", delay=0.01)
+    result, _ = run(make_federation(gemini, deepseek), "hedge:gemini-pro,deepseek-chat")
+    assert result["hedge"]["winner"] == "gemini-pro" and result["hedge"]["launched"] == 1
+    assert deepseek.started == []
+
+    # Primary is slow: the backup starts after the delay and wins
+    gemini, deepseek = FakeProvider("gemini", delay=0.5), FakeProvider("deepseek", delay=0.01)
+    federation = make_federation(gemini, deepseek)
+    result, elapsed = run(federation, "hedge:gemini-pro,deepseek-chat")
+    assert result["hedge"]["winner"] == "deepseek-chat" and result["hedge"]["launched"] == 2
+    assert 0.09 <= deepseek.started[0] - gemini.started[0] < 0.2
+    assert elapsed < 0.3
+    assert gemini.cancelled == 1
+    assert model_errors(federation, "gemini-pro") == 0
+
+
+def test_hedge_backup_starts_right_after_a_failure(monkeypatch):
+    monkeypatch.setattr(alfa_app, "HEDGE_DELAY", 1.0)
+    gemini, deepseek = FakeProvider("gemini", delay=0.01, status=503), FakeProvider("deepseek", delay=0.01)
+
+    result, elapsed = run(make_federation(gemini, deepseek), "hedge:gemini-pro,deepseek-chat")
+
+    assert result["hedge"]["winner"] == "deepseek-chat"
+    assert elapsed < 0.5
+
+
+if __name__ == "__main__":
+    import pytest
+
+    test_race_first_success_wins_and_loser_is_cancelled()
+    test_race_skips_a_failed_candidate()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_hedge_waits_for_the_delay(monkeypatch)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_hedge_backup_starts_right_after_a_failure(monkeypatch)
+    print("OK")
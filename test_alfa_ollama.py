@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+ALFA - Ollama context reuse tests
+
+Sprawdza, że kolejna tura rozmowy z Ollamą wysyła tylko nową wiadomość
+z `context` poprzedniej tury, a po utracie kontekstu (eviction, restart)
+cała historia idzie jednym promptem przez /api/generate, więc łańcuch
+kontekstów zaczyna się od nowa zamiast przejść na stałe na /api/chat.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_ollama.py
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from alfa_app import AIFederation
+from alfa_ollama import transcript_prompt
+from alfa_state import memory_state
+
+USER = "ollama@test"
+
+
+class FakeOllama:
+    """Records requests; /api/generate answers with a growing context"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append((request.url.path, body))
+        if request.url.path == "/api/chat":
+            return httpx.Response(200, json={"message": {"content": "chat reply"}, "done": True})
+        context = list(body.get("context") or []) + [len(self.requests)]
+        return httpx.Response(200, json={"response": f"reply {len(self.requests)}", "context": context, "done": True})
+
+
+def make_federation(ollama: FakeOllama) -> AIFederation:
+    federation = AIFederation(state=memory_state())
+    federation._http_clients["ollama"] = httpx.AsyncClient(
+        base_url="http://ollama", transport=httpx.MockTransport(ollama)
+    )
+    return federation
+
+
+def test_transcript_prompt():
+    system, prompt = transcript_prompt([
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "how are you?"},
+    ])
+    assert system == "Be brief."
+    assert prompt == "User: hi\n\nAssistant: hello\n\nUser: how are you?"
+    assert transcript_prompt([{"role": "user", "content": "hi"}]) == ("", "hi")
+
+
+def test_context_is_reseeded_after_a_miss():
+    ollama = FakeOllama()
+    federation = make_federation(ollama)
+
+    async def turn(message, conversation_id=None):
+        result = await federation.chat(USER, message, model="ollama-llama3", conversation_id=conversation_id)
+        assert result["success"], result
+        return result["conversation_id"]
+
+    async def scenario():
+        conversation_id = await turn("first")
+        await turn("second", conversation_id)
+        federation.ollama_contexts._entries.clear()      # evicted / other worker
+        await turn("third", conversation_id)
+        await turn("fourth", conversation_id)
+
+    asyncio.run(scenario())
+
+    paths = [path for path, _ in ollama.requests]
+    assert paths == ["/api/generate"] * 4
+    second, third, fourth = (body for _, body in ollama.requests[1:])
+    assert second["prompt"] == "second" and second["context"] == [1]
+    # Miss: the whole history in one prompt, no stale context
+    assert "context" not in third
+    assert third["prompt"] == "User: first\n\nAssistant: reply 1\n\nUser: second\n\nAssistant: reply 2\n\nUser: third"
+    # ... and the chain continues from the re-seeded context
+    assert fourth["prompt"] == "fourth" and fourth["context"] == [3]
+
+
+if __name__ == "__main__":
+    test_transcript_prompt()
+    test_context_is_reseeded_after_a_miss()
+    print("OK")
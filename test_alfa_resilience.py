@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+ALFA - provider resilience tests
+
+Sprawdza stany wyłącznika (closed -> open -> half-open -> closed/open),
+adaptacyjny limiter (429 + Retry-After, powrót do tempa) oraz ProviderGuard:
+limiter per klucz API i zwalnianie próby half-open, gdy klient porzuci
+stream albo wywołanie zostanie anulowane w oczekiwaniu na token.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_resilience.py
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from alfa_resilience import (
+    AdaptiveTokenBucket,
+    CircuitBreaker,
+    ProviderGuard,
+    ProviderUnavailable,
+    classify_error,
+    parse_retry_after,
+)
+
+
+def http_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://provider/v1/chat")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def make_guard(**kwargs) -> ProviderGuard:
+    return ProviderGuard(
+        "deepseek",
+        lambda: AdaptiveTokenBucket(rate=10, burst=2),
+        CircuitBreaker(failure_threshold=2, reset_timeout=0.05),
+        **kwargs
+    )
+
+
+def test_classify_error():
+    assert classify_error(http_error(429)) == "rate_limited"
+    assert classify_error(http_error(503)) == "unavailable"
+    assert classify_error(http_error(401)) == "client"
+    assert classify_error(httpx.ConnectError("refused")) == "unavailable"
+    assert classify_error(asyncio.TimeoutError()) == "unavailable"
+    assert parse_retry_after(http_error(429, {"retry-after": "3"})) == 3.0
+    assert parse_retry_after(http_error(429, {"retry-after-ms": "250"})) == 0.25
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.on_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.on_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() > 0
+
+    time.sleep(0.06)
+    assert breaker.retry_after() == 0            # the probe is let through
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.retry_after() > 0             # ... but only one
+    breaker.on_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() == 0
+
+
+def test_failed_probe_reopens_with_longer_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.on_failure()
+    time.sleep(0.06)
+    assert breaker.retry_after() == 0
+    breaker.on_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.reset_timeout == 0.1
+
+
+def test_bucket_burst_then_wait():
+    bucket = AdaptiveTokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    wait = bucket.reserve()
+    assert 0 < wait <= 0.1
+
+
+def test_bucket_backs_off_on_429_and_recovers():
+    bucket = AdaptiveTokenBucket(rate=10, burst=2, increase=5)
+    bucket.on_rate_limited(retry_after=0.5)
+
+    assert bucket.rate == 5
+    assert 0.4 < bucket.reserve() <= 0.5       # paused until Retry-After
+    bucket.on_success()
+    bucket.on_success()
+    assert bucket.rate == 10                    # never above the configured rate
+
+
+def test_guard_rejects_when_circuit_open():
+    guard = make_guard()
+
+    async def failing_call():
+        async with guard.guard("key-a"):
+            raise http_error(502)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await failing_call()
+        with pytest.raises(ProviderUnavailable) as rejected:
+            await failing_call()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "circuit open"
+    assert guard.rejected == 1
+
+
+def test_rate_limit_of_one_key_does_not_throttle_others():
+    guard = make_guard(max_wait=0.1)
+
+    async def call(credential, exc=None):
+        async with guard.guard(credential):
+            if exc is not None:
+                raise exc
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await call("key-a", http_error(429, {"retry-after": "30"}))
+        with pytest.raises(ProviderUnavailable):
+            await call("key-a")
+        await call("key-b")
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.stats()["throttled_keys"] == 1
+
+
+def test_abandoned_stream_releases_half_open_probe():
+    """GeneratorExit inside the guard (client left an SSE stream) must not leak the probe"""
+    guard = make_guard()
+    guard.breaker.on_failure()
+    guard.breaker.on_failure()
+    time.sleep(0.06)
+
+    async def stream():
+        async with guard.guard("key-a"):
+            yield "first"
+            yield "second"
+
+    async def scenario():
+        chunks = stream()
+        assert await chunks.__anext__() == "first"   # this call is the probe
+        await chunks.aclose()                        # consumer went away
+        # Next call becomes the new probe instead of being rejected forever
+        async with guard.guard("key-a"):
+            pass
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_token_wait_releases_half_open_probe():
+    """A probe cancelled while waiting for a rate-limit token must not block the provider"""
+    guard = make_guard(max_wait=1.0)
+    guard.breaker.on_failure()
+    guard.breaker.on_failure()
+    time.sleep(0.06)
+    bucket = guard.bucket("key-a")
+    bucket.tokens = 0.0
+    bucket.rate = 2.0                              # next token in 0.5 s
+
+    async def scenario():
+        waiting = asyncio.create_task(guard.admit("key-a"))   # this call is the probe
+        await asyncio.sleep(0.05)
+        waiting.cancel()                             # race loser / client gone
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await guard.admit("key-b")                   # becomes the new probe
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    assert guard.rejected == 0
+
+
+if __name__ == "__main__":
+    test_classify_error()
+    test_breaker_opens_after_threshold_and_recovers_through_probe()
+    test_failed_probe_reopens_with_longer_timeout()
+    test_bucket_burst_then_wait()
+    test_bucket_backs_off_on_429_and_recovers()
+    test_guard_rejects_when_circuit_open()
+    test_rate_limit_of_one_key_does_not_throttle_others()
+    test_abandoned_stream_releases_half_open_probe()
+    test_cancelled_token_wait_releases_half_open_probe()
+    print("OK")
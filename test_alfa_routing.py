@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+ALFA - auto routing tests
+
+Sprawdza LatencyRouter (model "auto"): wolny model (EWMA, długi ogon p95)
+i model z błędami spadają w rankingu, a po poprawie - albo po wygaśnięciu
+starych błędów - wracają; eksploracja sięga też po modele zawodne.
+Na koniec route_auto: tylko providerzy z kluczem i zamkniętym wyłącznikiem.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_routing.py
+"""
+
+import random
+import time
+
+from alfa_app import AIFederation
+from alfa_routing import LatencyRouter
+from alfa_state import memory_state
+
+
+def make_router(explore: float = 0.0) -> LatencyRouter:
+    return LatencyRouter([("p1", "fast"), ("p2", "steady")], explore=explore)
+
+
+def choose(router: LatencyRouter) -> str:
+    return router.choose(allowed=lambda provider: True, healthy=lambda provider: True)
+
+
+def record(router: LatencyRouter, model: str, latency_ms: float, times: int = 1, ok: bool = True):
+    for _ in range(times):
+        router.record(model, latency_ms, ok)
+
+
+def test_slow_model_is_deprioritized_and_recovers():
+    router = make_router()
+    record(router, "fast", 100, times=20)
+    record(router, "steady", 300, times=20)
+    assert choose(router) == "fast"
+
+    record(router, "fast", 900, times=20)        # provider got slow
+    assert choose(router) == "steady"
+
+    record(router, "fast", 80, times=40)         # ... and recovered
+    assert router._stats["fast"].ewma_ms < 100
+    assert choose(router) == "steady"            # the slow calls are still in its p95
+
+    record(router, "fast", 80, times=360)        # < 5% of its calls were slow
+    assert choose(router) == "fast"
+
+
+def test_latency_tail_counts_not_only_the_average():
+    router = make_router()
+    for i in range(100):
+        record(router, "fast", 3000 if i % 10 == 0 else 100)   # every 10th call stalls
+        record(router, "steady", 400)
+
+    rows = {row["model"]: row for row in router.table()}
+    assert rows["fast"]["p95_ms"] > 2000
+    assert choose(router) == "steady"
+
+
+def test_failing_model_is_skipped_until_errors_fade():
+    router = make_router()
+    record(router, "fast", 100, times=10)
+    record(router, "steady", 300, times=10)
+    router._stats["fast"].error_half_life = 0.05
+    record(router, "fast", 100, times=5, ok=False)
+
+    assert router._stats["fast"].error_rate > router.max_error_rate
+    assert choose(router) == "steady"
+
+    time.sleep(0.25)                             # no traffic: old errors decay
+    assert choose(router) == "fast"
+
+
+def test_failing_model_recovers_through_successes():
+    router = make_router()
+    record(router, "fast", 100, times=10)
+    record(router, "steady", 300, times=10)
+    record(router, "fast", 100, times=5, ok=False)
+    assert choose(router) == "steady"
+
+    record(router, "fast", 100, times=10)
+    assert choose(router) == "fast"
+
+
+def test_exploration_probes_unreliable_models():
+    router = make_router(explore=1.0)
+    record(router, "fast", 100, times=5, ok=False)
+    record(router, "steady", 300, times=5)
+    random.seed(1)
+
+    picked = {choose(router) for _ in range(50)}
+
+    assert picked == {"fast", "steady"}
+
+
+def test_route_auto_uses_only_usable_providers():
+    federation = AIFederation(state=memory_state())
+    session = federation.get_session("routing@test")
+    session.api_keys = {"deepseek": "key", "gemini": "key"}
+    federation.router.explore = 0.0
+    for row in federation.router.table():
+        federation.router.record(row["model"], 5000 if row["model"] != "gemini-pro" else 200, ok=True)
+    federation.router.record("gpt-4o", 10, ok=True)          # fastest, but no OpenAI key
+    federation.router.record("ollama-llama3", 10, ok=True)   # local, not loaded yet
+
+    assert federation.route_auto("routing@test") == "gemini-pro"
+
+    breaker = federation.guards["gemini"].breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.on_failure()
+    assert federation.route_auto("routing@test") != "gemini-pro"
+
+
+if __name__ == "__main__":
+    test_slow_model_is_deprioritized_and_recovers()
+    test_latency_tail_counts_not_only_the_average()
+    test_failing_model_is_skipped_until_errors_fade()
+    test_failing_model_recovers_through_successes()
+    test_exploration_probes_unreliable_models()
+    test_route_auto_uses_only_usable_providers()
+    print("OK")
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+ALFA - SessionRegistry tests
+
+Sprawdza LRU eviction, eviction sesji bezczynnych i zapis write-behind
+(flush co interwał / po przekroczeniu paczki / przy stop, ponowienie po błędzie,
+flushe wywołane równocześnie)
+oraz VerifiedSessionCache ze wspólnym magazynem sesji logowania.
+
+Uruchomienie:
+    python -m pytest -q test_alfa_sessions.py
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from alfa_sessions import MemoryAuthSessionStore, MemorySessionStore, SessionRegistry, VerifiedSessionCache
+
+
+class FakeSession:
+    def __init__(self, user_email, record):
+        self.user_email = user_email
+        self.api_keys = dict(record.get("api_keys", {}))
+        self.last_seen = time.monotonic()
+
+    def to_record(self):
+        return {"api_keys": dict(self.api_keys)}
+
+
+class FlakyStore(MemorySessionStore):
+    """Fails the first `failures` save_many calls"""
+
+    def __init__(self, failures=1):
+        super().__init__()
+        self.failures = failures
+
+    def save_many(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super().save_many(records)
+
+
+class FakeAuthManager:
+    """In-process logins with ISO expiry, like the OAuth manager"""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def login(self, session_id, minutes=60):
+        expires = (datetime.now() + timedelta(minutes=minutes)).isoformat()
+        self.sessions[session_id] = {"user": {"email": "a@test"}, "expires_at": expires}
+
+    def verify_session(self, session_id):
+        session = self.sessions.get(session_id)
+        return session is not None and datetime.fromisoformat(session["expires_at"]) > datetime.now()
+
+    def get_session(self, session_id):
+        return self.sessions.get(session_id) if self.verify_session(session_id) else None
+
+
+def make_registry(store=None, **kwargs):
+    return SessionRegistry(store or MemorySessionStore(), FakeSession, **kwargs)
+
+
+def test_lru_eviction_keeps_pending_writes():
+    """Overflow evicts the least recently used session; unflushed changes survive a reload"""
+    registry = make_registry(max_sessions=2)
+
+    first = registry.get("a@test")
+    first.api_keys["openai"] = "key-a"
+    registry.mark_dirty(first)
+    registry.get("b@test")
+    registry.get("c@test")
+
+    assert "a@test" not in registry
+    assert len(registry) == 2
+    assert registry.stats()["evictions"] == 1
+    # Reloaded from the pending write, not the (still empty) store
+    assert registry.get("a@test").api_keys == {"openai": "key-a"}
+
+
+def test_lru_order_follows_use():
+    registry = make_registry(max_sessions=2)
+    registry.get("a@test")
+    registry.get("b@test")
+    registry.get("a@test")
+    registry.get("c@test")
+
+    assert "a@test" in registry
+    assert "b@test" not in registry
+
+
+def test_evict_idle():
+    registry = make_registry(idle_ttl=60)
+    registry.get("old@test").last_seen -= 120
+    registry.get("new@test")
+
+    registry.evict_idle()
+
+    assert "old@test" not in registry
+    assert "new@test" in registry
+
+
+def test_write_behind_flush():
+    """Changes reach the store only on flush, in one batch"""
+    store = MemorySessionStore()
+    registry = make_registry(store)
+
+    async def scenario():
+        for email in ("a@test", "b@test"):
+            session = registry.get(email)
+            session.api_keys["deepseek"] = email
+            registry.mark_dirty(session)
+        assert store.load("a@test") is None
+        await registry.flush()
+
+    asyncio.run(scenario())
+
+    assert store.load("a@test") == {"api_keys": {"deepseek": "a@test"}}
+    assert store.load("b@test") == {"api_keys": {"deepseek": "b@test"}}
+    assert registry.stats()["flushes"] == 1
+    assert registry.stats()["dirty"] == 0
+
+
+def test_background_flush_interval_batch_and_stop():
+    store = MemorySessionStore()
+    registry = make_registry(store, flush_interval=0.05, flush_batch=3)
+
+    async def scenario():
+        await registry.start()
+        session = registry.get("a@test")
+        registry.mark_dirty(session)
+        await asyncio.sleep(0.15)
+        assert store.load("a@test") is not None, "interval flush did not run"
+
+        # A full batch is flushed without waiting for the interval
+        registry.flush_interval = 60
+        await asyncio.sleep(0.1)
+        for email in ("b@test", "c@test", "d@test"):
+            registry.mark_dirty(registry.get(email))
+        await asyncio.sleep(0.05)
+        assert store.load("d@test") is not None, "batch threshold did not wake the flush"
+
+        registry.mark_dirty(registry.get("e@test"))
+        await registry.stop()
+
+    asyncio.run(scenario())
+
+    assert store.load("e@test") is not None, "stop() did not flush pending writes"
+
+
+def test_failed_flush_is_retried():
+    store = FlakyStore(failures=1)
+    registry = make_registry(store)
+
+    async def scenario():
+        session = registry.get("a@test")
+        session.api_keys["openai"] = "old"
+        registry.mark_dirty(session)
+        await registry.flush()
+        assert store.load("a@test") is None
+
+        # Newer change made after the failure wins
+        session.api_keys["openai"] = "new"
+        registry.mark_dirty(session)
+        await registry.flush()
+
+    asyncio.run(scenario())
+
+    assert store.load("a@test") == {"api_keys": {"openai": "new"}}
+
+
+class SlowFlakyStore(FlakyStore):
+    """Takes a while to save, so another flush can start meanwhile"""
+
+    def save_many(self, records):
+        time.sleep(0.1)
+        super().save_many(records)
+
+
+def test_concurrent_flushes_do_not_lose_a_failed_write():
+    """A flush started by save_api_key while the background flush fails keeps both batches"""
+    store = SlowFlakyStore(failures=1)
+    registry = make_registry(store)
+
+    async def scenario():
+        first = registry.get("a@test")
+        first.api_keys["openai"] = "a-key"
+        registry.mark_dirty(first)
+        background = asyncio.create_task(registry.flush())    # fails
+        await asyncio.sleep(0.02)
+
+        second = registry.get("b@test")
+        second.api_keys["openai"] = "b-key"
+        registry.mark_dirty(second)
+        await asyncio.gather(background, registry.flush())
+        assert registry.stats()["dirty"] == 0
+
+    asyncio.run(scenario())
+
+    assert store.load("a@test") == {"api_keys": {"openai": "a-key"}}
+    assert store.load("b@test") == {"api_keys": {"openai": "b-key"}}
+
+
+class CountingStore(MemorySessionStore):
+    def __init__(self):
+        super().__init__()
+        self.revision_reads = 0
+
+    def revision(self, user_email):
+        self.revision_reads += 1
+        return super().revision(user_email)
+
+
+def test_revalidation_is_rate_limited_and_sees_other_workers():
+    store = CountingStore()
+    registry = make_registry(store, revalidate=True, revalidate_interval=0.05)
+    registry.get("a@test")
+    for _ in range(100):
+        registry.get("a@test")
+    assert store.revision_reads == 1          # only the initial load
+
+    store.save_many({"a@test": {"api_keys": {"openai": "from-other-worker"}}})
+    time.sleep(0.06)
+
+    assert registry.get("a@test").api_keys == {"openai": "from-other-worker"}
+    assert registry.stats()["reloads"] == 1
+
+
+def test_shared_login_accepted_by_other_worker():
+    shared = MemoryAuthSessionStore()
+    login_worker, other_worker = FakeAuthManager(), FakeAuthManager()
+    login_worker.login("s1")
+    VerifiedSessionCache(login_worker, shared=shared).remember("s1")
+
+    assert VerifiedSessionCache(other_worker, shared=shared).get("s1")["user"] == {"email": "a@test"}
+    # Shared record lives as long as the login, not a fixed day
+    assert shared._sessions["s1"][0] - time.time() < 3601
+
+
+def test_local_rejection_is_not_overridden_by_shared_store():
+    """A session this worker verified, then saw expire, stays rejected"""
+    shared = MemoryAuthSessionStore()
+    manager = FakeAuthManager()
+    manager.login("s1")
+    cache = VerifiedSessionCache(manager, ttl=0, shared=shared)
+    cache.remember("s1")
+    assert cache.get("s1") is not None
+
+    manager.sessions["s1"]["expires_at"] = (datetime.now() - timedelta(seconds=1)).isoformat()
+
+    assert cache.get("s1") is None
+    assert shared.get("s1") is None
+
+
+def test_expired_login_is_not_published():
+    shared = MemoryAuthSessionStore()
+    manager = FakeAuthManager()
+    manager.login("s1", minutes=-1)
+    VerifiedSessionCache(manager, shared=shared).remember("s1")
+
+    assert shared.get("s1") is None
+
+
+def test_shared_state_is_revalidated_without_alfa_workers(tmp_path):
+    """uvicorn --workers N does not set ALFA_WORKERS; a shared backend alone enables revalidation"""
+    from alfa_app import WORKERS, AIFederation
+    from alfa_state import sqlite_state
+
+    state = sqlite_state(*(tmp_path / f"{name}.db" for name in ("sessions", "auth", "conversations", "responses")))
+    federation = AIFederation(state=state)
+
+    assert WORKERS == 1
+    assert federation.sessions.revalidate and federation.conversations.revalidate
+    state.close()
+
+
+if __name__ == "__main__":
+    test_lru_eviction_keeps_pending_writes()
+    test_lru_order_follows_use()
+    test_evict_idle()
+    test_write_behind_flush()
+    test_background_flush_interval_batch_and_stop()
+    test_failed_flush_is_retried()
+    test_concurrent_flushes_do_not_lose_a_failed_write()
+    test_revalidation_is_rate_limited_and_sees_other_workers()
+    test_shared_login_accepted_by_other_worker()
+    test_local_rejection_is_not_overridden_by_shared_store()
+    test_expired_login_is_not_published()
+    import tempfile
+    from pathlib import Path
+    test_shared_state_is_revalidated_without_alfa_workers(Path(tempfile.mkdtemp()))
+    print("OK")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+ALFA Bridge - memory tests
+
+Sprawdza magazyn historii (SQLite, także w wersji z shardami i przeniesienie
+niedzielonej bazy do shardów) oraz
+BridgeHistoryCache: zapis write-behind (flush co interwał / po przekroczeniu
+paczki / przy stop, ponowienie po błędzie) i odczyt sesji usuniętej z cache
+w trakcie flushu bez zdublowanych wpisów i bez blokowania pętli zdarzeń.
+
+Uruchomienie:
+    python -m pytest -q test_bridge_memory.py
+"""
+
+import asyncio
+import json
+import time
+
+from memory import AlfaBridgeMemory, BridgeHistoryCache, ShardedBridgeMemory
+from token_budget import MESSAGE_OVERHEAD
+
+
+class SlowStore(AlfaBridgeMemory):
+    """Commits, then lingers in the worker thread before the flush resumes"""
+
+    def append_many(self, entries):
+        ids = super().append_many(entries)
+        time.sleep(0.2)
+        return ids
+
+
+class FlakyStore(AlfaBridgeMemory):
+    """Fails the first `failures` append_many calls"""
+
+    failures = 1
+
+    def append_many(self, entries):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('disk full')
+        return super().append_many(entries)
+
+
+def contents(history):
+    return [m['content'] for m in history]
+
+
+def test_max_length_of_one_call_does_not_change_other_users(tmp_path):
+    for store in (AlfaBridgeMemory(tmp_path / 'single.db'), ShardedBridgeMemory(tmp_path / 'sharded.db', shards=2)):
+        for i in range(30):
+            store.append_entry('a', 'user', f'a{i}', max_length=5)
+            store.append_entry('b', 'user', f'b{i}')
+
+        assert store.max_length == 20
+        assert len(store.load_history('b')) == 20
+        assert [m['content'] for m in store.load_history('a', max_length=5)] == [f'a{i}' for i in range(25, 30)]
+        store.close()
+
+
+def test_missing_token_counts_are_stored_once(tmp_path):
+    """Rows from databases older than the tokens column are counted on first read only"""
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    store.append_entry('a', 'user', 'hello there')
+    store._db.execute('UPDATE entries SET tokens = NULL')
+    store._db.commit()
+
+    assert store.load_history('a')[0]['tokens'] > 0
+    assert store._db.execute('SELECT tokens FROM entries').fetchone()[0] == store.load_history('a')[0]['tokens']
+
+
+def test_history_is_loaded_by_token_budget(tmp_path):
+    """With a token budget the history is not cut at max_length entries"""
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    store.append_many([('a', None, 'user', f'm{i}', 10) for i in range(50)])
+    per_entry = 10 + MESSAGE_OVERHEAD
+
+    assert len(store.load_history('a')) == 20
+    history = store.load_history('a', max_tokens=35 * per_entry + per_entry // 2)
+    assert contents(history) == [f'm{i}' for i in range(15, 50)]
+
+    cache = BridgeHistoryCache(store, max_tokens=35 * per_entry)
+
+    async def scenario():
+        assert len(await cache.load_history('a')) == 35
+        return await cache.append_pair('a', 'question', 'answer')
+
+    history = asyncio.run(scenario())
+    assert contents(history)[-2:] == ['question', 'answer']
+    assert contents(history)[0] == 'm16'          # oldest entries trimmed to make room
+    assert sum(m['tokens'] + MESSAGE_OVERHEAD for m in history) <= 35 * per_entry
+
+
+def test_write_behind_flush(tmp_path):
+    """Turns reach the store only on flush, the pair in one batch"""
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    cache = BridgeHistoryCache(store)
+
+    async def scenario():
+        history = await cache.append_pair('a', 'hi', 'hello')
+        assert contents(history) == ['hi', 'hello']
+        assert store.load_history('a') == []
+        await cache.flush()
+        return await cache.load_history('a')
+
+    cached = asyncio.run(scenario())
+
+    assert contents(store.load_history('a')) == ['hi', 'hello']
+    assert [m['id'] for m in cached] == [m['id'] for m in store.load_history('a')]
+    assert cache.stats()['flushes'] == 1
+    assert cache.stats()['pending'] == 0
+
+
+def test_evicted_session_keeps_pending_turns(tmp_path):
+    cache = BridgeHistoryCache(AlfaBridgeMemory(tmp_path / 'bridge.db'), max_sessions=1)
+
+    async def scenario():
+        await cache.append_pair('a', 'hi', 'hello')
+        await cache.load_history('b')
+        return await cache.load_history('a')
+
+    assert contents(asyncio.run(scenario())) == ['hi', 'hello']
+    assert cache.stats()['misses'] == 3
+
+
+def test_miss_during_flush_does_not_duplicate_turns(tmp_path):
+    """A session reloaded while its entries are being committed sees them once"""
+    cache = BridgeHistoryCache(SlowStore(tmp_path / 'bridge.db'), max_sessions=1)
+
+    async def scenario():
+        await cache.append_pair('a', 'hi', 'hello')
+        flush = asyncio.create_task(cache.flush())
+        await asyncio.sleep(0.05)          # committed, flush not resumed yet
+        await cache.load_history('b')      # evicts 'a'
+        history = await cache.load_history('a')
+        await flush
+        return history
+
+    assert contents(asyncio.run(scenario())) == ['hi', 'hello']
+
+
+def test_miss_does_not_block_the_event_loop_during_flush(tmp_path):
+    """A cold session waits for the committing shard in a thread; resident sessions are served meanwhile"""
+    cache = BridgeHistoryCache(SlowStore(tmp_path / 'bridge.db'))
+
+    async def scenario():
+        await cache.append_pair('hot', 'hi', 'hello')
+        flush = asyncio.create_task(cache.flush())
+        await asyncio.sleep(0.05)          # flush holds the shard lock
+        cold = [asyncio.create_task(cache.load_history('cold')) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        hot = await cache.load_history('hot')
+        served_in = time.perf_counter() - started
+        assert not any(task.done() for task in cold)
+        await flush
+        return hot, served_in, await asyncio.gather(*cold)
+
+    hot, served_in, cold = asyncio.run(scenario())
+
+    assert contents(hot) == ['hi', 'hello']
+    assert served_in < 0.05
+    assert cold == [[], []]
+    assert cache.stats()['misses'] == 2      # 'hot' once, 'cold' read once for both callers
+
+
+def test_background_flush_interval_batch_and_stop(tmp_path):
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    cache = BridgeHistoryCache(store, flush_interval=0.05, flush_batch=4)
+
+    async def scenario():
+        await cache.start()
+        await cache.append_pair('a', 'hi', 'hello')
+        await asyncio.sleep(0.15)
+        assert store.load_history('a'), 'interval flush did not run'
+
+        # A full batch is flushed without waiting for the interval
+        cache.flush_interval = 60
+        await asyncio.sleep(0.1)
+        await cache.append_pair('b', 'one', 'two')
+        await cache.append_pair('c', 'three', 'four')
+        await asyncio.sleep(0.05)
+        assert store.load_history('c'), 'batch threshold did not wake the flush'
+
+        await cache.append_pair('d', 'bye', 'ciao')
+        await cache.stop()
+
+    asyncio.run(scenario())
+
+    assert contents(store.load_history('d')) == ['bye', 'ciao'], 'stop() did not flush pending writes'
+
+
+def test_failed_flush_is_retried_in_order(tmp_path):
+    store = FlakyStore(tmp_path / 'bridge.db')
+    cache = BridgeHistoryCache(store)
+
+    async def scenario():
+        await cache.append_pair('a', 'first', 'one')
+        await cache.flush()
+        assert store.load_history('a') == []
+
+        await cache.append_pair('a', 'second', 'two')
+        await cache.flush()
+
+    asyncio.run(scenario())
+
+    assert contents(store.load_history('a')) == ['first', 'one', 'second', 'two']
+
+
+def test_unsharded_db_moves_into_shards(tmp_path):
+    """Turns stored after the JSON import survive enabling shards; nothing is imported twice"""
+    legacy = tmp_path / 'bridge_memory.json'
+    legacy.write_text(json.dumps({'a': {'default': [{'role': 'user', 'content': 'from json'}]}}), encoding='utf-8')
+    store = AlfaBridgeMemory(legacy)
+    store.append_entry('a', 'assistant', 'newer turn')
+    store.append_entry('b', 'user', 'other user')
+    store.close()
+
+    for _ in range(2):  # second open must not import again
+        sharded = ShardedBridgeMemory(legacy, shards=4)
+        assert contents(sharded.load_history('a')) == ['from json', 'newer turn']
+        assert contents(sharded.load_history('b')) == ['other user']
+        sharded.close()
+
+
+def test_flush_writes_shards_independently(tmp_path):
+    """A shard whose write fails keeps only its own entries for the retry"""
+    store = ShardedBridgeMemory(tmp_path / 'bridge.db', shards=2)
+    users = {store.shard_for(f'user{i}'): f'user{i}' for i in range(20)}
+    broken, healthy = list(users)
+    failures = [1]
+    write = broken.append_many
+
+    def flaky_append(entries):
+        if failures[0]:
+            failures[0] -= 1
+            raise OSError('disk full')
+        return write(entries)
+
+    broken.append_many = flaky_append
+    cache = BridgeHistoryCache(store)
+
+    async def scenario():
+        await cache.append_pair(users[broken], 'hi', 'hello')
+        await cache.append_pair(users[healthy], 'hi', 'hello')
+        await cache.flush()
+        assert store.load_history(users[broken]) == []
+        assert contents(store.load_history(users[healthy])) == ['hi', 'hello']
+        assert cache.stats()['pending'] == 2
+        await cache.flush()
+
+    asyncio.run(scenario())
+
+    assert contents(store.load_history(users[broken])) == ['hi', 'hello']
+    assert contents(store.load_history(users[healthy])) == ['hi', 'hello']
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    for test in (
+        test_max_length_of_one_call_does_not_change_other_users,
+        test_missing_token_counts_are_stored_once,
+        test_history_is_loaded_by_token_budget,
+        test_write_behind_flush,
+        test_evicted_session_keeps_pending_turns,
+        test_miss_during_flush_does_not_duplicate_turns,
+        test_miss_does_not_block_the_event_loop_during_flush,
+        test_background_flush_interval_batch_and_stop,
+        test_failed_flush_is_retried_in_order,
+        test_unsharded_db_moves_into_shards,
+        test_flush_writes_shards_independently,
+    ):
+        test(Path(tempfile.mkdtemp()))
+    print('OK')
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+ALFA Bridge - semantic recall tests
+
+Sprawdza indeks wektorów (wyszukiwanie po rzucie + wzrost pojemności),
+przypominanie dawnych wiadomości w ramach budżetu tokenów, jednokrotne
+liczenie embeddingów (także po restarcie), przerwę po błędzie Ollamy
+i wyłączenie, gdy modelu embeddingów nie ma.
+
+Uruchomienie:
+    python -m pytest -q test_recall.py
+"""
+
+import asyncio
+import re
+import zlib
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from memory import AlfaBridgeMemory
+from recall import SemanticRecall, VectorIndex
+
+DIM = 64
+
+
+class BagOfWords:
+    """Stand-in embedder: hashed word counts, so shared words mean similarity"""
+
+    def __init__(self, available=True, fail=False):
+        self.texts = []
+        self._available = available
+        self.fail = fail
+
+    async def available(self):
+        return self._available
+
+    async def __call__(self, texts):
+        if self.fail:
+            raise ConnectionError('ollama down')
+        self.texts.extend(texts)
+        vectors = []
+        for text in texts:
+            vector = [0.0] * DIM
+            for word in re.findall(r'\w+', text.lower()):
+                vector[zlib.crc32(word.encode()) % DIM] += 1.0
+            vectors.append(vector)
+        return vectors
+
+
+HISTORY = [
+    ('user', 'My cat is called Tom and he is orange'),
+    ('assistant', 'Tom sounds like a lovely orange cat'),
+    ('user', 'I am planning a trip to Lisbon in May'),
+    ('assistant', 'Lisbon in May is warm and sunny'),
+    ('user', 'Please remind me to buy coffee beans'),
+]
+
+
+def make_recall(tmp_path, embed=None, **kwargs):
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    store.append_many([('a', None, role, content) for role, content in HISTORY])
+    return store, SemanticRecall(store, embed or BagOfWords(), 'bag', projection_dim=16, **kwargs)
+
+
+def test_vector_index_finds_nearest_after_growing():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((3000, 256)).astype(np.float32)
+    index = VectorIndex(256, projection_dim=64)
+    for start in range(0, 3000, 500):
+        index.add(list(range(start + 1, start + 501)), vectors[start:start + 500])
+
+    assert index.size == 3000 and index.last_id == 3000
+    assert index.search(vectors[1234] + 0.1 * rng.standard_normal(256), 10)[0] == 1235
+
+
+def test_recall_returns_relevant_messages_within_budget(tmp_path):
+    store, recall = make_recall(tmp_path, top_k=2, min_score=0.2)
+
+    async def scenario():
+        recall.mark('a')
+        await recall.run_once()
+        found = await recall.recall('a', 'what is the name of my orange cat')
+        excluded = await recall.recall('a', 'what is the name of my orange cat', exclude={HISTORY[0][1]})
+        tight = await recall.recall('a', 'what is the name of my orange cat', budget_tokens=3)
+        return found, excluded, tight
+
+    found, excluded, tight = asyncio.run(scenario())
+
+    assert [m['content'] for m in found] == [HISTORY[0][1], HISTORY[1][1]]   # oldest first
+    assert HISTORY[0][1] not in [m['content'] for m in excluded]
+    assert tight == []
+    assert recall.stats()['embedded'] == len(HISTORY)
+
+
+def test_embeddings_are_computed_once(tmp_path):
+    embed = BagOfWords()
+    store, recall = make_recall(tmp_path, embed)
+
+    async def scenario():
+        recall.mark('a')
+        await recall.run_once()
+        store.append_many([('a', None, 'user', 'new message')])
+        recall.mark('a')
+        await recall.run_once()
+
+        # Restart: stored vectors are reloaded, only the query is embedded
+        restarted = SemanticRecall(store, embed, 'bag', projection_dim=16)
+        embed.texts.clear()
+        restarted.mark('a')
+        await restarted.run_once()
+        await restarted.recall('a', 'trip to Lisbon')
+        return restarted
+
+    restarted = asyncio.run(scenario())
+
+    assert embed.texts == ['trip to Lisbon']
+    assert restarted.stats()['entries'] == len(HISTORY) + 1
+
+
+def test_embedding_failure_pauses_recall(tmp_path):
+    embed = BagOfWords()
+    store, recall = make_recall(tmp_path, embed, retry_after=60)
+
+    async def scenario():
+        recall.mark('a')
+        await recall.run_once()
+        embed.fail = True
+        first = await recall.recall('a', 'orange cat')
+        embed.fail = False
+        second = await recall.recall('a', 'orange cat')   # still paused
+        return first, second
+
+    assert asyncio.run(scenario()) == ([], [])
+    assert recall.stats()['errors'] == 1
+
+
+def test_missing_model_disables_recall(tmp_path):
+    store, recall = make_recall(tmp_path, BagOfWords(available=False))
+
+    async def scenario():
+        await recall.start()
+        recall.mark('a')
+        found = await recall.recall('a', 'orange cat')
+        await recall.stop()
+        return found
+
+    assert asyncio.run(scenario()) == []
+    assert recall.stats()['active'] is False
+    assert recall._marked == set()
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    test_vector_index_finds_nearest_after_growing()
+    test_recall_returns_relevant_messages_within_budget(Path(tempfile.mkdtemp()))
+    test_embeddings_are_computed_once(Path(tempfile.mkdtemp()))
+    test_embedding_failure_pauses_recall(Path(tempfile.mkdtemp()))
+    test_missing_model_disables_recall(Path(tempfile.mkdtemp()))
+    print('OK')
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+ALFA Bridge - summarizer tests
+
+Sprawdza składanie wiadomości starszych niż ostatnie `keep` w kroczące
+streszczenie (każda wiadomość streszczana raz), pomijanie w historii
+wiadomości już zawartych w streszczeniu oraz wyłączenie streszczania,
+gdy model profilu nie jest dostępny w Ollamie.
+
+Uruchomienie:
+    python -m pytest -q test_summarizer.py
+"""
+
+import asyncio
+
+import httpx
+
+import config
+from alfa_ollama import ollama_has_model
+from memory import AlfaBridgeMemory, BridgeHistoryCache
+from summarizer import BridgeSummarizer, ProfileSummarizer, summary_messages
+
+
+class FakeSummarize:
+    """Records calls; the summary lists the folded contents"""
+
+    def __init__(self, available=True):
+        self.calls = []
+        self._available = available
+
+    async def available(self):
+        return self._available
+
+    async def __call__(self, previous, entries):
+        self.calls.append((previous, entries))
+        return ' '.join(filter(None, [previous, *(content for _, content in entries)]))
+
+
+def contents(history):
+    return [m['content'] for m in history]
+
+
+def fill(store, user_id, count):
+    store.append_many([(user_id, None, 'user', f'm{i}') for i in range(count)])
+
+
+def test_summary_messages():
+    messages = summary_messages('old facts', [('user', 'hi'), ('assistant', 'hello')], words=50)
+
+    assert messages[0]['role'] == 'system' and '50' in messages[0]['content']
+    assert 'old facts' in messages[1]['content']
+    assert 'user: hi\nassistant: hello' in messages[1]['content']
+
+
+def test_old_messages_are_folded_once(tmp_path):
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    summarize = FakeSummarize()
+    summarizer = BridgeSummarizer(store, summarize, keep=4, min_entries=3)
+    fill(store, 'a', 10)
+
+    async def scenario():
+        summarizer.mark('a')
+        await summarizer.run_once()
+        summarizer.mark('a')
+        await summarizer.run_once()           # nothing new to fold
+
+        fill(store, 'a', 3)
+        summarizer.mark('a')
+        await summarizer.run_once()
+
+    asyncio.run(scenario())
+
+    assert [len(entries) for _, entries in summarize.calls] == [6, 3]
+    assert summarize.calls[1][0] == 'm0 m1 m2 m3 m4 m5'   # previous summary is extended
+    assert summarizer.summary('a') == 'm0 m1 m2 m3 m4 m5 m6 m7 m8'
+    summary, through_id = store.load_summary('a')
+    assert through_id == 9
+    assert summarizer.stats()['folded'] == 9
+
+
+def test_summarized_messages_are_not_sent_again(tmp_path):
+    store = AlfaBridgeMemory(tmp_path / 'bridge.db')
+    cache = BridgeHistoryCache(store, max_tokens=10000)
+    summarizer = BridgeSummarizer(store, FakeSummarize(), keep=4, min_entries=2)
+
+    async def scenario():
+        for i in range(5):
+            await cache.append_pair('a', f'q{i}', f'r{i}')
+        await cache.flush()                     # cached messages get their ids
+        summarizer.mark('a')
+        await summarizer.run_once()
+        await cache.append_pair('a', 'q5', 'r5')   # not stored yet
+        return await cache.load_history('a')
+
+    history = asyncio.run(scenario())
+
+    assert len(history) == 12
+    assert summarizer.summary('a') == 'q0 r0 q1 r1 q2 r2'
+    sent = summarizer.unsummarized(history, 'a')
+    assert contents(sent) == ['q3', 'r3', 'q4', 'r4', 'q5', 'r5']
+
+
+def test_missing_model_disables_summaries(tmp_path):
+    summarizer = BridgeSummarizer(AlfaBridgeMemory(tmp_path / 'bridge.db'), FakeSummarize(available=False))
+
+    async def scenario():
+        await summarizer.start()
+        summarizer.mark('a')
+        await summarizer.stop()
+
+    asyncio.run(scenario())
+
+    assert summarizer.stats()['active'] is False
+    assert summarizer.stats()['marked'] == 0
+
+
+def test_ollama_has_model():
+    def tags(request):
+        return httpx.Response(200, json={"models": [{"name": "gemma:2b"}, {"name": "nomic-embed-text:latest"}]})
+
+    def down(request):
+        raise httpx.ConnectError("connection refused")
+
+    async def scenario():
+        async with httpx.AsyncClient(base_url="http://ollama", transport=httpx.MockTransport(tags)) as client:
+            found = [await ollama_has_model(client, name) for name in ("gemma:2b", "nomic-embed-text", "llama3")]
+        async with httpx.AsyncClient(base_url="http://ollama", transport=httpx.MockTransport(down)) as client:
+            found.append(await ollama_has_model(client, "gemma:2b"))
+        return found
+
+    assert asyncio.run(scenario()) == [True, True, False, False]
+
+
+def test_profile_summarizer_checks_its_model():
+    summarize = ProfileSummarizer('fast')
+    summarize._client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"models": [{"name": config.MODELS['fast']['name']}]})
+    ))
+
+    async def scenario():
+        try:
+            return await summarize.available()
+        finally:
+            await summarize.close()
+
+    assert asyncio.run(scenario()) is True
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    test_summary_messages()
+    test_old_messages_are_folded_once(Path(tempfile.mkdtemp()))
+    test_summarized_messages_are_not_sent_again(Path(tempfile.mkdtemp()))
+    test_missing_model_disables_summaries(Path(tempfile.mkdtemp()))
+    test_ollama_has_model()
+    test_profile_summarizer_checks_its_model()
+    print('OK')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+ALFA Bridge - token budget tests
+
+Sprawdza liczenie tokenów (tiktoken albo przybliżenie po słowach)
+i pakowanie promptu w budżet: prompt systemowy i nowa wiadomość zawsze,
+historia od najnowszej, dopóki się mieści, w oryginalnej kolejności.
+
+Uruchomienie:
+    python -m pytest -q test_token_budget.py
+"""
+
+import token_budget
+from token_budget import MESSAGE_OVERHEAD, count_tokens, message_tokens, pack_messages
+
+SYSTEM = [{'role': 'system', 'content': 'Be brief.'}]
+
+
+def history_of(count, tokens=10):
+    return [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'm{i}', 'tokens': tokens}
+        for i in range(count)
+    ]
+
+
+def test_count_tokens():
+    assert count_tokens('') == 0
+    assert count_tokens('hello') >= 1
+    assert count_tokens('hello world, hello world!') > count_tokens('hello world')
+
+
+def test_word_estimate_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(token_budget, 'tiktoken', None)
+
+    assert count_tokens('hi') == 1
+    assert count_tokens('internationalization') == 5     # ~4 characters per token
+    assert count_tokens('Hi, there!') == 5                # punctuation counts on its own
+
+
+def test_message_tokens_uses_cached_count():
+    assert message_tokens({'role': 'user', 'content': 'anything', 'tokens': 7}) == 7 + MESSAGE_OVERHEAD
+    assert message_tokens({'role': 'user', 'content': 'hello'}) == count_tokens('hello') + MESSAGE_OVERHEAD
+
+
+def test_everything_fits():
+    messages, used, dropped = pack_messages(SYSTEM, history_of(4), 'new', budget=10000)
+
+    assert [m['content'] for m in messages] == ['Be brief.', 'm0', 'm1', 'm2', 'm3', 'new']
+    assert all(set(m) == {'role', 'content'} for m in messages)   # no cached counts sent to the API
+    assert dropped == 0
+    assert used == message_tokens(SYSTEM[0]) + 4 * (10 + MESSAGE_OVERHEAD) + message_tokens({'content': 'new'})
+
+
+def test_oldest_history_is_dropped_first():
+    fixed = message_tokens(SYSTEM[0]) + message_tokens({'content': 'new'})
+    budget = fixed + 3 * (10 + MESSAGE_OVERHEAD) + 5
+
+    messages, used, dropped = pack_messages(SYSTEM, history_of(6), 'new', budget)
+
+    assert [m['content'] for m in messages] == ['Be brief.', 'm3', 'm4', 'm5', 'new']
+    assert dropped == 3
+    assert used <= budget
+
+
+def test_history_stops_at_first_entry_that_does_not_fit():
+    """A short older entry is not sent once a newer one was dropped (no gaps)"""
+    history = history_of(3)
+    history[1]['tokens'] = 1000
+    fixed = message_tokens(SYSTEM[0]) + message_tokens({'content': 'new'})
+
+    messages, _, dropped = pack_messages(SYSTEM, history, 'new', fixed + 100)
+
+    assert [m['content'] for m in messages] == ['Be brief.', 'm2', 'new']
+    assert dropped == 2
+
+
+def test_system_and_new_message_always_sent():
+    messages, used, dropped = pack_messages(SYSTEM, history_of(2), 'new', budget=1)
+
+    assert [m['content'] for m in messages] == ['Be brief.', 'new']
+    assert dropped == 2
+    assert used > 1
+
+
+if __name__ == '__main__':
+    test_count_tokens()
+    test_message_tokens_uses_cached_count()
+    test_everything_fits()
+    test_oldest_history_is_dropped_first()
+    test_history_stops_at_first_entry_that_does_not_fit()
+    test_system_and_new_message_always_sent()
+    print('OK')
@@ -0,0 +1,67 @@
+"""
+Budżet tokenów kontekstu ALFA Bridge.
+
+Liczenie tokenów wiadomości (tiktoken, gdy zainstalowany; inaczej
+przybliżenie po słowach) i pakowanie promptu w limit modelu: prompt
+systemowy i nowa wiadomość zawsze, historia od najnowszej, dopóki się
+mieści. Liczba tokenów wpisu jest liczona raz i trzymana w pamięci obok
+niego (memory.py).
+"""
+
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional: approximate counts
+    tiktoken = None
+
+# Framing added by the chat template around every message
+MESSAGE_OVERHEAD = 4
+
+_WORDS = re.compile(r'\w+|[^\w\s]')
+_encoding = None
+
+
+def count_tokens(text):
+    """Tokens of `text` (cl100k_base BPE with tiktoken, estimate without)"""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        return len(_encoding.encode(text, disallowed_special=()))
+    # ~4 characters per token inside a word, every punctuation mark its own token
+    return sum((len(word) + 3) // 4 for word in _WORDS.findall(text))
+
+
+def message_tokens(message):
+    """Tokens of a chat message; uses the count cached in message['tokens'] when present"""
+    tokens = message.get('tokens')
+    if tokens is None:
+        tokens = count_tokens(message['content'])
+    return tokens + MESSAGE_OVERHEAD
+
+
+def pack_messages(system, history, message, budget):
+    """
+    Chat messages for the API within `budget` prompt tokens.
+
+    `system` messages and the new user `message` are always sent; history
+    entries are added newest first while they fit and keep their order.
+    Returns (messages, prompt tokens, history entries dropped).
+    """
+    new_message = {'role': 'user', 'content': message}
+    used = sum(message_tokens(m) for m in system) + message_tokens(new_message)
+
+    kept = []
+    for entry in reversed(history):
+        cost = message_tokens(entry)
+        if used + cost > budget:
+            break
+        kept.append({'role': entry['role'], 'content': entry['content']})
+        used += cost
+    kept.reverse()
+
+    messages = [{'role': m['role'], 'content': m['content']} for m in system]
+    messages.extend(kept)
+    messages.append(new_message)
+    return messages, used, len(history) - len(kept)